@@ -0,0 +1,85 @@
+"""
+Measures the CPU time of encoding a page of notes as a JSON response.
+
+Compares Flask's default provider encoding Note.to_dict values, as jsonify did,
+against NoteJSONProvider.notes_response with each installed backend, and
+against the orjson and msgspec encoders on the same to_dict values.
+
+    $ python -m benchmarks.bench_note_json --notes 100
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.api.json_provider import NoteJSONProvider, available_backends
+from src.models.note import Note
+from src.models.user import User
+
+
+def make_notes(count: int, text_length: int) -> list[Note]:
+    author = User(user_id=1, username="author")
+    created_at = datetime(2024, 9, 25, 23, 46, 27)
+    text = ("Gateway timeout while calling billing. " * 50)[:text_length]
+    return [
+        Note(
+            note_id=note_id,
+            note_title=f"Incident report {note_id}",
+            note_text=text,
+            is_public=note_id % 2 == 0,
+            author_id=1,
+            author_user=author,
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=note_id),
+        )
+        for note_id in range(1, count + 1)
+    ]
+
+
+def measure(function, number: int, repeat: int) -> float:
+    """
+    @return: The best time of one call, in microseconds.
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--notes", type=int, default=100, help="Notes per page.")
+    parser.add_argument("--text-length", type=int, default=500, help="Note length.")
+    parser.add_argument("--number", type=int, default=500, help="Calls per timing.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timings per case.")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    notes = make_notes(args.notes, args.text_length)
+    default = DefaultJSONProvider(app)
+    cases = {
+        "default provider, to_dict": lambda: default.response(
+            [note.to_dict() for note in notes]
+        )
+    }
+    for backend in available_backends():
+        provider = NoteJSONProvider(app, backend)
+        if backend != "stdlib":
+            cases[f"{backend}, to_dict"] = lambda p=provider: p.response(
+                [note.to_dict() for note in notes]
+            )
+        cases[f"{backend}, notes_response"] = lambda p=provider: p.notes_response(notes)
+
+    with app.app_context():
+        expected = cases["default provider, to_dict"]().get_data()
+        baseline = None
+        print(f"{args.notes} notes of {args.text_length} characters per page")
+        for name, case in cases.items():
+            assert case().get_data() == expected, f"{name} output differs"
+            elapsed = measure(case, args.number, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{name:30} {elapsed:9.1f} us/page  {baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Measures reading a page of notes as ORM objects and as note records.
+
+Both paths run the listing query of get_notes_for_user against an in-memory
+SQLite database. The ORM path selects Note entities, with their author and body
+eagerly joined, as the listing did before note records; the record path is
+get_notes_for_user itself. For each, the time per page, and the bytes allocated
+per row while reading and still held by the result, are printed.
+
+    $ python -m benchmarks.bench_note_reads --notes 100
+"""
+
+import argparse
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db import notes as NotesDB
+from src.db.database import Base
+from src.models.note import Note
+from src.models.user import User
+
+
+def seed(Session, count: int, text_length: int) -> int:
+    text = ("Gateway timeout while calling billing. " * 50)[:text_length]
+    with Session() as db:
+        author = User(username="author", password="password")
+        db.add(author)
+        db.commit()
+        db.add_all(
+            Note(
+                note_title=f"Incident report {note_id}",
+                note_text=text,
+                is_public=note_id % 2 == 0,
+                author_id=author.user_id,
+            )
+            for note_id in range(1, count + 1)
+        )
+        db.commit()
+        return author.user_id
+
+
+def get_orm_notes_for_user(author_id: int, page_size: int):
+    # The ORM listing query that get_notes_for_user replaced
+    with NotesDB.get_db() as db:
+        note_ids = NotesDB._visible_note_ids(author_id, page_size)
+        return (
+            db.execute(
+                select(Note)
+                .join(note_ids, Note.note_id == note_ids.c.note_id)
+                .order_by(Note.note_id)
+                .limit(page_size)
+            )
+            .scalars()
+            .all()
+        )
+
+
+def measure(function, number: int, repeat: int) -> float:
+    """
+    @return: The best time of one call, in microseconds.
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+
+def allocations(function) -> tuple[int, int]:
+    """
+    @return: The peak bytes allocated by one call, and the bytes its result holds.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak - before, held - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--notes", type=int, default=100, help="Notes per page.")
+    parser.add_argument("--text-length", type=int, default=500, help="Note length.")
+    parser.add_argument("--number", type=int, default=200, help="Calls per timing.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timings per case.")
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    author_id = seed(Session, args.notes, args.text_length)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    cases = {
+        "ORM notes": lambda: get_orm_notes_for_user(author_id, args.notes),
+        "note records": lambda: NotesDB.get_notes_for_user(author_id, 1, args.notes),
+    }
+    with patch.object(NotesDB, "get_db", get_db):
+        expected = [note.to_dict() for note in cases["ORM notes"]()]
+        baseline = None
+        print(f"{args.notes} notes of {args.text_length} characters per page")
+        for name, case in cases.items():
+            assert [note.to_dict() for note in case()] == expected
+            elapsed = measure(case, args.number, args.repeat)
+            baseline = baseline or elapsed
+            peak, held = allocations(case)
+            print(
+                f"{name:14} {elapsed:9.1f} us/page  {baseline / elapsed:5.2f}x  "
+                f"{peak / args.notes:8.0f} B/row allocated  "
+                f"{held / args.notes:8.0f} B/row held"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Measures reading notes with statements rebuilt on every call and prebuilt ones.
+
+The rebuilt paths construct the by-ID and listing selects per call, with the
+values inlined as bind parameters, as get_note_by_id and get_notes_for_user did
+before their statements were prebuilt; the prebuilt paths are those functions
+themselves. Both run against an in-memory SQLite database on an instrumented
+engine, and the compiled cache hits and misses of each case are printed with its
+time per call.
+
+    $ python -m benchmarks.bench_note_statements --notes 100
+"""
+
+import argparse
+import timeit
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db import instrumentation
+from src.db import notes as NotesDB
+from src.db.database import Base
+from src.db.instrumentation import QueryStats, instrument_engine
+from src.models.note import NOTE_RECORD_COLUMNS, Note
+from src.models.user import User
+
+
+def seed(Session, count: int) -> int:
+    with Session() as db:
+        author = User(username="author", password="password")
+        db.add(author)
+        db.commit()
+        db.add_all(
+            Note(
+                note_title=f"Incident report {note_id}",
+                note_text="Gateway timeout while calling billing.",
+                is_public=note_id % 2 == 0,
+                author_id=author.user_id,
+            )
+            for note_id in range(1, count + 1)
+        )
+        db.commit()
+        return author.user_id
+
+
+def get_note_by_id_rebuilt(note_id: int):
+    # The by-ID read as it was built before _NOTE_RECORD_BY_ID
+    with NotesDB.get_db() as db:
+        records = NotesDB._read_records(
+            db,
+            NotesDB._note_rows(list(NOTE_RECORD_COLUMNS)).where(
+                Note.note_id == note_id
+            ),
+        )
+        return records[0] if records else None
+
+
+def get_notes_for_user_rebuilt(author_id: int, page: int, page_size: int):
+    # The listing read as it was built before _VISIBLE_NOTE_RECORDS
+    offset = (page - 1) * page_size
+    with NotesDB.get_db() as db:
+        note_ids = NotesDB._visible_note_ids(author_id, offset + page_size)
+        return NotesDB._read_records(
+            db,
+            NotesDB._note_rows(list(NOTE_RECORD_COLUMNS))
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(page_size)
+            .offset(offset),
+        )
+
+
+def measure(function, number: int, repeat: int) -> float:
+    """
+    @return: The best time of one call, in microseconds.
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+
+def cache_counts() -> tuple[int, int]:
+    return (
+        instrumentation.COMPILED_CACHE_HITS.value,
+        instrumentation.COMPILED_CACHE_MISSES.value,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--notes", type=int, default=100, help="Notes to seed.")
+    parser.add_argument("--page-size", type=int, default=20, help="Notes per page.")
+    parser.add_argument("--number", type=int, default=1000, help="Calls per timing.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timings per case.")
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    instrument_engine(engine, QueryStats(100), sample_rate=0, slow_query_ms=1e9)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    author_id = seed(Session, args.notes)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    note_id = args.notes // 2
+    reads = {
+        "by ID": {
+            "rebuilt": lambda: get_note_by_id_rebuilt(note_id),
+            "prebuilt": lambda: NotesDB.get_note_by_id(note_id),
+        },
+        "page": {
+            "rebuilt": lambda: get_notes_for_user_rebuilt(author_id, 2, args.page_size),
+            "prebuilt": lambda: NotesDB.get_notes_for_user(
+                author_id, 2, args.page_size
+            ),
+        },
+    }
+    with patch.object(NotesDB, "get_db", get_db):
+        for read, cases in reads.items():
+            expected = cases["rebuilt"]()
+            baseline = None
+            for name, case in cases.items():
+                assert case() == expected, f"{read}, {name} differs"
+                hits, misses = cache_counts()
+                elapsed = measure(case, args.number, args.repeat)
+                baseline = baseline or elapsed
+                hits, misses = (
+                    now - then for now, then in zip(cache_counts(), (hits, misses))
+                )
+                print(
+                    f"{read + ', ' + name:16} {elapsed:9.1f} us/call  "
+                    f"{baseline / elapsed:5.2f}x  "
+                    f"{hits:.0f} compiled cache hits, {misses:.0f} misses"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+-- Composite indexes for the "public or mine" note listing.
+-- Each branch of the UNION ALL in get_notes_for_user reads one of these in
+-- note_id order and stops after a page. The author index also covers the
+-- fk_notes_author_id foreign key, so the old single-column index is dropped.
+
+ALTER TABLE `notes`
+    ADD INDEX `idx_public_note_id` (`is_public`, `note_id`),
+    ADD INDEX `idx_author_public_note_id` (`author_id`, `is_public`, `note_id`),
+    DROP INDEX `idx_author_id`;
@@ -0,0 +1,20 @@
+-- Refresh tokens are stored as SHA-256 digests. Rotating a token marks it used and
+-- issues a new one in the same family; presenting a used token revokes the family.
+
+CREATE TABLE IF NOT EXISTS `refresh_tokens` (
+    `token_id` INT(11) AUTO_INCREMENT PRIMARY KEY,
+    `token_hash` CHAR(64) NOT NULL,
+    `family_id` CHAR(32) NOT NULL,
+    `user_id` INT(11) NOT NULL,
+    `expires_at` DATETIME NOT NULL,
+    `used_at` DATETIME NULL,
+    `revoked_at` DATETIME NULL,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `uniq_token_hash` (`token_hash`),
+    INDEX `idx_family_id` (`family_id`),
+    CONSTRAINT `fk_refresh_tokens_user_id`
+        FOREIGN KEY (`user_id`)
+        REFERENCES `users`(`user_id`)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
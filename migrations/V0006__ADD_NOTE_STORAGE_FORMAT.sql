@@ -0,0 +1,12 @@
+-- Compressed storage for note bodies.
+-- storage_format 0 keeps the text in note_text as before. Formats 1 (zlib) and
+-- 2 (zstd) keep the compressed text in note_body and only a 255 character
+-- preview in note_text. text_length is the UTF-8 byte length of the text.
+-- Existing rows keep working as format 0 with a NULL text_length; run
+-- `flask backfill-note-storage` afterwards to compress them in batches.
+
+ALTER TABLE `notes`
+    ADD `storage_format` TINYINT NOT NULL DEFAULT 0 AFTER `note_title`,
+    MODIFY `note_text` TEXT NULL,
+    ADD `note_body` LONGBLOB NULL AFTER `note_text`,
+    ADD `text_length` INT(11) NULL AFTER `note_body`;
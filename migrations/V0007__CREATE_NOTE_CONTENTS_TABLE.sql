@@ -0,0 +1,24 @@
+-- Content-addressed storage for note bodies.
+-- Notes with the same text share one row of note_contents, keyed by the
+-- SHA-256 hex digest of the UTF-8 text. The body columns follow the same
+-- storage formats as V0006. ref_count counts the notes pointing at a body;
+-- bodies no note points at are removed by `flask purge-note-contents`.
+-- Notes keep their inline columns until `flask backfill-note-storage` moves
+-- them, so content_hash stays NULL for rows written before this migration.
+
+CREATE TABLE IF NOT EXISTS `note_contents` (
+    `content_hash` CHAR(64) NOT NULL PRIMARY KEY,
+    `storage_format` TINYINT NOT NULL DEFAULT 0,
+    `note_text` TEXT NULL,
+    `note_body` LONGBLOB NULL,
+    `text_length` INT(11) NOT NULL,
+    `ref_count` INT(11) NOT NULL DEFAULT 0,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+ALTER TABLE `notes`
+    ADD `content_hash` CHAR(64) NULL AFTER `note_title`,
+    ADD INDEX `idx_content_hash` (`content_hash`),
+    ADD CONSTRAINT `fk_notes_content_hash`
+        FOREIGN KEY (`content_hash`)
+        REFERENCES `note_contents`(`content_hash`);
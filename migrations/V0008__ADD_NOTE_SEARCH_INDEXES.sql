@@ -0,0 +1,13 @@
+-- Full-text search over note titles and bodies for GET /v1/notes/search.
+-- search_terms holds each distinct term of a body once, so compressed bodies
+-- can be indexed without storing their text again. Bodies stored before this
+-- migration are indexed by `flask index-note-contents`; notes still keeping
+-- their text inline are searched by title until `flask backfill-note-storage`
+-- moves them.
+
+ALTER TABLE `note_contents`
+    ADD `search_terms` MEDIUMTEXT NULL AFTER `text_length`,
+    ADD FULLTEXT INDEX `ft_search_terms` (`search_terms`);
+
+ALTER TABLE `notes`
+    ADD FULLTEXT INDEX `ft_note_title` (`note_title`);
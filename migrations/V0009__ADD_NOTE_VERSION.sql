@@ -0,0 +1,8 @@
+-- A version number for optimistic concurrency on notes.
+-- updated_at only has one-second resolution, so two writes within the same
+-- second left it unchanged and an If-Match or If-None-Match built from it
+-- matched the wrong version. Every write that changes a note increments
+-- version instead; ETags are built from it. Existing notes start at 1.
+
+ALTER TABLE `notes`
+    ADD `version` INT(11) NOT NULL DEFAULT 1 AFTER `updated_at`;
@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+
+from ..exceptions.invalid_cursor_exception import InvalidCursorException
+
+
+def encode_cursor(*keys: int) -> str:
+    """
+    Encodes the sort keys of the last item on a page into an opaque cursor token.
+    @param keys: The sort key values of the last returned item.
+    @return: A URL-safe cursor token.
+    """
+    payload = json.dumps(list(keys), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str, arity: int = 1) -> list[int]:
+    """
+    Decodes a cursor token produced by encode_cursor.
+    @param token: The cursor token.
+    @param arity: The number of sort keys the cursor must hold.
+    @return: The sort key values stored in the cursor.
+    @raises InvalidCursorException: If the token is malformed.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeEncodeError):
+        raise InvalidCursorException("Invalid cursor")
+
+    if (
+        not isinstance(keys, list)
+        or len(keys) != arity
+        or not all(type(key) is int and key >= 0 for key in keys)
+    ):
+        raise InvalidCursorException("Invalid cursor")
+    return keys
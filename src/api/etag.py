@@ -0,0 +1,67 @@
+import hashlib
+from collections.abc import Iterable
+
+# The content codings responses are compressed with, see coded_etag
+CONTENT_CODINGS = frozenset(("gzip", "zstd", "br"))
+
+
+def note_etag(note_id: int, version: int) -> str:
+    """
+    Builds the strong ETag of a note version from its ID and version number.
+    @param note_id: The ID of the note.
+    @param version: The version of the note, incremented by every write.
+    @return: A quoted ETag such as "4-3".
+    """
+    return f'"{note_id}-{version}"'
+
+
+def parse_note_etag(etag: str, note_id: int) -> int | None:
+    """
+    Recovers the version a note ETag was built from.
+    @param etag: The unquoted ETag value, as parsed from an If-Match header.
+    @param note_id: The ID of the note the ETag must belong to.
+    @return: The version, or None if the ETag is not a version of this note.
+    """
+    etag_note_id, _, version = uncoded_etag(etag).partition("-")
+    if etag_note_id != str(note_id) or not (version.isascii() and version.isdigit()):
+        return None
+    return int(version)
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    Builds the ETag of a representation sent with a content coding. A coded body
+    differs byte for byte from the uncoded one, so it must not share its strong
+    ETag; the coding is appended to the opaque tag instead.
+    @param etag: The quoted ETag of the uncoded representation.
+    @param coding: The content coding, such as gzip.
+    @return: The quoted ETag, such as "4-3-gzip".
+    """
+    return f'{etag[:-1]}-{coding}"'
+
+
+def uncoded_etag(etag: str) -> str:
+    """
+    Recovers the ETag of the uncoded representation from one built by coded_etag.
+    @param etag: The unquoted ETag value, as parsed from a request header.
+    @return: The value without its content coding, or as it was if it has none.
+    """
+    base, _, coding = etag.rpartition("-")
+    return base if base and coding in CONTENT_CODINGS else etag
+
+
+def listing_etag(
+    versions: Iterable[tuple[int, int]], next_cursor: str | None = None
+) -> str:
+    """
+    Builds the strong ETag of a page of notes from the versions of the notes on it.
+    Any note added to, removed from, or updated on the page changes the ETag.
+    @param versions: The (note_id, version) of each note on the page, in order.
+    @param next_cursor: The cursor of the next page, if the page has one.
+    @return: A quoted ETag holding a digest of the page.
+    """
+    digest = hashlib.sha256()
+    for note_id, version in versions:
+        digest.update(f"{note_id}-{version};".encode())
+    digest.update(f"next={next_cursor or ''}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
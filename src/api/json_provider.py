@@ -0,0 +1,280 @@
+from collections.abc import Callable, Sequence
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider
+
+from ..db.compression import FORMAT_PLAIN
+from ..models.note import Note, NoteRecord
+
+try:
+    import orjson
+except ImportError:  # orjson support is optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec support is optional
+    msgspec = None
+
+# Note.to_dict with sorted keys and compact separators; the datetimes are
+# isoformat() values, which never need escaping
+_NOTE_TEMPLATE = (
+    '{"author":%s,"created_at":"%s","note_id":%d,"public":%s,'
+    '"text":%s,"title":%s,"updated_at":"%s"}'
+)
+
+
+def _note_text(note: Note, values: dict) -> str:
+    content = values.get("content")
+    if content is not None:
+        return content.note_text
+    if (
+        values.get("content_hash") is None
+        and values.get("storage_format") == FORMAT_PLAIN
+        and "plain_text" in values
+    ):
+        return values["plain_text"]
+    return note.note_text
+
+
+def note_to_dict(note: Note | NoteRecord) -> dict:
+    """
+    Builds Note.to_dict, reading loaded attributes from the instance dict rather
+    than through the ORM's attribute instrumentation.
+    @param note: The note, or its record.
+    @return: The same dict as note.to_dict().
+    """
+    if type(note) is NoteRecord:
+        return note.to_dict()
+    values = note.__dict__
+    try:
+        return {
+            "note_id": values["note_id"],
+            "title": values["note_title"],
+            "text": _note_text(note, values),
+            "public": values["is_public"],
+            "author": values["author_user"].username,
+            "created_at": values["created_at"].isoformat(),
+            "updated_at": values["updated_at"].isoformat(),
+        }
+    except KeyError:
+        # Expired or never loaded; the descriptors load them or raise
+        return note.to_dict()
+
+
+def encode_note(note: Note | NoteRecord, encode_string: Callable[[str], str]) -> str:
+    """
+    Encodes a note exactly as json.dumps encodes its to_dict value with sorted
+    keys and compact separators, without building the dict.
+    @param note: The note to encode, or its record.
+    @param encode_string: Quotes and escapes a string, as the json module does.
+    @return: The JSON object.
+    """
+    if type(note) is NoteRecord:
+        return _NOTE_TEMPLATE % (
+            encode_string(note.author),
+            note.created_at.isoformat(),
+            note.note_id,
+            "true" if note.is_public else "false",
+            encode_string(note.note_text),
+            encode_string(note.note_title),
+            note.updated_at.isoformat(),
+        )
+    values = note.__dict__
+    try:
+        return _NOTE_TEMPLATE % (
+            encode_string(values["author_user"].username),
+            values["created_at"].isoformat(),
+            values["note_id"],
+            "true" if values["is_public"] else "false",
+            encode_string(_note_text(note, values)),
+            encode_string(values["note_title"]),
+            values["updated_at"].isoformat(),
+        )
+    except KeyError:
+        note_dict = note.to_dict()
+        return _NOTE_TEMPLATE % (
+            encode_string(note_dict["author"]),
+            note_dict["created_at"],
+            note_dict["note_id"],
+            "true" if note_dict["public"] else "false",
+            encode_string(note_dict["text"]),
+            encode_string(note_dict["title"]),
+            note_dict["updated_at"],
+        )
+
+
+def available_backends() -> list[str]:
+    """
+    Lists the JSON encoders that are installed, fastest first.
+    @return: The names of the available backends.
+    """
+    available = []
+    if orjson is not None:
+        available.append("orjson")
+    if msgspec is not None:
+        available.append("msgspec")
+    available.append("stdlib")
+    return available
+
+
+class NoteJSONProvider(DefaultJSONProvider):
+    """
+    A JSON provider that encodes compact responses with orjson or msgspec when
+    installed, and notes with precompiled serializers.
+
+    Output is byte for byte what DefaultJSONProvider produces. A payload the
+    fast encoder cannot reproduce exactly, such as one with non-ASCII text while
+    ensure_ascii is set, is encoded again by the standard library. Indented
+    responses, in debug mode or with compact set to False, always use the
+    standard library. The exceptions are values no endpoint returns: floats in
+    exponent notation and NaN or infinity are written differently by both fast
+    encoders, and datetime objects by msgspec.
+    """
+
+    def __init__(self, app: Flask, backend: str = "auto"):
+        super().__init__(app)
+        if backend == "auto":
+            backend = available_backends()[0]
+        if backend not in ("orjson", "msgspec", "stdlib"):
+            raise ValueError(f"Unknown JSON backend: {backend}")
+        if backend not in available_backends():
+            raise ValueError(f"The {backend} JSON backend is not installed")
+        self.backend = backend
+        self._encoder = self._build_encoder(backend)
+
+    def _build_encoder(self, backend: str) -> Callable[[object], bytes] | None:
+        if backend == "orjson":
+            # Leave the types Flask encodes differently to its default function
+            option = (
+                orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_SUBCLASS
+            )
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            default = self.default
+            return lambda obj: orjson.dumps(obj, default=default, option=option)
+        if backend == "msgspec":
+            encoder = msgspec.json.Encoder(
+                enc_hook=self.default,
+                decimal_format="string",
+                order="sorted" if self.sort_keys else None,
+            )
+            return encoder.encode
+        return None
+
+    def _compact(self) -> bool:
+        return self.compact is True or (self.compact is None and not self._app.debug)
+
+    def _encode_fast(self, obj) -> bytes | None:
+        """
+        Encodes an object with the fast encoder.
+        @param obj: The object to encode.
+        @return: Compact JSON, or None if the output would differ from json.dumps.
+        """
+        if self._encoder is None:
+            return None
+        try:
+            data = self._encoder(obj)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        # json.dumps also escapes DEL, which is ASCII
+        if self.ensure_ascii and (not data.isascii() or b"\x7f" in data):
+            return None
+        return data
+
+    def _raw_response(self, data: bytes, status: int = 200) -> Response:
+        return self._app.response_class(
+            data + b"\n", status=status, mimetype=self.mimetype
+        )
+
+    def response(self, *args, **kwargs) -> Response:
+        if self._compact():
+            data = self._encode_fast(self._prepare_response_obj(args, kwargs))
+            if data is not None:
+                return self._raw_response(data)
+        return super().response(*args, **kwargs)
+
+    def _encode_string(self) -> Callable[[str], str]:
+        return encode_basestring_ascii if self.ensure_ascii else encode_basestring
+
+    def _encode_notes(
+        self, notes: Sequence[Note | NoteRecord], next_cursor=None, page=False
+    ):
+        """
+        Encodes notes as a list, or as a page object with their next cursor.
+        @return: Compact JSON, or None if the provider cannot encode it exactly.
+        """
+        if self._encoder is not None:
+            note_dicts = [note_to_dict(note) for note in notes]
+            data = self._encode_fast(
+                {"next_cursor": next_cursor, "notes": note_dicts}
+                if page
+                else note_dicts
+            )
+            if data is not None:
+                return data
+        if not self.sort_keys:
+            return None
+
+        encode_string = self._encode_string()
+        encoded = (
+            "[" + ",".join(encode_note(note, encode_string) for note in notes) + "]"
+        )
+        if page:
+            cursor = "null" if next_cursor is None else encode_string(next_cursor)
+            encoded = f'{{"next_cursor":{cursor},"notes":{encoded}}}'
+        return encoded.encode()
+
+    def note_response(self, note: Note | NoteRecord, status: int = 200) -> Response:
+        """
+        Builds the response of a single note, like jsonify(note.to_dict()).
+        @param note: The note.
+        @param status: The response status.
+        @return: The JSON response.
+        """
+        if self._compact():
+            if self._encoder is not None:
+                data = self._encode_fast(note_to_dict(note))
+            elif self.sort_keys:
+                data = encode_note(note, self._encode_string()).encode()
+            else:
+                data = None
+            if data is not None:
+                return self._raw_response(data, status)
+        response = super().response(note.to_dict())
+        response.status_code = status
+        return response
+
+    def notes_response(self, notes: Sequence[Note | NoteRecord]) -> Response:
+        """
+        Builds the response of a list of notes, like
+        jsonify([note.to_dict() for note in notes]).
+        @param notes: The notes.
+        @return: The JSON response.
+        """
+        if self._compact():
+            data = self._encode_notes(notes)
+            if data is not None:
+                return self._raw_response(data)
+        return super().response([note.to_dict() for note in notes])
+
+    def notes_page_response(
+        self, notes: Sequence[Note | NoteRecord], next_cursor: str | None
+    ) -> Response:
+        """
+        Builds the response of a page of notes, like
+        jsonify(notes=[note.to_dict() for note in notes], next_cursor=next_cursor).
+        @param notes: The notes on the page.
+        @param next_cursor: The cursor of the next page, or None on the last page.
+        @return: The JSON response.
+        """
+        if self._compact():
+            data = self._encode_notes(notes, next_cursor, page=True)
+            if data is not None:
+                return self._raw_response(data)
+        return super().response(
+            notes=[note.to_dict() for note in notes], next_cursor=next_cursor
+        )
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.config import config
+from flask_jwt_extended.internal_utils import verify_token_not_blocklisted
+
+from ..metrics import Counter
+
+JWT_CACHE_HITS = Counter("jwt_cache_hits_total", "Access tokens served from the cache")
+JWT_CACHE_MISSES = Counter(
+    "jwt_cache_misses_total", "Access tokens that had to be fully verified"
+)
+
+
+class JWTCache:
+    """
+    A bounded LRU cache of verified access tokens, keyed by a SHA-256 digest of the
+    raw token so the tokens themselves are never kept. An entry lives for at most
+    ttl_seconds and never past the token's own exp claim.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[bytes, tuple[float, dict, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> tuple[dict, dict] | None:
+        """
+        Looks up a previously verified token.
+        @param token: The raw encoded token.
+        @return: A tuple of (jwt_header, jwt_data), or None if not cached or expired.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, jwt_header, jwt_data = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return jwt_header, jwt_data
+
+    def put(self, token: str, jwt_header: dict, jwt_data: dict):
+        """
+        Caches a token that has just passed full verification.
+        @param token: The raw encoded token.
+        @param jwt_header: The decoded token header.
+        @param jwt_data: The decoded token claims.
+        """
+        expires_at = self._clock() + self.ttl_seconds
+        if "exp" in jwt_data:
+            expires_at = min(expires_at, jwt_data["exp"])
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, jwt_header, jwt_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """
+        Drops a token from the cache, e.g. when it is revoked.
+        @param token: The raw encoded token.
+        """
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _bearer_token() -> str | None:
+    parts = request.headers.get(config.header_name, "").split()
+    if config.header_type:
+        if len(parts) != 2 or parts[0] != config.header_type:
+            return None
+        return parts[1]
+    return parts[0] if len(parts) == 1 else None
+
+
+def _load_verified_jwt(jwt_header: dict, jwt_data: dict):
+    """
+    Sets up the request context as verify_jwt_in_request does for a valid token,
+    so get_jwt() and get_jwt_identity() work in the view. These are private to
+    flask-jwt-extended, which is pinned to an exact version for that reason;
+    test_cached_jwt_required_matches_library_context fails if they change.
+    """
+    verify_token_not_blocklisted(jwt_header, jwt_data)
+    # No user_lookup_loader is registered, so no user is loaded
+    g._jwt_extended_jwt_user = None
+    g._jwt_extended_jwt_header = jwt_header
+    g._jwt_extended_jwt = jwt_data
+    g._jwt_extended_jwt_location = "headers"
+
+
+def cached_jwt_required():
+    """
+    A drop-in for jwt_required() that skips signature verification and claim
+    decoding for access tokens it has already verified. Revocation is still
+    checked on every request through the token blocklist callback.
+    """
+
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            cache: JWTCache = current_app.jwt_cache
+            token = _bearer_token()
+            cached = cache.get(token) if token else None
+
+            if cached is None:
+                JWT_CACHE_MISSES.inc()
+                jwt_header, jwt_data = verify_jwt_in_request()
+                if token:
+                    cache.put(token, jwt_header, jwt_data)
+            else:
+                JWT_CACHE_HITS.inc()
+                _load_verified_jwt(*cached)
+
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+
+        return decorator
+
+    return wrapper
@@ -0,0 +1,457 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import datetime
+
+from ..metrics import Counter, Gauge
+from ..models.note import Note, NoteRecord
+
+try:
+    import redis
+except ImportError:  # The shared cache backend is optional
+    redis = None
+
+NOTE_CACHE_HITS = Counter("note_cache_hits_total", "Notes served from the note cache")
+NOTE_CACHE_MISSES = Counter(
+    "note_cache_misses_total", "Note lookups that had to query the database"
+)
+NOTE_CACHE_EVICTIONS = Counter(
+    "note_cache_evictions_total",
+    "Notes dropped from the in-process note cache to stay within its bounds",
+)
+NOTE_LISTING_CACHE_HITS = Counter(
+    "note_listing_cache_hits_total", "Note listing pages served from the cache"
+)
+NOTE_LISTING_CACHE_MISSES = Counter(
+    "note_listing_cache_misses_total",
+    "Note listing pages that had to query the database",
+)
+NOTE_LISTING_CACHE_EVICTIONS = Counter(
+    "note_listing_cache_evictions_total",
+    "Pages dropped from the in-process listing cache to stay within its bounds",
+)
+# Cached in place of a deleted note until the TTL, so a read that started before
+# the delete committed cannot add the note back
+DELETED_NOTE = b""
+
+NOTE_CACHE_ENTRIES = Gauge("note_cache_entries", "Notes in the in-process note cache")
+NOTE_CACHE_BYTES = Gauge(
+    "note_cache_bytes", "Bytes of serialized notes in the in-process note cache"
+)
+
+
+def _note_values(note: Note | NoteRecord) -> dict:
+    values = note.to_dict()
+    values["author_id"] = note.author_id
+    values["version"] = note.version
+    return values
+
+
+def _note_from_values(values: dict) -> NoteRecord:
+    return NoteRecord(
+        values["note_id"],
+        values["title"],
+        values["text"],
+        values["public"],
+        values["author_id"],
+        values["author"],
+        datetime.fromisoformat(values["created_at"]),
+        datetime.fromisoformat(values["updated_at"]),
+        values["version"],
+    )
+
+
+def dump_note(note: Note | NoteRecord) -> bytes:
+    """
+    Serializes the attributes of a note that reads need.
+    @param note: The note, with its author and text loaded, or its record.
+    @return: The serialized note.
+    """
+    return json.dumps(_note_values(note), separators=(",", ":")).encode("utf-8")
+
+
+def load_note(data: bytes) -> NoteRecord:
+    """
+    Rebuilds a note serialized by dump_note as a record, whose text is held as
+    plain text so reading it decompresses nothing.
+    @param data: The serialized note.
+    @return: The note record.
+    """
+    return _note_from_values(json.loads(data))
+
+
+def dump_listing(
+    notes: Sequence[Note | NoteRecord], next_cursor: str | None = None
+) -> bytes:
+    """
+    Serializes a page of notes.
+    @param notes: The notes on the page.
+    @param next_cursor: The cursor of the next page, if any.
+    @return: The serialized page.
+    """
+    return json.dumps(
+        {"notes": [_note_values(note) for note in notes], "next_cursor": next_cursor},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def load_listing(data: bytes) -> tuple[list[NoteRecord], str | None]:
+    """
+    Rebuilds a page of notes serialized by dump_listing.
+    @param data: The serialized page.
+    @return: The notes on the page and the cursor of the next page.
+    """
+    page = json.loads(data)
+    return [_note_from_values(values) for values in page["notes"]], page["next_cursor"]
+
+
+class NoteCache(ABC):
+    """
+    Caches serialized notes for NoteService, by note ID or by listing key.
+    Entries hold bytes, so every hit returns a fresh copy that callers cannot
+    change for each other.
+    """
+
+    @abstractmethod
+    def get(self, key: int | str) -> bytes | None:
+        """
+        Looks up an entry.
+        @param key: The note ID, or another cache key.
+        @return: The cached bytes, or None if nothing is cached under the key.
+        """
+
+    @abstractmethod
+    def put(self, key: int | str, data: bytes):
+        """
+        Caches an entry, replacing any previous one.
+        @param key: The note ID, or another cache key.
+        @param data: The bytes to cache.
+        """
+
+    @abstractmethod
+    def add(self, key: int | str, data: bytes):
+        """
+        Caches an entry read from the database, unless one exists. A write that
+        lands between the read and this call has already stored the newer
+        note, which must not be replaced by the one read before it.
+        @param key: The note ID, or another cache key.
+        @param data: The bytes to cache.
+        """
+
+    @abstractmethod
+    def invalidate(self, key: int | str):
+        """
+        Drops an entry from the cache.
+        @param key: The note ID, or another cache key.
+        """
+
+
+class LRUNoteCache(NoteCache):
+    """
+    A cache in this process, bounded by entries and by bytes. The least recently
+    used entries are evicted first, and an entry lives for at most
+    ttl_seconds. Other processes do not see its invalidations, so the TTL bounds
+    how long they may serve a note that was changed here.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock=time.monotonic,
+        evictions: Counter = NOTE_CACHE_EVICTIONS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._evictions = evictions
+        self._entries: OrderedDict[int | str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        self._store(key, data, replace=True)
+
+    def add(self, key, data):
+        self._store(key, data, replace=False)
+
+    def _store(self, key: int | str, data: bytes, replace: bool):
+        if len(data) > self.max_bytes:
+            if replace:
+                self.invalidate(key)
+            return
+
+        with self._lock:
+            if key in self._entries:
+                if not replace:
+                    return
+                self._remove(key)
+            self._entries[key] = (self._clock() + self.ttl_seconds, data)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions.inc()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: int | str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalSharedStore:
+    """
+    An in-process stand-in for the Redis client behind SharedNoteCache, for
+    development and tests. It implements the get, set, and delete calls the
+    cache makes.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._values: dict[str, tuple[float | None, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> bytes | None:
+        with self._lock:
+            return self._get(name)
+
+    def _get(self, name: str) -> bytes | None:
+        entry = self._values.get(name)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._values[name]
+            return None
+        return value
+
+    def set(
+        self, name: str, value: bytes, ex: int | None = None, nx: bool = False
+    ) -> bool:
+        expires_at = self._clock() + ex if ex is not None else None
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return False
+            self._values[name] = (expires_at, value)
+            return True
+
+    def delete(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._values.pop(name, None)
+
+    def mget(self, names: Sequence[str]) -> list[bytes | None]:
+        with self._lock:
+            return [self._get(name) for name in names]
+
+    def incr(self, name: str) -> int:
+        with self._lock:
+            value = int(self._get(name) or 0) + 1
+            self._values[name] = (None, str(value).encode("ascii"))
+            return value
+
+
+class SharedNoteCache(NoteCache):
+    """
+    A cache shared by every process, kept in Redis. Invalidations are
+    seen by all processes at once; the TTL only bounds memory use. The key
+    prefixes name the form entries are serialized in, so entries written by
+    processes still running an older form are never read back.
+    """
+
+    def __init__(self, client, ttl_seconds: int, prefix: str = "note:v2:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(f"{self.prefix}{key}")
+
+    def put(self, key, data):
+        self.client.set(f"{self.prefix}{key}", data, ex=self.ttl_seconds)
+
+    def add(self, key, data):
+        self.client.set(f"{self.prefix}{key}", data, ex=self.ttl_seconds, nx=True)
+
+    def invalidate(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+
+class LocalGenerations:
+    """
+    Generation counters kept in this process.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, names: Sequence[str]) -> list[int]:
+        """
+        Reads generation counters.
+        @param names: The names of the counters.
+        @return: The value of each counter, 0 if it was never bumped.
+        """
+        with self._lock:
+            return [self._counters.get(name, 0) for name in names]
+
+    def bump(self, name: str):
+        """
+        Increments a generation counter.
+        @param name: The name of the counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+
+class SharedGenerations:
+    """
+    Generation counters shared by every process, kept in Redis.
+    """
+
+    def __init__(self, client, prefix: str = "generation:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, names: Sequence[str]) -> list[int]:
+        values = self.client.mget([f"{self.prefix}{name}" for name in names])
+        return [int(value or 0) for value in values]
+
+    def bump(self, name: str):
+        self.client.incr(f"{self.prefix}{name}")
+
+
+class ListingCache:
+    """
+    Caches pages of the note listing. Every key embeds the generation of the
+    public feed and of the listing author's notes. A write bumps the
+    generations it affects, after which the entries cached before it stop
+    matching and age out of the cache, so nothing has to be found and deleted.
+    """
+
+    def __init__(
+        self, cache: NoteCache, generations: LocalGenerations | SharedGenerations
+    ):
+        self.cache = cache
+        self.generations = generations
+
+    def key(self, author_id: int, *params) -> str:
+        """
+        Builds the current cache key of a listing page. The key must be built
+        before the page is read from the database, and writes bump the
+        generations only after they commit, so that a write committing in
+        between leaves the page under an outdated key.
+        @param author_id: The ID of the user listing notes.
+        @param params: The parameters that select the page.
+        @return: The cache key.
+        """
+        public, own = self.generations.get(["public", f"author:{author_id}"])
+        return ":".join(map(str, ("notes", author_id, public, own, *params)))
+
+    def get(self, key: str) -> bytes | None:
+        return self.cache.get(key)
+
+    def put(self, key: str, data: bytes):
+        self.cache.put(key, data)
+
+    def bump(self, author_id: int, public: bool = True):
+        """
+        Invalidates the listings a write may have changed. Call it once the
+        write is committed.
+        @param author_id: The ID of the author of the written notes.
+        @param public: Whether a written note was or may have been public.
+        """
+        self.generations.bump(f"author:{author_id}")
+        if public:
+            self.generations.bump("public")
+
+
+def _shared_client(settings):
+    if not settings.NOTE_CACHE_REDIS_URL:
+        return LocalSharedStore()
+    if redis is None:
+        raise ValueError("The shared note cache requires the redis package")
+    return redis.Redis.from_url(settings.NOTE_CACHE_REDIS_URL)
+
+
+def build_note_cache(settings) -> NoteCache | None:
+    """
+    Builds the note cache selected by NOTE_CACHE_BACKEND.
+    @param settings: The application settings.
+    @return: The note cache, or None if caching is disabled.
+    @raises ValueError: If the backend is unknown, or needs the redis package and
+        it is not installed.
+    """
+    backend = settings.NOTE_CACHE_BACKEND
+    if backend == "none":
+        return None
+    if backend == "local":
+        cache = LRUNoteCache(
+            settings.NOTE_CACHE_MAX_ENTRIES,
+            settings.NOTE_CACHE_MAX_BYTES,
+            settings.NOTE_CACHE_TTL_SEC,
+        )
+        NOTE_CACHE_ENTRIES.set_function(lambda: len(cache))
+        NOTE_CACHE_BYTES.set_function(lambda: cache.size_bytes)
+        return cache
+    if backend == "shared":
+        return SharedNoteCache(_shared_client(settings), settings.NOTE_CACHE_TTL_SEC)
+    raise ValueError(f"Unknown note cache backend: {backend}")
+
+
+def build_listing_cache(settings) -> ListingCache | None:
+    """
+    Builds the listing cache for the backend selected by NOTE_CACHE_BACKEND.
+    @param settings: The application settings.
+    @return: The listing cache, or None if caching is disabled.
+    @raises ValueError: If the backend is unknown, or needs the redis package and
+        it is not installed.
+    """
+    backend = settings.NOTE_CACHE_BACKEND
+    if backend == "none":
+        return None
+    if backend == "local":
+        return ListingCache(
+            LRUNoteCache(
+                settings.NOTE_LISTING_CACHE_MAX_ENTRIES,
+                settings.NOTE_CACHE_MAX_BYTES,
+                settings.NOTE_CACHE_TTL_SEC,
+                evictions=NOTE_LISTING_CACHE_EVICTIONS,
+            ),
+            LocalGenerations(),
+        )
+    if backend == "shared":
+        client = _shared_client(settings)
+        return ListingCache(
+            SharedNoteCache(client, settings.NOTE_CACHE_TTL_SEC, prefix="listing:v2:"),
+            SharedGenerations(client),
+        )
+    raise ValueError(f"Unknown note cache backend: {backend}")
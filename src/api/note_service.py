@@ -1,28 +1,343 @@
-from collections.abc import Sequence
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime
+
+from sqlalchemy import Row
+
+from ..config import settings
 from ..db import notes as NotesDB
-from ..models.note import Note
+from ..db.database import on_commit
+from .cursor import decode_cursor, encode_cursor
+from .note_cache import (
+    DELETED_NOTE,
+    NOTE_CACHE_HITS,
+    NOTE_CACHE_MISSES,
+    NOTE_LISTING_CACHE_HITS,
+    NOTE_LISTING_CACHE_MISSES,
+    ListingCache,
+    NoteCache,
+    build_listing_cache,
+    build_note_cache,
+    dump_listing,
+    dump_note,
+    load_listing,
+    load_note,
+)
+from ..models.note import Note, NoteRecord, note_row_to_dict
 
 
 class NoteService:
-    def __init__(self, notes_db: NotesDB):
+    def __init__(
+        self,
+        notes_db: NotesDB,
+        cache: NoteCache | None = None,
+        listing_cache: ListingCache | None = None,
+    ):
         self.notes_db = notes_db
+        self.cache = cache
+        self.listing_cache = listing_cache
 
     def get_notes(
         self, author_id: int, page: int = 1, page_size: int = 10
-    ) -> Sequence[Note]:
-        return self.notes_db.get_notes_for_user(author_id, page, page_size)
+    ) -> Sequence[NoteRecord]:
+        if self.listing_cache is None:
+            return self.notes_db.get_notes_for_user(author_id, page, page_size)
 
-    def get_note_by_id(self, author_id: int, note_id: int) -> Note | None:
-        note = self.notes_db.get_note_by_id(note_id)
+        key = self.listing_cache.key(author_id, "page", page, page_size)
+        data = self.listing_cache.get(key)
+        if data is not None:
+            NOTE_LISTING_CACHE_HITS.inc()
+            return load_listing(data)[0]
+
+        NOTE_LISTING_CACHE_MISSES.inc()
+        notes = self.notes_db.get_notes_for_user(author_id, page, page_size)
+        self.listing_cache.put(key, dump_listing(notes))
+        return notes
+
+    def get_notes_page(
+        self, author_id: int, cursor: str | None = None, page_size: int = 10
+    ) -> tuple[Sequence[NoteRecord], str | None]:
+        after_note_id = decode_cursor(cursor)[0] if cursor else 0
+        if self.listing_cache is None:
+            return self._get_notes_page(author_id, after_note_id, page_size)
+
+        key = self.listing_cache.key(author_id, "after", after_note_id, page_size)
+        data = self.listing_cache.get(key)
+        if data is not None:
+            NOTE_LISTING_CACHE_HITS.inc()
+            return load_listing(data)
+
+        NOTE_LISTING_CACHE_MISSES.inc()
+        notes, next_cursor = self._get_notes_page(author_id, after_note_id, page_size)
+        self.listing_cache.put(key, dump_listing(notes, next_cursor))
+        return notes, next_cursor
+
+    def _get_notes_page(
+        self, author_id: int, after_note_id: int, page_size: int
+    ) -> tuple[Sequence[NoteRecord], str | None]:
+        # Fetch one extra row to learn whether another page exists
+        notes = self.notes_db.get_notes_for_user_after(
+            author_id, after_note_id, page_size + 1
+        )
+        return self._keyset_page(notes, page_size)
+
+    def get_note_summaries(
+        self,
+        author_id: int,
+        page: int = 1,
+        page_size: int = 10,
+        excerpt_length: int = 0,
+    ) -> Sequence[Row]:
+        return self.notes_db.get_note_summaries_for_user(
+            author_id, page, page_size, excerpt_length
+        )
+
+    def get_note_summaries_page(
+        self,
+        author_id: int,
+        cursor: str | None = None,
+        page_size: int = 10,
+        excerpt_length: int = 0,
+    ) -> tuple[Sequence[Row], str | None]:
+        after_note_id = decode_cursor(cursor)[0] if cursor else 0
+        summaries = self.notes_db.get_note_summaries_for_user_after(
+            author_id, after_note_id, page_size + 1, excerpt_length
+        )
+        return self._keyset_page(summaries, page_size)
+
+    def search_notes(
+        self,
+        author_id: int,
+        query: str,
+        cursor: str | None = None,
+        page_size: int = 10,
+    ) -> tuple[Sequence[NoteRecord], str | None]:
+        after = tuple(decode_cursor(cursor, 2)) if cursor else None
+        # Fetch one extra result to learn whether another page exists
+        results = self.notes_db.search_notes_for_user(
+            author_id, query, after, page_size + 1
+        )
+        next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            rank, note = results[-1]
+            next_cursor = encode_cursor(rank, note.note_id)
+        return [note for _, note in results], next_cursor
+
+    def get_note_fields(
+        self,
+        author_id: int,
+        fields: Sequence[str],
+        page: int = 1,
+        page_size: int = 10,
+    ) -> Sequence[Row]:
+        return self.notes_db.get_note_fields_for_user(
+            author_id, fields, page, page_size
+        )
+
+    def get_note_fields_page(
+        self,
+        author_id: int,
+        fields: Sequence[str],
+        cursor: str | None = None,
+        page_size: int = 10,
+    ) -> tuple[Sequence[Row], str | None]:
+        after_note_id = decode_cursor(cursor)[0] if cursor else 0
+        rows = self.notes_db.get_note_fields_for_user_after(
+            author_id, fields, after_note_id, page_size + 1
+        )
+        return self._keyset_page(rows, page_size)
+
+    def get_note_fields_by_id(
+        self, author_id: int, note_id: int, fields: Sequence[str]
+    ) -> Row | None:
+        return self.notes_db.get_note_fields_by_id(author_id, note_id, fields)
+
+    def export_notes(
+        self, author_id: int, after_note_id: int = 0, batch_size: int = 500
+    ) -> Iterator[list[dict]]:
+        # Batches of to_dict values, read past the caches one keyset query at a time
+        for rows in self.notes_db.stream_notes_for_user(
+            author_id, after_note_id, batch_size
+        ):
+            yield [note_row_to_dict(row) for row in rows]
+
+    def backfill_note_storage(
+        self, after_note_id: int = 0, batch_size: int = 500
+    ) -> int | None:
+        return self.notes_db.backfill_note_storage(after_note_id, batch_size)
+
+    def index_note_contents(self, batch_size: int = 500) -> int:
+        return self.notes_db.index_note_contents(batch_size)
+
+    def purge_note_contents(self, batch_size: int = 500) -> int:
+        return self.notes_db.purge_unreferenced_contents(batch_size)
+
+    def get_note_storage_stats(self) -> dict:
+        stats = self.notes_db.get_content_stats()
+        # Bytes of note text per byte of distinct text
+        stats["dedup_ratio"] = (
+            stats["logical_bytes"] / stats["unique_bytes"]
+            if stats["unique_bytes"]
+            else 1.0
+        )
+        return stats
+
+    @staticmethod
+    def _keyset_page(items: Sequence, page_size: int) -> tuple[Sequence, str | None]:
+        if len(items) <= page_size:
+            return items, None
+
+        items = items[:page_size]
+        return items, encode_cursor(items[-1].note_id)
+
+    def get_note_version(
+        self, author_id: int, note_id: int
+    ) -> tuple[int, datetime] | None:
+        # The (version, updated_at) of the note, answered from the cache or
+        # without loading the note text
+        data = self._cached_note(note_id) if self.cache is not None else None
+        if data is not None:
+            NOTE_CACHE_HITS.inc()
+            note = load_note(data)
+            visible = note.is_public or note.author_id == author_id
+            return (note.version, note.updated_at) if visible else None
+
+        row = self.notes_db.get_note_version(author_id, note_id)
+        return (row.version, row.updated_at) if row is not None else None
+
+    def get_note_versions(
+        self, author_id: int, page: int = 1, page_size: int = 10
+    ) -> list[tuple[int, int]]:
+        # The (note_id, version) of the notes get_notes would return
+        if self.listing_cache is not None:
+            data = self.listing_cache.get(
+                self.listing_cache.key(author_id, "page", page, page_size)
+            )
+            if data is not None:
+                NOTE_LISTING_CACHE_HITS.inc()
+                return [(note.note_id, note.version) for note in load_listing(data)[0]]
+
+        rows = self.notes_db.get_note_versions_for_user(author_id, page, page_size)
+        return [(row.note_id, row.version) for row in rows]
+
+    def get_note_versions_page(
+        self, author_id: int, cursor: str | None = None, page_size: int = 10
+    ) -> tuple[list[tuple[int, int]], str | None]:
+        # The (note_id, version) of the notes get_notes_page would return
+        after_note_id = decode_cursor(cursor)[0] if cursor else 0
+        if self.listing_cache is not None:
+            data = self.listing_cache.get(
+                self.listing_cache.key(author_id, "after", after_note_id, page_size)
+            )
+            if data is not None:
+                NOTE_LISTING_CACHE_HITS.inc()
+                notes, next_cursor = load_listing(data)
+                return [(note.note_id, note.version) for note in notes], next_cursor
+
+        # Fetch one extra row to learn whether another page exists
+        rows, next_cursor = self._keyset_page(
+            self.notes_db.get_note_versions_for_user_after(
+                author_id, after_note_id, page_size + 1
+            ),
+            page_size,
+        )
+        return [(row.note_id, row.version) for row in rows], next_cursor
+
+    def get_note_by_id(self, author_id: int, note_id: int) -> NoteRecord | None:
+        note = self._get_note(note_id)
         if note is None:
             return None
 
         return note if note.is_public or note.author_id == author_id else None
 
+    def _get_note(self, note_id: int) -> NoteRecord | None:
+        if self.cache is None:
+            return self.notes_db.get_note_by_id(note_id)
+
+        data = self._cached_note(note_id)
+        if data is not None:
+            NOTE_CACHE_HITS.inc()
+            return load_note(data)
+
+        NOTE_CACHE_MISSES.inc()
+        note = self.notes_db.get_note_by_id(note_id)
+        if note is not None:
+            self.cache.add(note_id, dump_note(note))
+        return note
+
+    def _cached_note(self, note_id: int) -> bytes | None:
+        data = self.cache.get(note_id)
+        return None if data == DELETED_NOTE else data
+
+    def _cache_notes(self, notes: Iterable[Note]):
+        # Stored once the write commits, so a request that rolls back leaves the
+        # cache as it was; serialized now, while the notes are loaded
+        if self.cache is not None:
+            entries = [(note.note_id, dump_note(note)) for note in notes]
+            on_commit(lambda: self._put_notes(entries))
+
+    def _uncache_notes(self, note_ids: Iterable[int]):
+        # Replaced by tombstones once the delete commits, which a read that
+        # started before the commit cannot overwrite with the deleted note
+        if self.cache is not None:
+            entries = [(note_id, DELETED_NOTE) for note_id in note_ids]
+            on_commit(lambda: self._put_notes(entries))
+
+    def _put_notes(self, entries: list[tuple[int, bytes]]):
+        for note_id, data in entries:
+            self.cache.put(note_id, data)
+
+    def _invalidate_listings(self, author_id: int, public: bool = True):
+        # Updates and deletes do not know whether the note was public before.
+        # Bumped once the write commits: a page read before that, and cached
+        # under the key it had then, stops matching as soon as it could be stale
+        if self.listing_cache is not None:
+            on_commit(lambda: self.listing_cache.bump(author_id, public))
+
     def create_note(
         self, note_title: str, note_text: str, author_id: int, is_public: bool = False
     ) -> Note:
-        return self.notes_db.create_note(note_title, note_text, author_id, is_public)
+        note = self.notes_db.create_note(note_title, note_text, author_id, is_public)
+        self._cache_notes([note])
+        self._invalidate_listings(author_id, is_public)
+        return note
+
+    def create_notes(
+        self, author_id: int, notes: Sequence[tuple[str, str, bool]]
+    ) -> list[Note]:
+        created = self.notes_db.create_notes(author_id, notes)
+        self._cache_notes(created)
+        if created:
+            self._invalidate_listings(
+                author_id, any(note.is_public for note in created)
+            )
+        return created
+
+    def import_notes(
+        self, author_id: int, notes: Sequence[tuple[str, str, bool]]
+    ) -> int:
+        imported = self.notes_db.import_notes(author_id, notes)
+        if imported:
+            self._invalidate_listings(
+                author_id, any(is_public for _, _, is_public in notes)
+            )
+        return imported
+
+    def update_notes(
+        self, author_id: int, notes: Sequence[tuple[int, str, str, bool]]
+    ) -> dict[int, Note]:
+        updated = self.notes_db.update_notes(author_id, notes)
+        self._cache_notes(updated.values())
+        if updated:
+            self._invalidate_listings(author_id)
+        return updated
+
+    def delete_notes(self, author_id: int, note_ids: Sequence[int]) -> set[int]:
+        deleted = self.notes_db.delete_notes(author_id, note_ids)
+        self._uncache_notes(deleted)
+        if deleted:
+            self._invalidate_listings(author_id)
+        return deleted
 
     def update_note(
         self,
@@ -31,13 +346,24 @@ class NoteService:
         note_text: str,
         author_id: int,
         is_public: bool = False,
-    ) -> Note:
-        return self.notes_db.update_note(
-            note_id, note_title, note_text, author_id, is_public
+        expected_version: int | None = None,
+    ) -> NoteRecord | None:
+        note = self.notes_db.update_note(
+            note_id, note_title, note_text, author_id, is_public, expected_version
         )
+        if note is not None:
+            self._cache_notes([note])
+            self._invalidate_listings(author_id)
+        return note
 
     def delete_note(self, author_id: int, note_id: int) -> bool:
-        return self.notes_db.delete_note(author_id, note_id)
+        deleted = self.notes_db.delete_note(author_id, note_id)
+        if deleted:
+            self._uncache_notes([note_id])
+            self._invalidate_listings(author_id)
+        return deleted
 
 
-note_service = NoteService(NotesDB)
+note_service = NoteService(
+    NotesDB, build_note_cache(settings), build_listing_cache(settings)
+)
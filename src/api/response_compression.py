@@ -0,0 +1,208 @@
+import zlib
+from collections.abc import Iterable, Iterator
+
+from flask import Response
+from werkzeug.datastructures import Accept
+
+from ..metrics import Counter
+from .etag import coded_etag
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # brotli support is optional
+    brotli = None
+
+RESPONSES_COMPRESSED = Counter(
+    "http_responses_compressed_total", "Responses sent with a Content-Encoding"
+)
+RESPONSE_BYTES_IN = Counter(
+    "http_response_compression_input_bytes_total",
+    "Bytes of response bodies before compression",
+)
+RESPONSE_BYTES_OUT = Counter(
+    "http_response_compression_output_bytes_total",
+    "Bytes of response bodies after compression",
+)
+
+# Buffered bodies are fed to the compressor in slices of this size, so the
+# compressed body is streamed instead of built next to the uncompressed one
+CHUNK_SIZE = 64 * 1024
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson")
+# 206 bodies are byte ranges of the uncompressed representation
+UNCOMPRESSED_STATUSES = (204, 206, 304)
+
+
+class _GzipStream:
+    def __init__(self, level: int | None):
+        level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        # wbits 16 + 15 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + 15)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _ZstdStream:
+    def __init__(self, level: int | None):
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        self._compressor = compressor.compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, level: int | None):
+        self._compressor = brotli.Compressor(
+            mode=brotli.MODE_TEXT, quality=5 if level is None else level
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+ENCODINGS = {"gzip": _GzipStream, "zstd": _ZstdStream, "br": _BrotliStream}
+
+
+def available_encodings() -> list[str]:
+    """
+    Lists the content codings whose compressor is installed.
+    @return: The names of the available content codings.
+    """
+    available = ["gzip"]
+    if zstandard is not None:
+        available.append("zstd")
+    if brotli is not None:
+        available.append("br")
+    return available
+
+
+def _slices(body: bytes) -> Iterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield view[start : start + CHUNK_SIZE]
+
+
+class ResponseCompressor:
+    """
+    Compresses response bodies with the content coding a client accepts.
+
+    Buffered bodies of at least `min_bytes` are compressed; streamed bodies, whose
+    size is unknown up front, always are, and each of their chunks is flushed so
+    clients receive them as they are produced. Either way the compressed body is
+    produced chunk by chunk while it is sent, never held in memory as a whole.
+    A compressed response's ETag names its coding, see coded_etag.
+    """
+
+    def __init__(
+        self,
+        encodings: Iterable[str] = ("zstd", "br", "gzip"),
+        level: int | None = None,
+        min_bytes: int = 1024,
+    ):
+        encodings = list(encodings)
+        for encoding in encodings:
+            if encoding not in ENCODINGS:
+                raise ValueError(f"Unknown response compression encoding: {encoding}")
+        # Preferred first; codecs that are not installed are skipped
+        available = available_encodings()
+        self.encodings = [encoding for encoding in encodings if encoding in available]
+        self.level = level
+        self.min_bytes = min_bytes
+
+    def negotiate(self, accept_encodings: Accept) -> str | None:
+        """
+        Picks the content coding to send.
+        @param accept_encodings: The parsed Accept-Encoding header of the request.
+        @return: The accepted coding with the highest quality, preferring codings
+            listed earlier on ties, or None to send the body as is.
+        """
+        if not self.encodings:
+            return None
+        return accept_encodings.best_match(self.encodings)
+
+    def _compressible(self, response: Response) -> bool:
+        return (
+            200 <= response.status_code < 300
+            and response.status_code not in UNCOMPRESSED_STATUSES
+            and not response.direct_passthrough
+            and "Content-Encoding" not in response.headers
+            and (
+                response.mimetype in COMPRESSIBLE_MIMETYPES
+                or response.mimetype.startswith("text/")
+            )
+        )
+
+    def compress(self, response: Response, accept_encodings: Accept) -> Response:
+        """
+        Compresses a response for the current request, if it is worth it.
+        @param response: The response about to be sent.
+        @param accept_encodings: The parsed Accept-Encoding header of the request.
+        @return: The same response, with its body replaced by a compressing
+            stream if a coding was chosen.
+        """
+        if not self._compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+
+        streamed = response.is_streamed
+        if not streamed and response.calculate_content_length() < self.min_bytes:
+            return response
+        encoding = self.negotiate(accept_encodings)
+        if encoding is None:
+            return response
+
+        if streamed:
+            chunks = response.iter_encoded()
+        else:
+            chunks = _slices(response.get_data())
+        stream = ENCODINGS[encoding](self.level)
+        response.response = self._stream(stream, chunks, flush_each=streamed)
+        response.headers["Content-Encoding"] = encoding
+        response.headers.pop("Content-Length", None)
+        etag = response.headers.get("ETag")
+        if etag is not None:
+            response.headers["ETag"] = coded_etag(etag, encoding)
+        RESPONSES_COMPRESSED.inc()
+        return response
+
+    @staticmethod
+    def _stream(stream, chunks: Iterable[bytes], flush_each: bool) -> Iterator[bytes]:
+        bytes_in = bytes_out = 0
+        for chunk in chunks:
+            bytes_in += len(chunk)
+            data = stream.compress(chunk)
+            if flush_each:
+                data += stream.flush()
+            if data:
+                bytes_out += len(data)
+                yield data
+        data = stream.finish()
+        bytes_out += len(data)
+        RESPONSE_BYTES_IN.inc(bytes_in)
+        RESPONSE_BYTES_OUT.inc(bytes_out)
+        yield data
@@ -1,21 +1,17 @@
 from flask_jwt_extended import create_access_token
 
+from ..db import refresh_tokens as RefreshTokensDB
 from ..db import users as UsersDB
 from ..exceptions.auth_exception import AuthException
+from ..models.user import User
 
 
 class UserService:
-    def __init__(self, users_db: UsersDB):
+    def __init__(self, users_db: UsersDB, refresh_tokens_db: RefreshTokensDB):
         self.users_db = users_db
+        self.refresh_tokens_db = refresh_tokens_db
 
-    def register_user(self, username: str, password: str) -> str:
-        """
-        Registers a new user with the given username and password.
-        @param username: The username of the new user.
-        @param password: The password of the new user.
-        @return: An access token for the new user.
-        """
-        user = self.users_db.create_user(username, password)
+    def _create_access_token(self, user: User) -> str:
         return create_access_token(
             identity={
                 "username": user.username,
@@ -23,21 +19,41 @@ class UserService:
             }
         )
 
-    def login(self, username: str, password: str) -> str:
+    def register_user(self, username: str, password: str) -> tuple[str, str]:
+        """
+        Registers a new user with the given username and password.
+        @param username: The username of the new user.
+        @param password: The password of the new user.
+        @return: A tuple of an access token and a refresh token for the new user.
+        """
+        user = self.users_db.create_user(username, password)
+        refresh_token = self.refresh_tokens_db.create_refresh_token(user.user_id)
+        return self._create_access_token(user), refresh_token
+
+    def login(self, username: str, password: str) -> tuple[str, str]:
         """
         Logs in the user with the given username and password.
         @param username: The username of the user.
         @param password: The password of the user.
         @raises AuthException: If the username or password is invalid.
-        @return: An access token for the user.
+        @return: A tuple of an access token and a refresh token for the user.
         """
         user = self.users_db.check_password(username, password)
-        return create_access_token(
-            identity={
-                "username": user.username,
-                "user_id": user.user_id,
-            }
+        refresh_token = self.refresh_tokens_db.create_refresh_token(user.user_id)
+        return self._create_access_token(user), refresh_token
+
+    def refresh(self, refresh_token: str) -> tuple[str, str]:
+        """
+        Exchanges a refresh token for a new access token and a new refresh token,
+        without checking the password again.
+        @param refresh_token: The refresh token.
+        @raises AuthException: If the refresh token is invalid, expired or reused.
+        @return: A tuple of a new access token and a new refresh token.
+        """
+        user, new_refresh_token = self.refresh_tokens_db.rotate_refresh_token(
+            refresh_token
         )
+        return self._create_access_token(user), new_refresh_token
 
     def get_user_id_from_token(self, token) -> int:
         """
@@ -50,4 +66,4 @@ class UserService:
         return token["user_id"]
 
 
-user_service = UserService(UsersDB)
+user_service = UserService(UsersDB, RefreshTokensDB)
@@ -1,26 +1,290 @@
-from flask import Flask, request, jsonify
-from flask_jwt_extended import JWTManager, get_jwt_identity, jwt_required
+import json
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import Flask, Response, request, jsonify
+from flask_jwt_extended import JWTManager, get_jwt_identity
 from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+from werkzeug.http import quote_etag, unquote_etag
 
 from .exceptions.auth_exception import AuthException
+from .exceptions.hash_pool_saturated_exception import HashPoolSaturatedException
+from .exceptions.invalid_cursor_exception import InvalidCursorException
+from .exceptions.stale_note_exception import StaleNoteException
 from .exceptions.user_exists_exception import UserAlreadyExistsException
 
+from .api.etag import listing_etag, note_etag, parse_note_etag, uncoded_etag
+from .api.json_provider import NoteJSONProvider
+from .api.jwt_cache import JWTCache, cached_jwt_required
 from .api.note_service import NoteService, note_service
+from .api.response_compression import ResponseCompressor
 from .api.user_service import UserService, user_service
-from .config import Settings, settings
+from .config import TRUTHY, Settings, settings
+from .db import database
+from .metrics import REGISTRY
+from .models.note import NOTE_FIELDS, note_row_to_dict
+from .security.passwords import calibrate_iterations
 
 INTERNAL_SERVER_ERROR = "Internal Server Error"
 MAX_PAGE_SIZE = 100
+SUMMARY_EXCERPT_LENGTH = 200
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+# Only the first errors of an import are reported; the rest are only counted
+MAX_IMPORT_ERRORS = 100
+# The length of notes.note_title
+MAX_TITLE_LENGTH = 255
+
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    """
+    Validates a sparse fieldset against the keys of Note.to_dict.
+    @param fields: The comma-separated value of the fields query parameter, if any.
+    @return: The requested keys in to_dict order, or None if no fieldset was given.
+    @raises BadRequest: If the fieldset is empty or names an unknown field.
+    """
+    if fields is None:
+        return None
+
+    requested = {field.strip() for field in fields.split(",")}
+    if not requested - {""} or not requested <= NOTE_FIELDS.keys():
+        raise BadRequest("Invalid fields")
+    return [field for field in NOTE_FIELDS if field in requested]
+
+
+def _parse_batch_operation(operation) -> tuple[str, tuple]:
+    """
+    Validates one operation of a notes batch.
+    @param operation: The operation as decoded from the request body.
+    @return: The operation name and the arguments for its bulk NoteService method.
+    @raises BadRequest: If the operation is malformed.
+    """
+    if not isinstance(operation, dict):
+        raise BadRequest("Operation must be an object")
+
+    op = operation.get("op", None)
+    if op not in ("create", "update", "delete"):
+        raise BadRequest("Unknown operation")
+
+    if op != "create":
+        note_id = operation.get("note_id", None)
+        if not isinstance(note_id, int) or isinstance(note_id, bool):
+            raise BadRequest("Missing note_id")
+        if op == "delete":
+            return op, (note_id,)
+
+    note_title, note_text, is_public = _parse_note_values(operation)
+    if op == "create":
+        return op, (note_title, note_text, is_public)
+    return op, (note_id, note_title, note_text, is_public)
+
+
+def _read_lines(stream, max_line_bytes: int) -> Iterator[tuple[int, bytes | None]]:
+    """
+    Reads a stream line by line without ever holding more than one line.
+    @param stream: The binary stream to read.
+    @param max_line_bytes: The length of the longest line to return.
+    @return: An iterator of (line number, line) tuples, numbered from 1. Longer
+        lines are skipped and returned as None.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            break
+        line_number += 1
+        if len(line) <= max_line_bytes or line.endswith(b"\n"):
+            yield line_number, line
+            continue
+        # Skip the rest of the line
+        while line and not line.endswith(b"\n"):
+            line = stream.readline(max_line_bytes)
+        yield line_number, None
+
+
+def _parse_import_line(line: bytes | None) -> tuple[str, str, bool]:
+    """
+    Validates one line of a notes import.
+    @param line: The line, or None if it was too long.
+    @return: The (title, text, is_public) of the note.
+    @raises BadRequest: If the line is not a valid note.
+    """
+    if line is None:
+        raise BadRequest("Line too long")
+    try:
+        note = json.loads(line)
+    except ValueError:
+        raise BadRequest("Invalid JSON")
+    if not isinstance(note, dict):
+        raise BadRequest("Note must be an object")
+    return _parse_note_values(note)
+
+
+def _parse_note_values(note: dict) -> tuple[str, str, bool]:
+    """
+    Validates the values of a note written in bulk.
+    @param note: The note as decoded from the request.
+    @return: The (title, text, is_public) of the note.
+    @raises BadRequest: If the values are not a valid note.
+    """
+    note_title = note.get("title", None)
+    note_text = note.get("text", None)
+    is_public = note.get("public", False)
+    if (
+        not note_title
+        or not note_text
+        or not isinstance(note_title, str)
+        or not isinstance(note_text, str)
+    ):
+        raise BadRequest("Missing note title or text")
+    # One invalid row would fail the statement of its whole batch
+    if len(note_title) > MAX_TITLE_LENGTH:
+        raise BadRequest("Title too long")
+    if not isinstance(is_public, bool):
+        raise BadRequest("Invalid public")
+    return note_title, note_text, is_public
+
+
+def _is_conditional() -> bool:
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def _not_modified(etag: str, last_modified: datetime | None = None) -> str | None:
+    """
+    Evaluates the conditional GET headers of the current request. If-None-Match
+    takes precedence over If-Modified-Since, and also matches the ETags the
+    representation had with a content coding.
+    @param etag: The quoted ETag of the current representation.
+    @param last_modified: When the resource was last updated (UTC), if known.
+    @return: The ETag to send with a 304, which is the client's own when it
+        matched one with a content coding, or None if the client's copy is not
+        current.
+    """
+    if request.if_none_match:
+        if request.if_none_match.star_tag:
+            return etag
+        value = unquote_etag(etag)[0]
+        for tag in request.if_none_match.as_set(include_weak=True):
+            if uncoded_etag(tag) == value:
+                return quote_etag(tag)
+        return None
+    if last_modified is not None and request.if_modified_since is not None:
+        if last_modified.replace(tzinfo=timezone.utc) <= request.if_modified_since:
+            return etag
+    return None
+
+
+def _last_modified(updated_at: datetime) -> datetime | None:
+    """
+    Builds the Last-Modified of a note. updated_at only has one-second
+    resolution, so until its second is over a later write can leave it
+    unchanged; a note updated in the current second has no Last-Modified yet,
+    and If-Modified-Since is not answered from it.
+    @param updated_at: When the note was last updated (UTC).
+    @return: The update time, or None if it is not yet a safe validator.
+    """
+    current_second = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+    return updated_at if updated_at < current_second else None
+
+
+def _validators(response: Response, etag: str, last_modified: datetime | None = None):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return response
 
 
 def create_app(user_serv: UserService, note_serv: NoteService, settings: Settings):
     app = Flask(__name__)
+    app.json = NoteJSONProvider(app, settings.JSON_BACKEND)
     app.config["JWT_SECRET_KEY"] = settings.JWT_SECRET_KEY
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(
+        seconds=settings.ACCESS_TOKEN_EXPIRES_SEC
+    )
+    app.config["HASH_POOL_RETRY_AFTER_SEC"] = settings.HASH_POOL_RETRY_AFTER_SEC
+    app.config["NOTES_BATCH_MAX_OPERATIONS"] = settings.NOTES_BATCH_MAX_OPERATIONS
+    app.config["NOTES_EXPORT_BATCH_SIZE"] = settings.NOTES_EXPORT_BATCH_SIZE
+    app.config["NOTES_IMPORT_BATCH_SIZE"] = settings.NOTES_IMPORT_BATCH_SIZE
 
     app.user_service = user_serv
     app.note_service = note_serv
 
     jwt = JWTManager(app)
+    database.init_app(app)
+    app.jwt_cache = JWTCache(settings.JWT_CACHE_MAX_ENTRIES, settings.JWT_CACHE_TTL_SEC)
+    app.response_compressor = ResponseCompressor(
+        settings.RESPONSE_COMPRESSION_ENCODINGS,
+        settings.RESPONSE_COMPRESSION_LEVEL,
+        settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    )
+
+    @app.after_request
+    def compress_response(response: Response):
+        return app.response_compressor.compress(response, request.accept_encodings)
+
+    def service_unavailable():
+        return (
+            jsonify({"error": "Service busy, try again later"}),
+            503,
+            {"Retry-After": str(app.config["HASH_POOL_RETRY_AFTER_SEC"])},
+        )
+
+    @app.cli.command("calibrate-password-hash")
+    @click.option("--target-ms", default=100.0, help="Target time per password hash.")
+    def calibrate_password_hash(target_ms: float):
+        """Print the PASSWORD_HASH_ITERATIONS that meets --target-ms on this CPU."""
+        click.echo(f"PASSWORD_HASH_ITERATIONS={calibrate_iterations(target_ms)}")
+
+    @app.cli.command("backfill-note-storage")
+    @click.option("--batch-size", default=500, help="Notes converted per transaction.")
+    @click.option("--after", default=0, help="Note ID to resume after.")
+    def backfill_note_storage(batch_size: int, after: int):
+        """Move the text of notes still stored inline into shared bodies."""
+        converted = 0
+        while True:
+            last_note_id = app.note_service.backfill_note_storage(after, batch_size)
+            if last_note_id is None:
+                break
+            after = last_note_id
+            converted += 1
+            click.echo(f"Converted batch {converted}, up to note {after}")
+        click.echo("Backfill complete")
+
+    @app.cli.command("index-note-contents")
+    @click.option("--batch-size", default=500, help="Bodies indexed per transaction.")
+    def index_note_contents(batch_size: int):
+        """Compute the search terms of note bodies stored before search existed."""
+        indexed = 0
+        while True:
+            count = app.note_service.index_note_contents(batch_size)
+            if not count:
+                break
+            indexed += count
+        click.echo(f"Indexed {indexed} note bodies")
+
+    @app.cli.command("purge-note-contents")
+    @click.option("--batch-size", default=500, help="Bodies deleted per transaction.")
+    def purge_note_contents(batch_size: int):
+        """Delete shared note bodies that no note points at any more."""
+        purged = 0
+        while True:
+            deleted = app.note_service.purge_note_contents(batch_size)
+            if not deleted:
+                break
+            purged += deleted
+        click.echo(f"Purged {purged} unreferenced note bodies")
+
+    @app.cli.command("note-storage-stats")
+    def note_storage_stats():
+        """Print how much storage sharing note bodies saves."""
+        for key, value in app.note_service.get_note_storage_stats().items():
+            click.echo(
+                f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+            )
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
     @app.route("/v1/register_user", methods=["POST"])
     def register_user():
@@ -31,8 +295,17 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             if not username or not password:
                 raise BadRequest("Missing username or password")
 
-            access_token = app.user_service.register_user(username, password)
-            return jsonify(message="User registered", access_token=access_token), 200
+            access_token, refresh_token = app.user_service.register_user(
+                username, password
+            )
+            return (
+                jsonify(
+                    message="User registered",
+                    access_token=access_token,
+                    refresh_token=refresh_token,
+                ),
+                200,
+            )
         except BadRequest as e:
             return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except UnsupportedMediaType as e:
@@ -42,6 +315,8 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             )
         except UserAlreadyExistsException:
             return jsonify({"error": "User already exists"}), 409
+        except HashPoolSaturatedException:
+            return service_unavailable()
         except Exception as e:
             app.log_exception(e)
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
@@ -54,8 +329,8 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             if not username or not password:
                 raise BadRequest("Missing username or password")
 
-            access_token = app.user_service.login(username, password)
-            return jsonify(access_token=access_token), 200
+            access_token, refresh_token = app.user_service.login(username, password)
+            return jsonify(access_token=access_token, refresh_token=refresh_token), 200
         except BadRequest as e:
             return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except UnsupportedMediaType as e:
@@ -65,12 +340,36 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             )
         except AuthException:
             return jsonify({"error": "Invalid username or password"}), 401
+        except HashPoolSaturatedException:
+            return service_unavailable()
+        except Exception as e:
+            app.log_exception(e)
+            return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
+
+    @app.route("/v1/token/refresh", methods=["POST"])
+    def refresh_token():
+        try:
+            refresh_token = request.json.get("refresh_token", None)
+            if not refresh_token:
+                raise BadRequest("Missing refresh_token")
+
+            access_token, refresh_token = app.user_service.refresh(refresh_token)
+            return jsonify(access_token=access_token, refresh_token=refresh_token), 200
+        except BadRequest as e:
+            return jsonify({"error": "Bad request: " + e.get_description()}), 400
+        except UnsupportedMediaType as e:
+            return (
+                jsonify({"error": "Unsupported media type: " + e.get_description()}),
+                415,
+            )
+        except AuthException:
+            return jsonify({"error": "Invalid refresh token"}), 401
         except Exception as e:
             app.log_exception(e)
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
     @app.route("/v1/protected", methods=["GET"])
-    @jwt_required()
+    @cached_jwt_required()
     def protected():
         try:
             return jsonify(logged_in_as=get_jwt_identity()), 200
@@ -79,7 +378,7 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
     @app.route("/v1/notes", methods=["GET"])
-    @jwt_required()
+    @cached_jwt_required()
     def get_notes():
         try:
             user_identity = get_jwt_identity()
@@ -89,11 +388,106 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             if page_size > MAX_PAGE_SIZE or page_size < 1 or page < 1:
                 raise BadRequest("Invalid page or page_size")
 
-            db_notes = app.note_service.get_notes(author_id, page, page_size)
-            notes_list = [note.to_dict() for note in db_notes]
-            return jsonify(notes_list)
+            # Passing a cursor (empty for the first page) switches to keyset pagination
+            cursor = request.args.get("cursor", None)
+
+            # The summary view never loads note text, only its length and an excerpt
+            view = request.args.get("view", "full")
+            if view not in ("full", "summary"):
+                raise BadRequest("Invalid view")
+
+            # A fieldset selects only the requested columns
+            fields = _parse_fields(request.args.get("fields", None))
+            if fields is not None:
+                if view == "summary":
+                    raise BadRequest("fields cannot be combined with view=summary")
+                if cursor is not None:
+                    rows, next_cursor = app.note_service.get_note_fields_page(
+                        author_id, fields, cursor, page_size
+                    )
+                    notes_list = [note_row_to_dict(row) for row in rows]
+                    return jsonify(notes=notes_list, next_cursor=next_cursor)
+
+                rows = app.note_service.get_note_fields(
+                    author_id, fields, page, page_size
+                )
+                return jsonify([note_row_to_dict(row) for row in rows])
+
+            if view == "summary":
+                excerpt = request.args.get("excerpt", "false").lower() in TRUTHY
+                excerpt_length = SUMMARY_EXCERPT_LENGTH if excerpt else 0
+                if cursor is not None:
+                    summaries, next_cursor = app.note_service.get_note_summaries_page(
+                        author_id, cursor, page_size, excerpt_length
+                    )
+                    notes_list = [note_row_to_dict(row) for row in summaries]
+                    return jsonify(notes=notes_list, next_cursor=next_cursor)
+
+                summaries = app.note_service.get_note_summaries(
+                    author_id, page, page_size, excerpt_length
+                )
+                return jsonify([note_row_to_dict(row) for row in summaries])
+
+            # A revalidation only reads the versions of the notes on the page
+            if _is_conditional():
+                if cursor is not None:
+                    versions, next_cursor = app.note_service.get_note_versions_page(
+                        author_id, cursor, page_size
+                    )
+                else:
+                    versions = app.note_service.get_note_versions(
+                        author_id, page, page_size
+                    )
+                    next_cursor = None
+                etag = _not_modified(listing_etag(versions, next_cursor))
+                if etag is not None:
+                    return _validators(app.response_class(status=304), etag)
+
+            if cursor is not None:
+                db_notes, next_cursor = app.note_service.get_notes_page(
+                    author_id, cursor, page_size
+                )
+                response = app.json.notes_page_response(db_notes, next_cursor)
+            else:
+                db_notes = app.note_service.get_notes(author_id, page, page_size)
+                response = app.json.notes_response(db_notes)
+                next_cursor = None
+            versions = [(note.note_id, note.version) for note in db_notes]
+            return _validators(response, listing_etag(versions, next_cursor))
         except ValueError as e:
             return jsonify({"error": "Invalid page or page_size"}), 400
+        except InvalidCursorException:
+            return jsonify({"error": "Bad request: Invalid cursor"}), 400
+        except BadRequest as e:
+            return jsonify({"error": "Bad request: " + e.get_description()}), 400
+        except AuthException:
+            return jsonify({"error": "Unauthorized"}), 401
+        except Exception as e:
+            app.log_exception(e)
+            return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
+
+    @app.route("/v1/notes/search", methods=["GET"])
+    @cached_jwt_required()
+    def search_notes():
+        try:
+            user_identity = get_jwt_identity()
+            author_id = app.user_service.get_user_id_from_token(user_identity)
+            query = request.args.get("q", "").strip()
+            if not query:
+                raise BadRequest("Missing search query")
+            try:
+                page_size = int(request.args.get("page_size", 10))
+            except ValueError:
+                raise BadRequest("Invalid page_size")
+            if page_size > MAX_PAGE_SIZE or page_size < 1:
+                raise BadRequest("Invalid page_size")
+
+            db_notes, next_cursor = app.note_service.search_notes(
+                author_id, query, request.args.get("cursor", None), page_size
+            )
+            return app.json.notes_page_response(db_notes, next_cursor)
+        except InvalidCursorException:
+            return jsonify({"error": "Bad request: Invalid cursor"}), 400
         except BadRequest as e:
             return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except AuthException:
@@ -102,18 +496,89 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             app.log_exception(e)
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
+    @app.route("/v1/notes/export", methods=["GET"])
+    @cached_jwt_required()
+    def export_notes():
+        try:
+            user_identity = get_jwt_identity()
+            author_id = app.user_service.get_user_id_from_token(user_identity)
+            try:
+                after_note_id = int(request.args.get("after", 0))
+            except ValueError:
+                raise BadRequest("Invalid after")
+            if after_note_id < 0:
+                raise BadRequest("Invalid after")
+        except BadRequest as e:
+            return jsonify({"error": "Bad request: " + e.get_description()}), 400
+        except AuthException:
+            return jsonify({"error": "Unauthorized"}), 401
+        except Exception as e:
+            app.log_exception(e)
+            return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
+
+        batches = app.note_service.export_notes(
+            author_id, after_note_id, app.config["NOTES_EXPORT_BATCH_SIZE"]
+        )
+
+        def generate():
+            # One chunk per batch; a client that is cut off resumes with
+            # ?after=<note_id of the last complete line>
+            try:
+                for batch in batches:
+                    yield "".join(app.json.dumps(note) + "\n" for note in batch)
+            except Exception:
+                # The status is already sent; ending early truncates the export
+                app.logger.exception("Note export failed")
+            finally:
+                batches.close()
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
     @app.route("/v1/notes/<int:note_id>", methods=["GET"])
-    @jwt_required()
+    @cached_jwt_required()
     def get_note(note_id: int):
         try:
             user_identity = get_jwt_identity()
             author_id = app.user_service.get_user_id_from_token(user_identity)
 
+            fields = _parse_fields(request.args.get("fields", None))
+            if fields is not None:
+                row = app.note_service.get_note_fields_by_id(author_id, note_id, fields)
+                if not row:
+                    return (
+                        jsonify({"error": f"Note with id {note_id} does not exist"}),
+                        404,
+                    )
+                return jsonify(note_row_to_dict(row)), 200
+
+            # A revalidation only reads the version of the note
+            if _is_conditional():
+                current = app.note_service.get_note_version(author_id, note_id)
+                if current is None:
+                    return (
+                        jsonify({"error": f"Note with id {note_id} does not exist"}),
+                        404,
+                    )
+                version, updated_at = current
+                last_modified = _last_modified(updated_at)
+                etag = _not_modified(note_etag(note_id, version), last_modified)
+                if etag is not None:
+                    return _validators(
+                        app.response_class(status=304), etag, last_modified
+                    )
+
             db_note = app.note_service.get_note_by_id(author_id, note_id)
             if not db_note:
                 return jsonify({"error": f"Note with id {note_id} does not exist"}), 404
 
-            return jsonify(db_note.to_dict()), 200
+            etag = note_etag(db_note.note_id, db_note.version)
+            return _validators(
+                app.json.note_response(db_note),
+                etag,
+                _last_modified(db_note.updated_at),
+            )
+        except BadRequest as e:
+            return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except AuthException:
             return jsonify({"error": "Unauthorized"}), 401
         except Exception as e:
@@ -121,7 +586,7 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
     @app.route("/v1/notes", methods=["POST"])
-    @jwt_required()
+    @cached_jwt_required()
     def create_note():
         try:
             user_identity = get_jwt_identity()
@@ -138,7 +603,138 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             db_note = app.note_service.create_note(
                 note_title, note_text, author_id, is_public
             )
-            return jsonify(db_note.to_dict()), 201
+            return app.json.note_response(db_note, 201)
+        except BadRequest as e:
+            return jsonify({"error": "Bad request: " + e.get_description()}), 400
+        except AuthException:
+            return jsonify({"error": "Unauthorized"}), 401
+        except UnsupportedMediaType as e:
+            return (
+                jsonify({"error": "Unsupported media type: " + e.get_description()}),
+                415,
+            )
+        except Exception as e:
+            app.log_exception(e)
+            return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
+
+    @app.route("/v1/notes/import", methods=["POST"])
+    @cached_jwt_required()
+    def import_notes():
+        imported = 0
+        try:
+            user_identity = get_jwt_identity()
+            author_id = app.user_service.get_user_id_from_token(user_identity)
+            if request.mimetype != "application/x-ndjson":
+                raise UnsupportedMediaType("Expected application/x-ndjson")
+
+            batch_size = app.config["NOTES_IMPORT_BATCH_SIZE"]
+            failed = 0
+            errors = []
+            batch = []
+            for line_number, line in _read_lines(request.stream, MAX_IMPORT_LINE_BYTES):
+                if line is not None and not line.strip():
+                    continue
+                try:
+                    batch.append(_parse_import_line(line))
+                except BadRequest as e:
+                    failed += 1
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append(
+                            {
+                                "line": line_number,
+                                "error": "Bad request: " + e.get_description(),
+                            }
+                        )
+                    continue
+                if len(batch) == batch_size:
+                    imported += app.note_service.import_notes(author_id, batch)
+                    batch = []
+            imported += app.note_service.import_notes(author_id, batch)
+
+            return jsonify(imported=imported, failed=failed, errors=errors), 200
+        except AuthException:
+            return jsonify({"error": "Unauthorized"}), 401
+        except UnsupportedMediaType as e:
+            return (
+                jsonify({"error": "Unsupported media type: " + e.get_description()}),
+                415,
+            )
+        except Exception as e:
+            app.log_exception(e)
+            # Batches are committed as they go; the client can skip what was imported
+            return jsonify({"error": INTERNAL_SERVER_ERROR, "imported": imported}), 500
+
+    @app.route("/v1/notes:batch", methods=["POST"])
+    @cached_jwt_required()
+    def batch_notes():
+        try:
+            user_identity = get_jwt_identity()
+            author_id = app.user_service.get_user_id_from_token(user_identity)
+
+            body = request.json
+            operations = (
+                body.get("operations", None) if isinstance(body, dict) else None
+            )
+            if not isinstance(operations, list) or not operations:
+                raise BadRequest("Missing operations")
+            if len(operations) > app.config["NOTES_BATCH_MAX_OPERATIONS"]:
+                raise BadRequest("Too many operations")
+
+            results = [None] * len(operations)
+            creates, updates, deletes = [], [], []
+            seen_note_ids = set()
+            for index, operation in enumerate(operations):
+                try:
+                    op, args = _parse_batch_operation(operation)
+                    if op != "create":
+                        if args[0] in seen_note_ids:
+                            raise BadRequest(f"Duplicate note_id {args[0]}")
+                        seen_note_ids.add(args[0])
+                except BadRequest as e:
+                    results[index] = {
+                        "status": 400,
+                        "error": "Bad request: " + e.get_description(),
+                    }
+                    continue
+                {"create": creates, "update": updates, "delete": deletes}[op].append(
+                    (index, args)
+                )
+
+            # All three statements share the request's transaction
+            created = app.note_service.create_notes(
+                author_id, [args for _, args in creates]
+            )
+            for (index, _), db_note in zip(creates, created):
+                results[index] = {"status": 201, "note": db_note.to_dict()}
+
+            updated = app.note_service.update_notes(
+                author_id, [args for _, args in updates]
+            )
+            for index, args in updates:
+                db_note = updated.get(args[0])
+                results[index] = (
+                    {"status": 200, "note": db_note.to_dict()}
+                    if db_note
+                    else {
+                        "status": 404,
+                        "error": f"Note with id {args[0]} does not exist",
+                    }
+                )
+
+            deleted = app.note_service.delete_notes(
+                author_id, [args[0] for _, args in deletes]
+            )
+            for index, args in deletes:
+                results[index] = (
+                    {"status": 200, "message": f"Successfully deleted note {args[0]}"}
+                    if args[0] in deleted
+                    else {
+                        "status": 404,
+                        "error": f"Note with id {args[0]} does not exist",
+                    }
+                )
+
+            return jsonify(results=results), 200
         except BadRequest as e:
             return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except AuthException:
@@ -153,7 +749,7 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
     @app.route("/v1/notes/<int:note_id>", methods=["PUT"])
-    @jwt_required()
+    @cached_jwt_required()
     def update_note(note_id: int):
         try:
             user_identity = get_jwt_identity()
@@ -166,12 +762,44 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             if not note_title or not note_text:
                 raise BadRequest("Missing note title or text")
 
+            expected_version = None
+            if request.if_match and not request.if_match.star_tag:
+                versions = {
+                    parse_note_etag(etag, note_id) for etag in request.if_match.as_set()
+                } - {None}
+                if not versions:
+                    raise StaleNoteException(f"Note {note_id} has been modified")
+                expected_version = versions.pop()
+                if versions:
+                    # Any listed tag may match; the UPDATE is still conditioned
+                    # on the one that does
+                    versions.add(expected_version)
+                    current = app.note_service.get_note_version(author_id, note_id)
+                    if current is not None:
+                        if current[0] not in versions:
+                            raise StaleNoteException(
+                                f"Note {note_id} has been modified"
+                            )
+                        expected_version = current[0]
+
             db_note = app.note_service.update_note(
-                note_id, note_title, note_text, author_id, is_public
+                note_id,
+                note_title,
+                note_text,
+                author_id,
+                is_public,
+                expected_version,
             )
             if not db_note:
                 return jsonify({"error": f"Note with id {note_id} does not exist"}), 404
-            return jsonify(db_note.to_dict()), 200
+            response = app.json.note_response(db_note)
+            response.headers["ETag"] = note_etag(db_note.note_id, db_note.version)
+            return response, 200
+        except StaleNoteException:
+            return (
+                jsonify({"error": "Precondition failed: note has been modified"}),
+                412,
+            )
         except BadRequest as e:
             return jsonify({"error": "Bad request: " + e.get_description()}), 400
         except AuthException:
@@ -186,7 +814,7 @@ def create_app(user_serv: UserService, note_serv: NoteService, settings: Setting
             return jsonify({"error": INTERNAL_SERVER_ERROR}), 500
 
     @app.route("/v1/notes/<int:note_id>", methods=["DELETE"])
-    @jwt_required()
+    @cached_jwt_required()
     def delete_note(note_id: int):
         try:
             user_identity = get_jwt_identity()
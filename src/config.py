@@ -1,5 +1,7 @@
 import os
 
+TRUTHY = ("1", "true", "yes", "on")
+
 
 class Settings:
     # TODO: move secrets to using GitHub Secrets
@@ -11,8 +13,116 @@ class Settings:
         self.DB_PASSWORD: str = os.getenv("DB_PASSWORD")
         self.DB_NAME: str = os.getenv("DB_NAME")
 
+        # Database connection pool configurations
+        self.DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.DB_POOL_TIMEOUT_SEC: float = float(os.getenv("DB_POOL_TIMEOUT_SEC", "30"))
+        # Recycle well before MySQL's wait_timeout closes idle connections
+        self.DB_POOL_RECYCLE_SEC: int = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+        self.DB_POOL_PRE_PING: bool = (
+            os.getenv("DB_POOL_PRE_PING", "true").lower() in TRUTHY
+        )
+
+        # Statement caching configurations
+        self.DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+        # Server-side prepared statements need the mysql-connector C extension
+        self.DB_PREPARED_STATEMENTS: bool = (
+            os.getenv("DB_PREPARED_STATEMENTS", "false").lower() in TRUTHY
+        )
+        self.DB_PREPARED_STATEMENTS_MAX: int = int(
+            os.getenv("DB_PREPARED_STATEMENTS_MAX", "32")
+        )
+
         # Application configurations
         self.JWT_SECRET_KEY: str = os.getenv("JWT_SECRET")
+        self.ACCESS_TOKEN_EXPIRES_SEC: int = int(
+            os.getenv("ACCESS_TOKEN_EXPIRES_SEC", "900")
+        )
+        self.REFRESH_TOKEN_EXPIRES_SEC: int = int(
+            os.getenv("REFRESH_TOKEN_EXPIRES_SEC", str(30 * 24 * 60 * 60))
+        )
+        self.JWT_CACHE_MAX_ENTRIES: int = int(
+            os.getenv("JWT_CACHE_MAX_ENTRIES", "4096")
+        )
+        self.JWT_CACHE_TTL_SEC: int = int(os.getenv("JWT_CACHE_TTL_SEC", "60"))
+        self.NOTES_BATCH_MAX_OPERATIONS: int = int(
+            os.getenv("NOTES_BATCH_MAX_OPERATIONS", "500")
+        )
+        self.NOTES_EXPORT_BATCH_SIZE: int = int(
+            os.getenv("NOTES_EXPORT_BATCH_SIZE", "500")
+        )
+        self.NOTES_IMPORT_BATCH_SIZE: int = int(
+            os.getenv("NOTES_IMPORT_BATCH_SIZE", "500")
+        )
+
+        # "auto" (orjson, then msgspec, when installed), "orjson", "msgspec", or "stdlib"
+        self.JSON_BACKEND: str = os.getenv("JSON_BACKEND", "auto")
+
+        # Response compression configurations; encodings are in order of preference
+        self.RESPONSE_COMPRESSION_ENCODINGS: list[str] = [
+            encoding.strip()
+            for encoding in os.getenv(
+                "RESPONSE_COMPRESSION_ENCODINGS", "zstd,br,gzip"
+            ).split(",")
+            if encoding.strip()
+        ]
+        self.RESPONSE_COMPRESSION_LEVEL: int | None = (
+            int(os.getenv("RESPONSE_COMPRESSION_LEVEL"))
+            if os.getenv("RESPONSE_COMPRESSION_LEVEL")
+            else None
+        )
+        self.RESPONSE_COMPRESSION_MIN_BYTES: int = int(
+            os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")
+        )
+
+        # SQL logging and instrumentation configurations
+        self.DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() in TRUTHY
+        self.SQL_SAMPLE_RATE: float = float(os.getenv("SQL_SAMPLE_RATE", "0.01"))
+        self.SQL_SLOW_QUERY_MS: float = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+        self.SQL_STATS_MAX_FINGERPRINTS: int = int(
+            os.getenv("SQL_STATS_MAX_FINGERPRINTS", "500")
+        )
+        self.SQL_STATS_TOP_N: int = int(os.getenv("SQL_STATS_TOP_N", "20"))
+
+        # Note storage configurations
+        self.NOTE_COMPRESSION_CODEC: str = os.getenv("NOTE_COMPRESSION_CODEC", "zlib")
+        self.NOTE_COMPRESSION_LEVEL: int | None = (
+            int(os.getenv("NOTE_COMPRESSION_LEVEL"))
+            if os.getenv("NOTE_COMPRESSION_LEVEL")
+            else None
+        )
+        self.NOTE_COMPRESSION_MIN_BYTES: int = int(
+            os.getenv("NOTE_COMPRESSION_MIN_BYTES", "1024")
+        )
+        # "auto", "fulltext", or "inverted_index"
+        self.NOTES_SEARCH_BACKEND: str = os.getenv("NOTES_SEARCH_BACKEND", "auto")
+
+        # Note cache configurations; the backend is "local", "shared", or "none"
+        self.NOTE_CACHE_BACKEND: str = os.getenv("NOTE_CACHE_BACKEND", "local")
+        self.NOTE_CACHE_MAX_ENTRIES: int = int(
+            os.getenv("NOTE_CACHE_MAX_ENTRIES", "10000")
+        )
+        self.NOTE_LISTING_CACHE_MAX_ENTRIES: int = int(
+            os.getenv("NOTE_LISTING_CACHE_MAX_ENTRIES", "1000")
+        )
+        self.NOTE_CACHE_MAX_BYTES: int = int(
+            os.getenv("NOTE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+        )
+        self.NOTE_CACHE_TTL_SEC: int = int(os.getenv("NOTE_CACHE_TTL_SEC", "10"))
+        # Redis URL of the shared backend; unset uses an in-process stand-in
+        self.NOTE_CACHE_REDIS_URL: str | None = os.getenv("NOTE_CACHE_REDIS_URL")
+
+        # Password hashing configurations
+        self.PASSWORD_HASH_ITERATIONS: int = int(
+            os.getenv("PASSWORD_HASH_ITERATIONS", "100000")
+        )
+        self.HASH_POOL_WORKERS: int = int(
+            os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 1))
+        )
+        self.HASH_POOL_QUEUE_DEPTH: int = int(os.getenv("HASH_POOL_QUEUE_DEPTH", "32"))
+        self.HASH_POOL_RETRY_AFTER_SEC: int = int(
+            os.getenv("HASH_POOL_RETRY_AFTER_SEC", "1")
+        )
 
 
 # Instantiate the settings
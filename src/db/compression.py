@@ -0,0 +1,103 @@
+import zlib
+
+from ..config import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Values of notes.storage_format
+FORMAT_PLAIN = 0
+FORMAT_ZLIB = 1
+FORMAT_ZSTD = 2
+
+# Compressed notes keep this many leading characters in note_text, so summary
+# excerpts never have to decompress the body
+PREVIEW_LENGTH = 255
+
+
+class NoteCodec:
+    """
+    Encodes note text into its stored form.
+
+    Text shorter than `min_bytes` (UTF-8), or that does not shrink, is stored as
+    is in note_text. Anything else is compressed into note_body, and note_text
+    only keeps a short preview.
+    """
+
+    def __init__(
+        self, codec: str = "zlib", level: int | None = None, min_bytes: int = 1024
+    ):
+        if codec not in ("zlib", "zstd"):
+            raise ValueError(f"Unknown note compression codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd note compression requires the zstandard package")
+        self.codec = codec
+        self.level = level
+        self.min_bytes = min_bytes
+
+    def encode(self, text: str) -> dict:
+        """
+        Encodes note text into its stored form.
+        @param text: The note text.
+        @return: Values for the storage_format, plain_text, note_body, and
+            text_length attributes of a Note.
+        """
+        raw = text.encode("utf-8")
+        stored = {
+            "storage_format": FORMAT_PLAIN,
+            "plain_text": text,
+            "note_body": None,
+            "text_length": len(raw),
+        }
+        if len(raw) < self.min_bytes:
+            return stored
+
+        if self.codec == "zstd":
+            body = zstandard.ZstdCompressor(level=self.level or 3).compress(raw)
+            storage_format = FORMAT_ZSTD
+        else:
+            level = self.level if self.level is not None else zlib.Z_DEFAULT_COMPRESSION
+            body = zlib.compress(raw, level)
+            storage_format = FORMAT_ZLIB
+        if len(body) >= len(raw):
+            return stored
+
+        stored.update(
+            storage_format=storage_format,
+            plain_text=text[:PREVIEW_LENGTH],
+            note_body=body,
+        )
+        return stored
+
+
+def decode_note_text(
+    storage_format: int, plain_text: str | None, note_body: bytes | None
+) -> str:
+    """
+    Decodes note text from its stored form.
+    @param storage_format: The storage format of the note.
+    @param plain_text: The stored note_text column.
+    @param note_body: The stored note_body column.
+    @return: The note text.
+    @raises ValueError: If the storage format is unknown or its codec is unavailable.
+    """
+    if storage_format == FORMAT_PLAIN:
+        return plain_text
+    if storage_format == FORMAT_ZLIB:
+        return zlib.decompress(note_body).decode("utf-8")
+    if storage_format == FORMAT_ZSTD:
+        if zstandard is None:
+            raise ValueError(
+                "Reading zstd compressed notes requires the zstandard package"
+            )
+        return zstandard.ZstdDecompressor().decompress(note_body).decode("utf-8")
+    raise ValueError(f"Unknown note storage format: {storage_format}")
+
+
+note_codec = NoteCodec(
+    settings.NOTE_COMPRESSION_CODEC,
+    settings.NOTE_COMPRESSION_LEVEL,
+    settings.NOTE_COMPRESSION_MIN_BYTES,
+)
@@ -1,8 +1,56 @@
+import time
+from collections.abc import Callable
 from contextlib import contextmanager
+
+from flask import Flask, Response, g, has_request_context
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 
 from ..config import settings
+from ..metrics import Counter, Gauge, Histogram
+from .instrumentation import QueryStats, instrument_engine, register_metrics
+from .prepared_statements import enable_prepared_statements
+
+POOL_SIZE = Gauge("db_pool_size", "Connections the pool keeps open")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out")
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size (negative when unused)"
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting to check out a connection"
+)
+POOL_REQUEST_WAIT = Histogram(
+    "db_pool_request_wait_seconds",
+    "Total time each request spent waiting for pool connections",
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT_SEC"
+)
+COMPILED_CACHE_ENTRIES = Gauge(
+    "sql_compiled_cache_entries", "Compiled statements held in the engine's cache"
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A QueuePool that records how long each checkout waits for a connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            POOL_CHECKOUT_WAIT.observe(waited)
+            if has_request_context():
+                g.db_pool_wait = g.get("db_pool_wait", 0.0) + waited
+
 
 # Construct the Database URL
 DATABASE_URL = (
@@ -12,7 +60,35 @@ DATABASE_URL = (
 )
 
 # Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL, echo=True)  # echo=True for SQL query logging
+engine = create_engine(
+    DATABASE_URL,
+    echo=settings.DB_ECHO,  # echo=True logs every statement, for local debugging only
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+    pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+)
+if settings.DB_PREPARED_STATEMENTS:
+    enable_prepared_statements(engine, settings.DB_PREPARED_STATEMENTS_MAX)
+POOL_SIZE.set_function(lambda: engine.pool.size())
+POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout())
+POOL_OVERFLOW.set_function(lambda: engine.pool.overflow())
+# SQLAlchemy has no public API for the size of the compiled cache, so this
+# reads Engine._compiled_cache (an LRUCache, or None when query_cache_size is
+# 0), and reports 0 should a later release rename it
+COMPILED_CACHE_ENTRIES.set_function(
+    lambda: len(getattr(engine, "_compiled_cache", None) or ())
+)
+
+# Sampled, structured SQL logging and per-statement totals
+query_stats = QueryStats(settings.SQL_STATS_MAX_FINGERPRINTS)
+instrument_engine(
+    engine, query_stats, settings.SQL_SAMPLE_RATE, settings.SQL_SLOW_QUERY_MS
+)
+register_metrics(query_stats, settings.SQL_STATS_TOP_N)
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -20,9 +96,103 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-# Dependency for session management (useful in web frameworks like FastAPI)
+def _request_session() -> Session:
+    """
+    Returns the session shared by every get_db() call in the current request,
+    starting it on first use. It runs in a single transaction on one pooled
+    connection: commit() inside DB functions only flushes, and the transaction is
+    committed or rolled back once when the request ends.
+    """
+    unit_of_work = g.get("_db_unit_of_work")
+    if unit_of_work is None:
+        connection = engine.connect()
+        transaction = connection.begin()
+        session = Session(
+            bind=connection,
+            autoflush=False,
+            expire_on_commit=False,
+            join_transaction_mode="rollback_only",
+        )
+        unit_of_work = g._db_unit_of_work = (connection, transaction, session, [])
+    return unit_of_work[2]
+
+
+def _end_request_session(commit: bool):
+    unit_of_work = g.pop("_db_unit_of_work", None)
+    if unit_of_work is None:
+        return
+
+    connection, transaction, session, after_commit = unit_of_work
+    committed = False
+    try:
+        if transaction.is_active:
+            if commit:
+                session.flush()
+                transaction.commit()
+                committed = True
+            else:
+                transaction.rollback()
+    finally:
+        session.close()
+        connection.close()
+    if committed:
+        for callback in after_commit:
+            callback()
+
+
+def on_commit(callback: Callable[[], None]):
+    """
+    Runs a callback once the writes made so far are committed, such as a cache
+    update that must not be seen before the database is. Inside a request that
+    is when the request's transaction commits, and the callback is dropped if
+    it rolls back instead; otherwise DB functions have already committed, and
+    the callback runs right away.
+    @param callback: The function to run, without arguments.
+    """
+    unit_of_work = g.get("_db_unit_of_work") if has_request_context() else None
+    if unit_of_work is None:
+        callback()
+    else:
+        unit_of_work[3].append(callback)
+
+
+def init_app(app: Flask):
+    """
+    Registers the per-request database hooks on the given app.
+    @param app: The Flask app.
+    """
+
+    @app.after_request
+    def commit_request_session(response: Response) -> Response:
+        # Error responses may follow a partial write, so only keep successful work
+        _end_request_session(commit=response.status_code < 400)
+        return response
+
+    @app.teardown_request
+    def close_request_session(exc):
+        _end_request_session(commit=False)
+
+    @app.teardown_request
+    def observe_request_pool_wait(exc):
+        waited = g.pop("db_pool_wait", None)
+        if waited is not None:
+            POOL_REQUEST_WAIT.observe(waited)
+
+
 @contextmanager
-def get_db():
+def get_db(standalone: bool = False):
+    """
+    Provides a database session. Inside a request this is the request's shared
+    session, which the request commits or rolls back when it ends; otherwise it is
+    a new session that the caller commits and that is closed on exit.
+    @param standalone: Use a separate session even inside a request, for reads that
+        should not hold the request's connection or writes that must commit on
+        their own.
+    """
+    if has_request_context() and not standalone:
+        yield _request_session()
+        return
+
     db = SessionLocal()
     try:
         yield db
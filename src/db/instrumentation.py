@@ -0,0 +1,191 @@
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+
+from ..metrics import CallbackMetric, Counter
+
+logger = logging.getLogger(__name__)
+
+_ROOT_PACKAGE = __name__.split(".")[0]
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+COMPILED_CACHE_HITS = Counter(
+    "sql_compiled_cache_hits_total",
+    "Statements whose SQL was found in the engine's compiled cache",
+)
+COMPILED_CACHE_MISSES = Counter(
+    "sql_compiled_cache_misses_total",
+    "Statements compiled because the compiled cache did not have them",
+)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """
+    Normalizes a SQL statement so that executions differing only in literal values,
+    bind parameters, IN-list lengths or whitespace share one fingerprint.
+    @param statement: The SQL statement sent to the driver.
+    @return: The normalized statement.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?+)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """
+    Running totals per statement fingerprint. Only the slowest max_fingerprints
+    fingerprints by total time are kept, so memory stays bounded.
+    """
+
+    def __init__(self, max_fingerprints: int):
+        self.max_fingerprints = max_fingerprints
+        # fingerprint -> [calls, total seconds, rows]
+        self._totals: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement_fingerprint: str, duration: float, rows: int):
+        with self._lock:
+            totals = self._totals.get(statement_fingerprint)
+            if totals is None:
+                if len(self._totals) >= self.max_fingerprints:
+                    cheapest = min(self._totals, key=lambda fp: self._totals[fp][1])
+                    del self._totals[cheapest]
+                totals = self._totals[statement_fingerprint] = [0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += max(rows, 0)
+
+    def top(self, n: int) -> list[tuple[str, int, float, int]]:
+        """
+        Returns the n fingerprints with the highest total time.
+        @param n: The number of fingerprints to return.
+        @return: A list of (fingerprint, calls, total seconds, rows), slowest first.
+        """
+        with self._lock:
+            items = [(fp, *totals) for fp, totals in self._totals.items()]
+        return sorted(items, key=lambda item: item[2], reverse=True)[:n]
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+def _calling_function() -> str | None:
+    """
+    Finds the service function, or failing that the DB function, that issued the
+    statement currently being executed.
+    """
+    db_caller = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(f"{_ROOT_PACKAGE}.api."):
+            return f"{module}.{frame.f_code.co_name}"
+        is_db_module = module.startswith(f"{_ROOT_PACKAGE}.db.") and module != __name__
+        if db_caller is None and is_db_module:
+            db_caller = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return db_caller
+
+
+def instrument_engine(
+    engine: Engine,
+    stats: QueryStats,
+    sample_rate: float,
+    slow_query_ms: float,
+):
+    """
+    Times every statement the engine executes and adds it to stats. A sample_rate
+    fraction of statements, plus every statement slower than slow_query_ms, is also
+    logged as a structured JSON line. Hits and misses of the compiled cache are
+    counted once per execution.
+    @param engine: The engine to instrument.
+    @param stats: The aggregate to record statements into.
+    @param sample_rate: The fraction of statements to log, from 0 to 1.
+    @param slow_query_ms: Statements at least this slow are always logged.
+    """
+
+    @event.listens_for(engine, "after_execute")
+    def after_execute(conn, clauseelement, multiparams, params, options, result):
+        cache_hit = getattr(result.context, "cache_hit", None)
+        if cache_hit is CacheStats.CACHE_HIT:
+            COMPILED_CACHE_HITS.inc()
+        elif cache_hit is CacheStats.CACHE_MISS:
+            COMPILED_CACHE_MISSES.inc()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        # Kept on the execution's own context, so a statement that raises, and
+        # never reaches after_cursor_execute, leaves nothing on the connection
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_query_start_time", None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        statement_fingerprint = fingerprint(statement)
+        rows = cursor.rowcount
+        stats.record(statement_fingerprint, duration, rows)
+
+        slow = duration * 1000 >= slow_query_ms
+        if slow or (sample_rate > 0 and random.random() < sample_rate):
+            logger.log(
+                logging.WARNING if slow else logging.INFO,
+                json.dumps(
+                    {
+                        "event": "slow_query" if slow else "query",
+                        "fingerprint": statement_fingerprint,
+                        "duration_ms": round(duration * 1000, 3),
+                        "rows": rows,
+                        "executemany": executemany,
+                        "caller": _calling_function(),
+                    }
+                ),
+            )
+
+
+def register_metrics(stats: QueryStats, top_n: int):
+    """
+    Exports the top_n fingerprints by total time on /metrics.
+    @param stats: The aggregate to export.
+    @param top_n: The number of fingerprints to export.
+    """
+
+    def collector(name: str, index: int):
+        def collect():
+            for statement_fingerprint, *totals in stats.top(top_n):
+                yield name, {"statement": statement_fingerprint[:200]}, totals[index]
+
+        return collect
+
+    for name, documentation, index in (
+        ("sql_statement_calls_total", "Executions of the top SQL statements", 0),
+        ("sql_statement_seconds_total", "Time spent in the top SQL statements", 1),
+        (
+            "sql_statement_rows_total",
+            "Rows read or written by the top SQL statements",
+            2,
+        ),
+    ):
+        CallbackMetric(name, documentation, "counter", collector(name, index))
@@ -0,0 +1,218 @@
+import hashlib
+from collections import Counter
+from collections.abc import Iterable, Sequence
+
+from sqlalchemy import (
+    LargeBinary,
+    bindparam,
+    cast,
+    delete,
+    exists,
+    func,
+    select,
+)
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models.note import Note
+from ..models.note_content import NoteContent
+from .compression import note_codec
+from .database import get_db, on_commit
+from .search import forget_note_contents, note_search_terms
+
+
+def hash_note_text(note_text: str) -> str:
+    """
+    Computes the key a note text is shared under.
+    @param note_text: The note text.
+    @return: The hex SHA-256 digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(note_text.encode("utf-8")).hexdigest()
+
+
+def acquire_contents(db: Session, note_texts: Sequence[str]) -> list[str]:
+    """
+    Takes a reference on the shared body of each text, storing bodies that do not
+    exist yet. Existing bodies only have their reference count raised; their text
+    is neither compressed nor sent again.
+    @param db: The session of the transaction that points notes at the bodies.
+    @param note_texts: The note texts, one per referencing note.
+    @return: The content hash of each text, in the order they were given.
+    """
+    hashes = [hash_note_text(note_text) for note_text in note_texts]
+    counts = Counter(hashes)
+    if not counts:
+        return hashes
+
+    # Lock the bodies that exist so they cannot be purged before they are referenced
+    existing = set(
+        db.execute(
+            select(NoteContent.content_hash)
+            .where(NoteContent.content_hash.in_(counts))
+            .with_for_update()
+        ).scalars()
+    )
+    if existing:
+        db.execute(
+            NoteContent.__table__.update()
+            .where(NoteContent.content_hash == bindparam("b_content_hash"))
+            .values(ref_count=NoteContent.ref_count + bindparam("b_count")),
+            [
+                {"b_content_hash": content_hash, "b_count": counts[content_hash]}
+                for content_hash in existing
+            ],
+        )
+
+    texts = dict(zip(hashes, note_texts))
+    missing = [content_hash for content_hash in counts if content_hash not in existing]
+    if missing:
+        _insert_contents(
+            db,
+            [
+                {
+                    "content_hash": content_hash,
+                    "ref_count": counts[content_hash],
+                    "search_terms": note_search_terms(texts[content_hash]),
+                    **note_codec.encode(texts[content_hash]),
+                }
+                for content_hash in missing
+            ],
+        )
+    return hashes
+
+
+def _insert_contents(db: Session, contents: list[dict]):
+    """
+    Inserts new shared bodies. A body inserted concurrently by another transaction
+    has its reference count raised instead.
+    @param db: The session to insert with.
+    @param contents: NoteContent attribute values, one dict per body.
+    """
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(NoteContent)
+        statement = statement.on_duplicate_key_update(
+            ref_count=NoteContent.ref_count + statement.inserted.ref_count
+        )
+    else:
+        statement = sqlite.insert(NoteContent)
+        statement = statement.on_conflict_do_update(
+            index_elements=[NoteContent.content_hash],
+            set_={"ref_count": NoteContent.ref_count + statement.excluded.ref_count},
+        )
+    db.execute(statement, contents)
+
+
+def release_contents(db: Session, content_hashes: Iterable[str | None]):
+    """
+    Drops a reference on each of the given shared bodies. Bodies left without
+    references are removed later by purge_unreferenced_contents.
+    @param db: The session of the transaction that repoints or deletes the notes.
+    @param content_hashes: The content hash of each released reference; None for
+        notes whose text is still stored inline.
+    """
+    counts = Counter(
+        content_hash for content_hash in content_hashes if content_hash is not None
+    )
+    if not counts:
+        return
+
+    db.execute(
+        NoteContent.__table__.update()
+        .where(NoteContent.content_hash == bindparam("b_content_hash"))
+        .values(ref_count=NoteContent.ref_count - bindparam("b_count")),
+        [
+            {"b_content_hash": content_hash, "b_count": count}
+            for content_hash, count in counts.items()
+        ],
+    )
+
+
+def purge_unreferenced_contents(batch_size: int = 500) -> int:
+    """
+    Deletes a batch of shared bodies that no note points at.
+    @param batch_size: The maximum number of bodies to delete.
+    @return: The number of bodies deleted.
+    """
+    unreferenced = ~exists().where(Note.content_hash == NoteContent.content_hash)
+    with get_db() as db:
+        content_hashes = (
+            db.execute(
+                select(NoteContent.content_hash).where(unreferenced).limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not content_hashes:
+            return 0
+
+        # Check again while deleting, in case a note was pointed at one meanwhile
+        deleted = db.execute(
+            delete(NoteContent)
+            .where(NoteContent.content_hash.in_(content_hashes), unreferenced)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted < len(content_hashes):
+            content_hashes = set(content_hashes) - set(
+                db.execute(
+                    select(NoteContent.content_hash).where(
+                        NoteContent.content_hash.in_(content_hashes)
+                    )
+                ).scalars()
+            )
+        db.commit()
+        on_commit(lambda: forget_note_contents(content_hashes))
+        return deleted
+
+
+def index_note_contents(batch_size: int = 500) -> int:
+    """
+    Fills in the search terms of a batch of shared bodies stored before search
+    existed.
+    @param batch_size: The maximum number of bodies to index.
+    @return: The number of bodies indexed.
+    """
+    with get_db() as db:
+        contents = (
+            db.execute(
+                select(NoteContent)
+                .where(NoteContent.search_terms.is_(None))
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        for content in contents:
+            content.search_terms = note_search_terms(content.note_text)
+        db.commit()
+        return len(contents)
+
+
+def get_content_stats() -> dict:
+    """
+    Measures how much storage sharing note bodies saves.
+    @return: The number of bodies and of notes pointing at them, the bytes of text
+        those notes hold, the bytes of distinct text, and the bytes actually stored.
+    """
+    with get_db() as db:
+        row = db.execute(
+            select(
+                func.count().label("contents"),
+                func.coalesce(func.sum(NoteContent.ref_count), 0).label("references"),
+                func.coalesce(
+                    func.sum(NoteContent.text_length * NoteContent.ref_count), 0
+                ).label("logical_bytes"),
+                func.coalesce(func.sum(NoteContent.text_length), 0).label(
+                    "unique_bytes"
+                ),
+                func.coalesce(
+                    func.sum(
+                        func.coalesce(
+                            func.length(NoteContent.note_body),
+                            func.length(cast(NoteContent.plain_text, LargeBinary)),
+                        )
+                    ),
+                    0,
+                ).label("stored_bytes"),
+            ).where(NoteContent.ref_count > 0)
+        ).one()
+        return dict(row._mapping)
@@ -1,110 +1,876 @@
-from collections.abc import Sequence
-from sqlalchemy import and_, delete, or_, select
+from collections.abc import Iterator, Sequence
 
-from ..models.note import Note
+from sqlalchemy import (
+    Integer,
+    LargeBinary,
+    Row,
+    bindparam,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    union_all,
+)
+
+from ..exceptions.stale_note_exception import StaleNoteException
+from .compression import FORMAT_PLAIN, PREVIEW_LENGTH
+from ..models.note import (
+    NOTE_FIELDS,
+    NOTE_RECORD_COLUMNS,
+    Note,
+    NoteRecord,
+    note_records,
+)
+from ..models.note_content import NoteContent
+from ..models.user import User
 from .database import get_db
+from .note_contents import (
+    acquire_contents,
+    get_content_stats,
+    hash_note_text,
+    index_note_contents,
+    purge_unreferenced_contents,
+    release_contents,
+)
+from .search import get_search_backend, tokenize
+
+
+def _visible_note_ids(author_id: int, limit: int, after_note_id: int = 0):
+    """
+    Builds a subquery of the first IDs of notes that are public or were created by
+    the user with the given ID. Each half of the visibility rule is its own index
+    range scan that stops after `limit` rows; the own-notes branch only reads
+    private notes, so UNION ALL never produces duplicates.
+    @param author_id: The ID of the user whose notes to include, or a bind parameter.
+    @param limit: The number of IDs each branch may contribute, or a bind parameter.
+    @param after_note_id: The note ID to start after, or a bind parameter.
+    @return: A subquery with a single note_id column.
+    """
+    public_ids = (
+        select(Note.note_id)
+        .where(Note.is_public == True, Note.note_id > after_note_id)
+        .order_by(Note.note_id)
+        .limit(limit)
+        .subquery()
+    )
+    own_ids = (
+        select(Note.note_id)
+        .where(
+            Note.author_id == author_id,
+            Note.is_public == False,
+            Note.note_id > after_note_id,
+        )
+        .order_by(Note.note_id)
+        .limit(limit)
+        .subquery()
+    )
+    return union_all(select(public_ids.c.note_id), select(own_ids.c.note_id)).subquery()
 
 
 def get_notes_for_user(
     author_id: int, page: int = 1, page_size: int = 10
-) -> Sequence[Note]:
+) -> list[NoteRecord]:
     """
     Returns a page of notes that are public or were created by the user with the given ID.
     @param author_id: The ID of the user whose notes to retrieve.
     @param page: The page number to retrieve.
     @param page_size: The number of notes per page.
-    @return: A sequence of notes.
+    @return: A list of note records.
+    """
+    offset = (page - 1) * page_size
+    with get_db() as db:
+        return _read_records(
+            db,
+            _VISIBLE_NOTE_RECORDS,
+            {
+                "author_id": author_id,
+                "after_note_id": 0,
+                "branch_limit": offset + page_size,
+                "limit": page_size,
+                "offset": offset,
+            },
+        )
+
+
+def get_notes_for_user_after(
+    author_id: int, after_note_id: int = 0, limit: int = 10
+) -> list[NoteRecord]:
+    """
+    Returns notes that are public or were created by the user with the given ID,
+    starting right after the given note ID in note ID order (keyset pagination).
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param after_note_id: The note ID to resume after, or 0 to start from the beginning.
+    @param limit: The maximum number of notes to return.
+    @return: A list of note records ordered by note ID.
+    """
+    with get_db() as db:
+        return _read_records(
+            db,
+            _VISIBLE_NOTE_RECORDS,
+            {
+                "author_id": author_id,
+                "after_note_id": after_note_id,
+                "branch_limit": limit,
+                "limit": limit,
+                "offset": 0,
+            },
+        )
+
+
+def _read_records(db, statement, parameters: dict | None = None) -> list[NoteRecord]:
+    """
+    Runs a select of NOTE_RECORD_COLUMNS on the session's connection. Reads that
+    only serialize notes skip the ORM: no Note, User, or NoteContent objects are
+    built, and nothing enters the identity map.
+    @param db: The session to read with.
+    @param statement: The select to run.
+    @param parameters: The values of its bind parameters, if any.
+    @return: A list of note records, in row order.
+    """
+    return note_records(db.connection().execute(statement, parameters))
+
+
+def _note_rows(columns: list):
+    """
+    Builds a column-level select over notes that only joins users and
+    note_contents when the columns read from them.
+    @param columns: The columns to select, labelled with Note.to_dict keys.
+    @return: A select statement.
+    """
+    statement = select(*columns)
+    tables = set(statement.columns_clause_froms)
+    statement = statement.select_from(Note)
+    if User.__table__ in tables:
+        statement = statement.join(User, Note.author_id == User.user_id)
+    if NoteContent.__table__ in tables:
+        statement = statement.outerjoin(
+            NoteContent, Note.content_hash == NoteContent.content_hash
+        )
+    return statement
+
+
+def _field_columns(fields: Sequence[str]) -> list:
+    """
+    Builds the columns for a sparse fieldset of Note.to_dict keys. The note ID is
+    always included, as it identifies the note and keys pagination.
+    @param fields: The Note.to_dict keys to select.
+    @return: A list of labelled column expressions.
+    """
+    keys = ["note_id"] + [field for field in fields if field != "note_id"]
+    return [column for key in keys for column in NOTE_FIELDS[key]]
+
+
+def _summary_columns(excerpt_length: int = 0) -> list:
+    """
+    Builds the columns of a note summary, labelled with Note.to_dict keys. The
+    note text itself is never selected; only its size and, optionally, its start.
+    @param excerpt_length: The number of leading characters of the text to include, or 0.
+    @return: A list of column expressions.
+    """
+    columns = [
+        column
+        for key, key_columns in NOTE_FIELDS.items()
+        if key != "text"
+        for column in key_columns
+    ]
+    # Inline notes that predate text_length fall back to measuring the plain text;
+    # casting to binary makes the length count bytes rather than characters
+    columns.append(
+        func.coalesce(
+            NoteContent.text_length,
+            Note.text_length,
+            func.length(cast(Note.plain_text, LargeBinary)),
+        ).label("length")
+    )
+    if excerpt_length:
+        # Compressed text keeps a preview in plain_text
+        excerpt_length = min(excerpt_length, PREVIEW_LENGTH)
+        columns.append(
+            func.substr(
+                func.coalesce(NoteContent.plain_text, Note.plain_text),
+                1,
+                excerpt_length,
+            ).label("excerpt")
+        )
+    return columns
+
+
+def get_note_fields_for_user(
+    author_id: int, fields: Sequence[str], page: int = 1, page_size: int = 10
+) -> Sequence[Row]:
+    """
+    Returns the given fields of a page of notes that are public or were created by
+    the user with the given ID.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param fields: The Note.to_dict keys to select.
+    @param page: The page number to retrieve.
+    @param page_size: The number of notes per page.
+    @return: A sequence of rows labelled with Note.to_dict keys.
     """
     with get_db() as db:
         offset = (page - 1) * page_size
-        return (
-            db.execute(
-                select(Note)
-                .where(
-                    or_(
-                        Note.is_public == True,
-                        Note.author_id == author_id,
-                    )
-                )
-                .limit(page_size)
-                .offset(offset)
+        note_ids = _visible_note_ids(author_id, offset + page_size)
+        return db.execute(
+            _note_rows(_field_columns(fields))
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(page_size)
+            .offset(offset)
+        ).all()
+
+
+def get_note_fields_for_user_after(
+    author_id: int, fields: Sequence[str], after_note_id: int = 0, limit: int = 10
+) -> Sequence[Row]:
+    """
+    Returns the given fields of notes that are public or were created by the user
+    with the given ID, starting right after the given note ID in note ID order.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param fields: The Note.to_dict keys to select.
+    @param after_note_id: The note ID to resume after, or 0 to start from the beginning.
+    @param limit: The maximum number of notes to return.
+    @return: A sequence of rows labelled with Note.to_dict keys.
+    """
+    with get_db() as db:
+        note_ids = _visible_note_ids(author_id, limit, after_note_id)
+        return db.execute(
+            _note_rows(_field_columns(fields))
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(limit)
+        ).all()
+
+
+def get_note_fields_by_id(
+    author_id: int, note_id: int, fields: Sequence[str]
+) -> Row | None:
+    """
+    Returns the given fields of the note with the given ID, if it is public or was
+    created by the user with the given ID.
+    @param author_id: The ID of the user requesting the note.
+    @param note_id: The ID of the note to retrieve.
+    @param fields: The Note.to_dict keys to select.
+    @return: A row labelled with Note.to_dict keys, or None if no such note is visible.
+    """
+    with get_db() as db:
+        return db.execute(
+            _note_rows(_field_columns(fields)).where(
+                Note.note_id == note_id,
+                or_(Note.is_public == True, Note.author_id == author_id),
             )
-            .scalars()
-            .all()
-        )
+        ).one_or_none()
+
+
+def get_note_version(author_id: int, note_id: int) -> Row | None:
+    """
+    Returns the version and update time of the note with the given ID, if it is
+    public or was created by the user with the given ID.
+    @param author_id: The ID of the user requesting the note.
+    @param note_id: The ID of the note.
+    @return: A row with version and updated_at, or None if no such note is visible.
+    """
+    with get_db() as db:
+        return db.execute(
+            select(Note.version, Note.updated_at).where(
+                Note.note_id == note_id,
+                or_(Note.is_public == True, Note.author_id == author_id),
+            )
+        ).one_or_none()
+
+
+def get_note_versions_for_user(
+    author_id: int, page: int = 1, page_size: int = 10
+) -> Sequence[Row]:
+    """
+    Returns the ID and version of each note on a page of get_notes_for_user,
+    without reading anything else.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param page: The page number to retrieve.
+    @param page_size: The number of notes per page.
+    @return: A sequence of rows with note_id and version.
+    """
+    with get_db() as db:
+        offset = (page - 1) * page_size
+        note_ids = _visible_note_ids(author_id, offset + page_size)
+        return db.execute(
+            select(Note.note_id, Note.version)
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(page_size)
+            .offset(offset)
+        ).all()
+
+
+def get_note_versions_for_user_after(
+    author_id: int, after_note_id: int = 0, limit: int = 10
+) -> Sequence[Row]:
+    """
+    Returns the ID and version of each note get_notes_for_user_after would
+    return, without reading anything else.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param after_note_id: The note ID to resume after, or 0 to start from the beginning.
+    @param limit: The maximum number of notes to return.
+    @return: A sequence of rows with note_id and version, ordered by note ID.
+    """
+    with get_db() as db:
+        note_ids = _visible_note_ids(author_id, limit, after_note_id)
+        return db.execute(
+            select(Note.note_id, Note.version)
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(limit)
+        ).all()
+
+
+def get_note_summaries_for_user(
+    author_id: int, page: int = 1, page_size: int = 10, excerpt_length: int = 0
+) -> Sequence[Row]:
+    """
+    Returns a page of summaries of the notes that are public or were created by the
+    user with the given ID.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param page: The page number to retrieve.
+    @param page_size: The number of notes per page.
+    @param excerpt_length: The number of leading characters of the text to include, or 0.
+    @return: A sequence of rows labelled with Note.to_dict keys, plus length and excerpt.
+    """
+    with get_db() as db:
+        offset = (page - 1) * page_size
+        note_ids = _visible_note_ids(author_id, offset + page_size)
+        return db.execute(
+            _note_rows(_summary_columns(excerpt_length))
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(page_size)
+            .offset(offset)
+        ).all()
 
 
-def get_note_by_id(note_id: int) -> Note | None:
+def get_note_summaries_for_user_after(
+    author_id: int, after_note_id: int = 0, limit: int = 10, excerpt_length: int = 0
+) -> Sequence[Row]:
+    """
+    Returns summaries of the notes that are public or were created by the user with
+    the given ID, starting right after the given note ID in note ID order.
+    @param author_id: The ID of the user whose notes to retrieve.
+    @param after_note_id: The note ID to resume after, or 0 to start from the beginning.
+    @param limit: The maximum number of notes to return.
+    @param excerpt_length: The number of leading characters of the text to include, or 0.
+    @return: A sequence of rows labelled with Note.to_dict keys, plus length and excerpt.
+    """
+    with get_db() as db:
+        note_ids = _visible_note_ids(author_id, limit, after_note_id)
+        return db.execute(
+            _note_rows(_summary_columns(excerpt_length))
+            .join(note_ids, Note.note_id == note_ids.c.note_id)
+            .order_by(Note.note_id)
+            .limit(limit)
+        ).all()
+
+
+def get_note_by_id(note_id: int) -> NoteRecord | None:
     """
     Returns the note with the given ID.
     @param note_id: The ID of the note to retrieve.
-    @return: The note with the given ID, or None if no such note exists.
+    @return: The record of the note with the given ID, or None if no such note exists.
     """
     with get_db() as db:
-        return db.execute(
-            select(Note).where(Note.note_id == note_id)
-        ).scalar_one_or_none()
+        records = _read_records(db, _NOTE_RECORD_BY_ID, {"note_id": note_id})
+        return records[0] if records else None
+
+
+def stream_notes_for_user(
+    author_id: int, after_note_id: int = 0, batch_size: int = 500
+) -> Iterator[Sequence[Row]]:
+    """
+    Streams every note that is public or was created by the user with the given
+    ID, in note ID order. Each batch is its own keyset query, resumed after the
+    last note ID of the previous one, so only one batch of rows is held in memory
+    at a time however many notes there are.
+
+    Every batch is read on a standalone session that is closed before the batch
+    is yielded, so the stream can outlive the request that started it and holds
+    no connection while its consumer writes the rows out.
+    @param author_id: The ID of the user whose notes to export.
+    @param after_note_id: The note ID to resume after, or 0 to start from the beginning.
+    @param batch_size: The number of rows read per query.
+    @return: An iterator of batches of rows labelled with Note.to_dict keys.
+    """
+    while True:
+        with get_db(standalone=True) as db:
+            rows = (
+                db.connection()
+                .execute(
+                    _EXPORT_BATCH,
+                    {
+                        "author_id": author_id,
+                        "after_note_id": after_note_id,
+                        "branch_limit": batch_size,
+                        "limit": batch_size,
+                    },
+                )
+                .all()
+            )
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        after_note_id = rows[-1].note_id
+
+
+def search_notes_for_user(
+    author_id: int, query: str, after: tuple[int, int] | None = None, limit: int = 10
+) -> list[tuple[int, NoteRecord]]:
+    """
+    Searches the titles and text of notes that are public or were created by the
+    user with the given ID, most relevant first.
+    @param author_id: The ID of the user searching.
+    @param query: The search query.
+    @param after: The (rank, note_id) of the last result seen, or None to start
+        from the most relevant note.
+    @param limit: The maximum number of notes to return.
+    @return: (rank, note record) tuples ordered by rank, then note ID, descending.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    with get_db() as db:
+        ranked = get_search_backend(db).search(db, author_id, terms, after, limit)
+        if not ranked:
+            return []
+
+        records = _read_records(
+            db,
+            _note_rows(list(NOTE_RECORD_COLUMNS)).where(
+                Note.note_id.in_([note_id for _, note_id in ranked]),
+                or_(Note.is_public == True, Note.author_id == author_id),
+            ),
+        )
+        by_id = {record.note_id: record for record in records}
+        # A note deleted or made private since it was ranked is left out
+        return [(rank, by_id[note_id]) for rank, note_id in ranked if note_id in by_id]
 
 
 def create_note(
     note_title: str, note_text: str, author_id: int, is_public: bool = False
 ) -> Note:
     """
-    Creates a new note with the given title, text, and author ID.
+    Creates a new note with the given title, text, and author ID. The text is
+    stored once and shared with every other note that has the same text.
     @param note_title: The title of the note.
     @param note_text: The text of the note.
     @param author_id: The ID of the user who created the note.
     @param is_public: Whether the note should be public.
     @return: The newly created note.
     """
-    db_note = Note(
-        note_title=note_title,
-        note_text=note_text,
-        is_public=is_public,
-        author_id=author_id,
-    )
     with get_db() as db:
+        (content_hash,) = acquire_contents(db, [note_text])
+        db_note = Note(
+            note_title=note_title,
+            content_hash=content_hash,
+            is_public=is_public,
+            author_id=author_id,
+        )
         db.add(db_note)
         db.commit()
         db.refresh(db_note)
         return db_note
 
 
+def create_notes(author_id: int, notes: Sequence[tuple[str, str, bool]]) -> list[Note]:
+    """
+    Creates several notes for the same author. Where the database supports
+    INSERT ... RETURNING, SQLAlchemy's insertmanyvalues writes them and returns
+    their IDs in the order given, batching rows into multi-row INSERTs where it can
+    tell the returned rows apart; otherwise each note gets an INSERT of its own,
+    as only a single-row INSERT reliably reports its ID (InnoDB may interleave the
+    IDs of concurrent inserts).
+    @param author_id: The ID of the user who created the notes.
+    @param notes: (title, text, is_public) tuples, one per note.
+    @return: The newly created notes, in the order they were given.
+    """
+    if not notes:
+        return []
+
+    with get_db() as db:
+        content_hashes = acquire_contents(db, [note[1] for note in notes])
+        rows = _new_note_values(author_id, notes, content_hashes)
+        connection = db.connection()
+        if connection.dialect.insert_returning:
+            note_ids = connection.execute(_INSERT_NOTES_RETURNING, rows).scalars().all()
+        else:
+            note_ids = [
+                connection.execute(_INSERT_NOTE, row).inserted_primary_key[0]
+                for row in rows
+            ]
+        db.commit()
+        # One SELECT loads the server defaults, authors, and bodies of every new note
+        loaded = _get_notes_by_ids(db, author_id, note_ids)
+        return [loaded[note_id] for note_id in note_ids]
+
+
+def _new_note_values(
+    author_id: int, notes: Sequence[tuple[str, str, bool]], content_hashes: list[str]
+) -> list[dict]:
+    """
+    Builds the rows of a multi-row INSERT of notes.
+    @param author_id: The ID of the user who created the notes.
+    @param notes: (title, text, is_public) tuples, one per note.
+    @param content_hashes: The content hashes of the note texts, in the same order.
+    @return: One dict of column values per note.
+    """
+    return [
+        {
+            "note_title": note_title,
+            "content_hash": content_hash,
+            "is_public": is_public,
+            "author_id": author_id,
+        }
+        for (note_title, _, is_public), content_hash in zip(notes, content_hashes)
+    ]
+
+
+def import_notes(author_id: int, notes: Sequence[tuple[str, str, bool]]) -> int:
+    """
+    Inserts several notes for the same author with one multi-row INSERT, in a
+    transaction of its own. Unlike create_notes, the new notes are not read back.
+    @param author_id: The ID of the user who created the notes.
+    @param notes: (title, text, is_public) tuples, one per note.
+    @return: The number of notes inserted.
+    """
+    if not notes:
+        return 0
+
+    # Committed on its own, so an import never grows one request-long transaction
+    with get_db(standalone=True) as db:
+        content_hashes = acquire_contents(db, [note[1] for note in notes])
+        db.execute(
+            insert(Note).values(_new_note_values(author_id, notes, content_hashes))
+        )
+        db.commit()
+        return len(notes)
+
+
+def _repoint_values(note_title, is_public, content_hash) -> dict:
+    """
+    Builds the values that point a note at a shared body, clearing any text it
+    still stored inline, and move it to its next version.
+    @param note_title: The title of the note.
+    @param is_public: Whether the note should be public.
+    @param content_hash: The content hash of the note text.
+    @return: Values for an UPDATE of notes.
+    """
+    return {
+        Note.note_title: note_title,
+        Note.is_public: is_public,
+        Note.content_hash: content_hash,
+        Note.storage_format: FORMAT_PLAIN,
+        Note.plain_text: None,
+        Note.note_body: None,
+        Note.text_length: None,
+        Note.updated_at: func.now(),
+        Note.version: Note.version + 1,
+    }
+
+
+# The statements of the hottest reads and writes are built once, with bind
+# parameters for every value. Calls skip building the construct and its cache
+# key, and find the compiled SQL in the engine's compiled cache. Those marked
+# "prepare" run as server-side prepared statements when DB_PREPARED_STATEMENTS
+# is on, see prepared_statements.
+_VISIBLE_NOTE_IDS = _visible_note_ids(
+    bindparam("author_id"),
+    bindparam("branch_limit", type_=Integer),
+    bindparam("after_note_id"),
+)
+_VISIBLE_NOTE_RECORDS = (
+    _note_rows(list(NOTE_RECORD_COLUMNS))
+    .join(_VISIBLE_NOTE_IDS, Note.note_id == _VISIBLE_NOTE_IDS.c.note_id)
+    .order_by(Note.note_id)
+    .limit(bindparam("limit", type_=Integer))
+    .offset(bindparam("offset", type_=Integer))
+    .execution_options(prepare=True)
+)
+_INSERT_NOTE = insert(Note).execution_options(prepare=True)
+# Returns the IDs in the order of the rows given
+_INSERT_NOTES_RETURNING = insert(Note).returning(
+    Note.note_id, sort_by_parameter_order=True
+)
+_EXPORT_BATCH = (
+    _note_rows(_field_columns(list(NOTE_FIELDS)))
+    .join(_VISIBLE_NOTE_IDS, Note.note_id == _VISIBLE_NOTE_IDS.c.note_id)
+    .order_by(Note.note_id)
+    .limit(bindparam("limit", type_=Integer))
+)
+_NOTE_RECORD_BY_ID = (
+    _note_rows(list(NOTE_RECORD_COLUMNS))
+    .where(Note.note_id == bindparam("note_id"))
+    .execution_options(prepare=True)
+)
+_BY_ID_AND_AUTHOR = (
+    Note.note_id == bindparam("note_id"),
+    Note.author_id == bindparam("author_id"),
+)
+# The values of an updated note that the update does not set, with the time
+# to stamp it with, read while locking its row
+_LOCK_NOTE = (
+    select(
+        Note.content_hash,
+        Note.note_title,
+        Note.is_public,
+        Note.version,
+        Note.created_at,
+        Note.updated_at,
+        User.username,
+        func.now().label("now"),
+    )
+    .join(User, Note.author_id == User.user_id)
+    .where(*_BY_ID_AND_AUTHOR)
+    .with_for_update(of=Note)
+    .execution_options(prepare=True)
+)
+_REPOINT_NOTE = (
+    Note.__table__.update()
+    .where(
+        Note.note_id == bindparam("b_note_id"),
+        Note.author_id == bindparam("b_author_id"),
+    )
+    .values(
+        _repoint_values(
+            bindparam("b_note_title"),
+            bindparam("b_is_public"),
+            bindparam("b_content_hash"),
+        )
+    )
+    .execution_options(prepare=True)
+)
+_UPDATE_NOTE = (
+    Note.__table__.update()
+    .where(
+        Note.note_id == bindparam("b_note_id"),
+        Note.author_id == bindparam("b_author_id"),
+        # The version the caller saw, when it names one
+        or_(
+            bindparam("b_expected_version", type_=Integer).is_(None),
+            Note.version == bindparam("b_expected_version", type_=Integer),
+        ),
+    )
+    .values(
+        {
+            **_repoint_values(
+                bindparam("b_note_title"),
+                bindparam("b_is_public"),
+                bindparam("b_content_hash"),
+            ),
+            Note.updated_at: bindparam("b_updated_at"),
+        }
+    )
+    .execution_options(prepare=True)
+)
+_LOCK_NOTE_CONTENT_HASH = (
+    select(Note.content_hash)
+    .where(*_BY_ID_AND_AUTHOR)
+    .with_for_update()
+    .execution_options(prepare=True)
+)
+_DELETE_NOTE = (
+    delete(Note)
+    .where(*_BY_ID_AND_AUTHOR)
+    .execution_options(synchronize_session=False, prepare=True)
+)
+
+
+def update_notes(
+    author_id: int, notes: Sequence[tuple[int, str, str, bool]]
+) -> dict[int, Note]:
+    """
+    Updates several notes of the same author with one executemany UPDATE. As in
+    update_note, notes whose values do not change are not written.
+    @param author_id: The ID of the user who created the notes.
+    @param notes: (note_id, title, text, is_public) tuples, one per note.
+    @return: The notes that exist and belong to the author, keyed by note ID.
+    """
+    if not notes:
+        return {}
+
+    with get_db() as db:
+        current = {
+            row.note_id: row
+            for row in db.execute(
+                select(Note.note_id, Note.note_title, Note.is_public, Note.content_hash)
+                .where(
+                    Note.note_id.in_([note[0] for note in notes]),
+                    Note.author_id == author_id,
+                )
+                .with_for_update()
+            )
+        }
+
+        changes = []
+        for note_id, note_title, note_text, is_public in notes:
+            row = current.get(note_id)
+            if row is None:
+                continue
+            content_hash = hash_note_text(note_text)
+            if (row.note_title, row.is_public, row.content_hash) != (
+                note_title,
+                is_public,
+                content_hash,
+            ):
+                changes.append((row, note_title, note_text, is_public, content_hash))
+
+        moved = [change for change in changes if change[0].content_hash != change[4]]
+        acquire_contents(db, [change[2] for change in moved])
+        release_contents(db, [change[0].content_hash for change in moved])
+        if changes:
+            db.execute(
+                _REPOINT_NOTE,
+                [
+                    {
+                        "b_note_id": row.note_id,
+                        "b_author_id": author_id,
+                        "b_note_title": note_title,
+                        "b_is_public": is_public,
+                        "b_content_hash": content_hash,
+                    }
+                    for row, note_title, _, is_public, content_hash in changes
+                ],
+            )
+        db.commit()
+        return _get_notes_by_ids(db, author_id, list(current))
+
+
+def delete_notes(author_id: int, note_ids: Sequence[int]) -> set[int]:
+    """
+    Deletes several notes of the same author with one DELETE.
+    @param author_id: The ID of the user who created the notes.
+    @param note_ids: The IDs of the notes to delete.
+    @return: The IDs of the notes that existed and were deleted.
+    """
+    if not note_ids:
+        return set()
+
+    with get_db() as db:
+        owned = db.execute(
+            select(Note.note_id, Note.content_hash)
+            .where(Note.note_id.in_(note_ids), Note.author_id == author_id)
+            .with_for_update()
+        ).all()
+        owned_ids = {row.note_id for row in owned}
+        if owned_ids:
+            release_contents(db, [row.content_hash for row in owned])
+            db.execute(
+                delete(Note)
+                .where(Note.note_id.in_(owned_ids), Note.author_id == author_id)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        return owned_ids
+
+
+def _get_notes_by_ids(db, author_id: int, note_ids: Sequence[int]) -> dict[int, Note]:
+    """
+    Loads the notes of an author with the given IDs in one SELECT.
+    @param db: The session to load the notes with.
+    @param author_id: The ID of the user who created the notes.
+    @param note_ids: The IDs of the notes to load.
+    @return: The notes found, keyed by note ID.
+    """
+    db_notes = db.execute(
+        select(Note)
+        .where(Note.note_id.in_(note_ids), Note.author_id == author_id)
+        .execution_options(populate_existing=True)
+    ).scalars()
+    return {db_note.note_id: db_note for db_note in db_notes}
+
+
 def update_note(
     note_id: int,
     note_title: str,
     note_text: str,
     author_id: int,
     is_public: bool = False,
-) -> Note | None:
+    expected_version: int | None = None,
+) -> NoteRecord | None:
     """
-    Updates the note with the given ID.
+    Updates the note with the given ID with one conditional UPDATE, which only
+    writes when, given expected_version, the note is still at that version. The
+    row is locked first; whether a value changes is decided against it in
+    Python, as comparisons in SQL follow the column collation and would miss a
+    change of case or trailing spaces. The note returned is built from that row
+    and the new values, so nothing is read back.
     @param note_id: The ID of the note to update.
     @param note_title: The new title of the note.
     @param note_text: The new text of the note.
     @param author_id: The ID of the user who created the note.
     @param is_public: Whether the note should be public.
-    @return: The updated note, or None if no such note exists.
+    @param expected_version: The version of the note the caller last saw, if any.
+    @return: The note as it is after the update, or None if no such note exists.
+    @raises StaleNoteException: If the note is no longer at expected_version.
     """
     with get_db() as db:
-        db_note = db.execute(
-            select(Note).where(
-                and_(
-                    Note.author_id == author_id,
-                    Note.note_id == note_id,
-                )
+        row = db.execute(
+            _LOCK_NOTE, {"note_id": note_id, "author_id": author_id}
+        ).one_or_none()
+        if row is None:
+            return None
+        if expected_version is not None and row.version != expected_version:
+            raise StaleNoteException(f"Note {note_id} has been modified")
+
+        content_hash = hash_note_text(note_text)
+        if (row.note_title, row.is_public, row.content_hash) == (
+            note_title,
+            is_public,
+            content_hash,
+        ):
+            # Nothing changed, so nothing is written
+            return NoteRecord(
+                note_id,
+                row.note_title,
+                note_text,
+                row.is_public,
+                author_id,
+                row.username,
+                row.created_at,
+                row.updated_at,
+                row.version,
             )
-        ).scalar_one_or_none()
 
-        if db_note is None:
-            return None
+        if row.content_hash != content_hash:
+            # The new body must exist before the note points at it
+            acquire_contents(db, [note_text])
+            release_contents(db, [row.content_hash])
+        updated = db.execute(
+            _UPDATE_NOTE,
+            {
+                "b_note_id": note_id,
+                "b_author_id": author_id,
+                "b_expected_version": expected_version,
+                "b_note_title": note_title,
+                "b_is_public": is_public,
+                "b_content_hash": content_hash,
+                "b_updated_at": row.now,
+            },
+        ).rowcount
+        if not updated:
+            # The version check repeats the one above against the written row
+            raise StaleNoteException(f"Note {note_id} has been modified")
 
-        db_note.note_title = note_title
-        db_note.note_text = note_text
-        db_note.is_public = is_public
         db.commit()
-        db.refresh(db_note)
-        return db_note
+        return NoteRecord(
+            note_id,
+            note_title,
+            note_text,
+            is_public,
+            author_id,
+            row.username,
+            row.created_at,
+            row.now,
+            row.version + 1,
+        )
 
 
 def delete_note(author_id: int, note_id: int) -> bool:
@@ -114,14 +880,59 @@ def delete_note(author_id: int, note_id: int) -> bool:
     @param note_id: The ID of the note to delete.
     @return: True if the note was deleted, False if no such note exists.
     """
+    by_id = {"note_id": note_id, "author_id": author_id}
     with get_db() as db:
-        result = db.execute(
-            delete(Note).where(
-                and_(
-                    Note.note_id == note_id,
-                    Note.author_id == author_id,
-                )
+        row = db.execute(_LOCK_NOTE_CONTENT_HASH, by_id).one_or_none()
+        if row is None:
+            return False
+
+        release_contents(db, [row.content_hash])
+        db.execute(_DELETE_NOTE, by_id)
+        db.commit()
+        return True
+
+
+def backfill_note_storage(after_note_id: int = 0, batch_size: int = 500) -> int | None:
+    """
+    Moves a batch of notes whose text is still stored inline into shared bodies.
+    Inline notes are recognised by a missing content_hash, so the backfill can be
+    stopped and resumed at any point.
+    @param after_note_id: The note ID to resume after.
+    @param batch_size: The maximum number of notes to move.
+    @return: The ID of the last note in the batch, or None if none were left.
+    """
+    with get_db() as db:
+        db_notes = (
+            db.execute(
+                select(Note)
+                .where(Note.content_hash.is_(None), Note.note_id > after_note_id)
+                .order_by(Note.note_id)
+                .limit(batch_size)
+                .with_for_update(of=Note)
             )
+            .scalars()
+            .all()
+        )
+        if not db_notes:
+            return None
+
+        content_hashes = acquire_contents(db, [note.note_text for note in db_notes])
+        values = _repoint_values(
+            Note.note_title, Note.is_public, bindparam("b_content_hash")
+        )
+        # The text does not change, so neither does the version; keep MySQL's
+        # ON UPDATE CURRENT_TIMESTAMP from touching updated_at
+        values[Note.updated_at] = Note.updated_at
+        values[Note.version] = Note.version
+        db.execute(
+            Note.__table__.update()
+            .where(Note.note_id == bindparam("b_note_id"))
+            .values(values),
+            [
+                {"b_note_id": db_note.note_id, "b_content_hash": content_hash}
+                for db_note, content_hash in zip(db_notes, content_hashes)
+            ],
         )
+        last_note_id = db_notes[-1].note_id
         db.commit()
-        return result.rowcount > 0
+        return last_note_id
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import DefaultExecutionContext
+
+from ..metrics import Counter
+
+try:
+    from mysql.connector.connection_cext import CMySQLConnection
+except ImportError:  # The C extension of mysql-connector is optional
+    CMySQLConnection = None
+
+STATEMENTS_PREPARED = Counter(
+    "sql_prepared_statements_prepared_total",
+    "Statements prepared on the server for one of the pool's connections",
+)
+STATEMENTS_REUSED = Counter(
+    "sql_prepared_statements_reused_total",
+    "Executions of a statement already prepared on their connection",
+)
+STATEMENTS_CLOSED = Counter(
+    "sql_prepared_statements_closed_total",
+    "Prepared statements closed to keep connections within their limit",
+)
+
+
+def _supports_prepared_cursors(connection) -> bool:
+    # Only the C extension's prepared cursor keeps its statement across resets
+    return CMySQLConnection is not None and isinstance(connection, CMySQLConnection)
+
+
+class PreparedCursors:
+    """
+    The idle prepared cursors of one DBAPI connection, one per SQL statement.
+
+    A cursor is prepared the first time its statement runs on the connection and
+    reused, without preparing again, every time after. At most `max_statements`
+    are kept; the least recently used is closed, deallocating its statement on
+    the server. A cursor is taken out while in use, so a statement running twice
+    at once gets a second one.
+    """
+
+    def __init__(self, connection, max_statements: int):
+        self.connection = connection
+        self.max_statements = max_statements
+        self._idle: OrderedDict[str, object] = OrderedDict()
+
+    def checkout(self, statement: str) -> "_PooledCursor":
+        """
+        Takes the idle cursor of a statement, or creates one.
+        @param statement: The SQL statement the cursor will execute.
+        @return: The cursor, which goes back to the idle ones when closed.
+        """
+        cursor = self._idle.pop(statement, None)
+        if cursor is None:
+            STATEMENTS_PREPARED.inc()
+            # Prepared cursors cannot be buffered; results are read in full
+            cursor = self.connection.cursor(prepared=True, buffered=False)
+        else:
+            STATEMENTS_REUSED.inc()
+        return _PooledCursor(self, statement, cursor)
+
+    def checkin(self, statement: str, cursor):
+        """
+        Keeps a cursor for the next execution of its statement.
+        @param statement: The SQL statement the cursor executed.
+        @param cursor: The prepared cursor.
+        """
+        if statement in self._idle:
+            cursor.close()
+            return
+        # Frees any unread rows; the statement stays prepared
+        cursor.reset()
+        self._idle[statement] = cursor
+        while len(self._idle) > self.max_statements:
+            _, evicted = self._idle.popitem(last=False)
+            evicted.close()
+            STATEMENTS_CLOSED.inc()
+
+    def __len__(self):
+        return len(self._idle)
+
+
+class _PooledCursor:
+    """
+    A prepared cursor as SQLAlchemy sees it; closing it hands the cursor back to
+    its connection's PreparedCursors instead of deallocating the statement.
+    """
+
+    def __init__(self, cursors: PreparedCursors, statement: str, cursor):
+        self._cursors = cursors
+        self._statement = statement
+        self._cursor = cursor
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def close(self):
+        if self._cursors is not None:
+            self._cursors.checkin(self._statement, self._cursor)
+            self._cursors = None
+
+
+class PreparedExecutionContext(DefaultExecutionContext):
+    """
+    Runs statements with the `prepare` execution option on server-side prepared
+    cursors, kept per connection. Every other statement runs as usual. The
+    mysqlconnector dialect executes with DefaultExecutionContext itself.
+    """
+
+    def create_default_cursor(self):
+        if not self.execution_options.get("prepare") or self.compiled is None:
+            return super().create_default_cursor()
+
+        connection = self._dbapi_connection.dbapi_connection
+        if not _supports_prepared_cursors(connection):
+            return super().create_default_cursor()
+        # The pool clears info when it closes or invalidates the connection
+        info = self._dbapi_connection.info
+        cursors = info.get("prepared_cursors")
+        if cursors is None:
+            cursors = info["prepared_cursors"] = PreparedCursors(
+                connection, self.dialect.max_prepared_statements
+            )
+        return cursors.checkout(self.unicode_statement)
+
+
+def enable_prepared_statements(engine: Engine, max_statements: int):
+    """
+    Runs the statements marked with the `prepare` execution option as
+    server-side prepared statements, which skip parsing on every execution after
+    the first on each connection. They need the mysql-connector C extension;
+    without it, or for unmarked statements, the text protocol is used as before.
+    @param engine: The engine to configure.
+    @param max_statements: The most statements kept prepared per connection.
+    @raises ValueError: If the engine does not use the mysqlconnector driver.
+    """
+    dialect = engine.dialect
+    if dialect.name != "mysql" or dialect.driver != "mysqlconnector":
+        raise ValueError(
+            "Prepared statements require the mysql+mysqlconnector driver, "
+            f"not {dialect.name}+{dialect.driver}"
+        )
+    dialect.max_prepared_statements = max_statements
+    dialect.execution_ctx_cls = PreparedExecutionContext
@@ -0,0 +1,98 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from ..config import settings
+from ..exceptions.auth_exception import AuthException
+from ..models.refresh_token import RefreshToken
+from ..models.user import User
+from .database import get_db
+
+
+def _hash_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, so a fast hash is enough to protect them
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _new_refresh_token(user_id: int, family_id: str) -> tuple[RefreshToken, str]:
+    token = secrets.token_urlsafe(32)
+    db_token = RefreshToken(
+        token_hash=_hash_token(token),
+        family_id=family_id,
+        user_id=user_id,
+        expires_at=_utcnow() + timedelta(seconds=settings.REFRESH_TOKEN_EXPIRES_SEC),
+    )
+    return db_token, token
+
+
+def create_refresh_token(user_id: int) -> str:
+    """
+    Issues a refresh token that starts a new rotation family.
+    @param user_id: The ID of the user the token is issued to.
+    @return: The raw refresh token. Only its digest is stored.
+    """
+    db_token, token = _new_refresh_token(user_id, uuid.uuid4().hex)
+    with get_db() as db:
+        db.add(db_token)
+        db.commit()
+    return token
+
+
+def rotate_refresh_token(token: str) -> tuple[User, str]:
+    """
+    Exchanges a refresh token for a new one in the same family. Each token can be
+    used once; presenting a token that was already used revokes its whole family,
+    since either the client or an attacker holds a stolen copy.
+    @param token: The raw refresh token.
+    @return: A tuple of the token's user and the new raw refresh token.
+    @raises AuthException: If the token is unknown, expired, revoked or reused.
+    """
+    token_hash = _hash_token(token)
+    now = _utcnow()
+    # A standalone session commits the revocation below even though the request
+    # that presented a reused token fails
+    with get_db(standalone=True) as db:
+        # Claim the token atomically so concurrent refreshes cannot both succeed
+        claimed = db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(used_at=now)
+        ).rowcount
+        db_token = db.execute(
+            select(RefreshToken).where(RefreshToken.token_hash == token_hash)
+        ).scalar_one_or_none()
+
+        if claimed != 1:
+            if db_token is not None and db_token.used_at is not None:
+                db.execute(
+                    update(RefreshToken)
+                    .where(
+                        RefreshToken.family_id == db_token.family_id,
+                        RefreshToken.revoked_at.is_(None),
+                    )
+                    .values(revoked_at=now)
+                )
+                db.commit()
+            raise AuthException("Invalid refresh token")
+
+        new_db_token, new_token = _new_refresh_token(
+            db_token.user_id, db_token.family_id
+        )
+        user = db_token.user
+        # Keep the loaded user readable after the commit expires session state
+        db.expunge(user)
+        db.add(new_db_token)
+        db.commit()
+        return user, new_token
@@ -0,0 +1,298 @@
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, func, or_, select, tuple_, union_all
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.note import Note
+from ..models.note_content import NoteContent
+
+# MySQL's default innodb_ft_min_token_size and maximum token length
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 84
+# A query term found in the title counts this many times as much as one in the text
+TITLE_WEIGHT = 2
+# Ranks are relevance scores scaled to integers, so cursors can carry them
+RANK_SCALE = 1000
+# The inverted index rescans bodies stored this long before the newest it has
+# seen, for transactions that commit after a later one did
+SYNC_OVERLAP_SEC = 60
+# and lists every body this often, see InvertedIndexSearchBackend
+FULL_SYNC_SEC = 600
+
+_TERM_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase search terms, dropping terms the FULLTEXT index
+    would not store either.
+    @param text: The text to split.
+    @return: The terms, in order and with repeats.
+    """
+    return [
+        term
+        for term in _TERM_PATTERN.findall(text.lower())
+        if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH
+    ]
+
+
+def note_search_terms(note_text: str) -> str:
+    """
+    Builds the search_terms value of a note body: each distinct term once, so
+    repetitive bodies such as stack traces index small.
+    @param note_text: The note text.
+    @return: The distinct terms of the text, separated by spaces.
+    """
+    return " ".join(dict.fromkeys(tokenize(note_text)))
+
+
+def _visible(author_id: int):
+    return or_(Note.is_public == True, Note.author_id == author_id)
+
+
+class SearchBackend(ABC):
+    """
+    Finds the notes visible to a user that match a query, most relevant first.
+    Results are ordered by (rank, note_id) descending and resume after the
+    (rank, note_id) of the last result seen.
+    """
+
+    @abstractmethod
+    def search(
+        self,
+        db: Session,
+        author_id: int,
+        terms: Sequence[str],
+        after: tuple[int, int] | None,
+        limit: int,
+    ) -> list[tuple[int, int]]:
+        """
+        Ranks the notes that match the given terms.
+        @param db: The session to query with.
+        @param author_id: The ID of the user searching.
+        @param terms: The search terms, as returned by tokenize.
+        @param after: The (rank, note_id) to resume after, or None for the first page.
+        @param limit: The maximum number of results.
+        @return: (rank, note_id) tuples, most relevant first.
+        """
+
+
+class FullTextSearchBackend(SearchBackend):
+    """
+    Searches with MySQL FULLTEXT indexes on notes.note_title and
+    note_contents.search_terms, in natural language mode.
+
+    MySQL cannot use either index for a MATCH on one table OR a MATCH on another,
+    so titles and bodies are looked up separately, each through its own index,
+    and the scores of a note found by both are added up.
+    """
+
+    def search(self, db, author_id, terms, after, limit):
+        query = " ".join(terms)
+        title_score = mysql.match(
+            Note.note_title, against=query
+        ).in_natural_language_mode()
+        body_score = mysql.match(
+            NoteContent.search_terms, against=query
+        ).in_natural_language_mode()
+        title_hits = select(
+            Note.note_id, (TITLE_WEIGHT * title_score).label("score")
+        ).where(title_score > 0, _visible(author_id))
+        body_hits = (
+            select(Note.note_id, body_score.label("score"))
+            .select_from(NoteContent)
+            .join(Note, Note.content_hash == NoteContent.content_hash)
+            .where(body_score > 0, _visible(author_id))
+        )
+        hits = union_all(title_hits, body_hits).subquery()
+        ranked = (
+            select(
+                cast(func.floor(func.sum(hits.c.score) * RANK_SCALE), Integer).label(
+                    "rank"
+                ),
+                hits.c.note_id,
+            )
+            .group_by(hits.c.note_id)
+            .subquery()
+        )
+        statement = select(ranked.c.rank, ranked.c.note_id).where(ranked.c.rank > 0)
+        if after is not None:
+            statement = statement.where(
+                tuple_(ranked.c.rank, ranked.c.note_id) < tuple_(*after)
+            )
+        rows = db.execute(
+            statement.order_by(ranked.c.rank.desc(), ranked.c.note_id.desc()).limit(
+                limit
+            )
+        )
+        return [tuple(row) for row in rows]
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    Searches with an inverted index kept in process, for databases without
+    FULLTEXT indexes such as the SQLite database the tests run on.
+
+    Note bodies never change once stored, so each search only indexes the
+    bodies stored since the newest one seen, and bodies purged by this process
+    are dropped when the purge commits. Every FULL_SYNC_SEC, all bodies are
+    listed instead, which drops those purged by other processes and picks up
+    those indexed after they were stored. Bodies are scored by the IDF of each
+    query term they contain; titles are short and change, so they are matched
+    in the database and scored the same way.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._postings: dict[str, set[str]] = {}
+        self._terms: dict[str, tuple[str, ...]] = {}
+        # The created_at of the newest body indexed, and when all were listed
+        self._high_water: datetime | None = None
+        self._full_sync_at: float | None = None
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _sync(self, db: Session):
+        """
+        Indexes bodies added since the last sync, listing every body when a full
+        sync is due.
+        """
+        now = self._clock()
+        with self._lock:
+            full = self._full_sync_at is None or (
+                now - self._full_sync_at >= FULL_SYNC_SEC
+            )
+            if full:
+                self._full_sync_at = now
+            high_water = self._high_water
+
+        statement = select(NoteContent.content_hash, NoteContent.created_at).where(
+            NoteContent.search_terms.is_not(None)
+        )
+        if not full and high_water is not None:
+            statement = statement.where(
+                NoteContent.created_at
+                >= high_water - timedelta(seconds=SYNC_OVERLAP_SEC)
+            )
+        stored = dict(db.execute(statement).all())
+        if full:
+            with self._lock:
+                purged = self._terms.keys() - stored.keys()
+            self.forget(purged)
+
+        with self._lock:
+            missing = stored.keys() - self._terms.keys()
+            if stored:
+                newest = max(stored.values())
+                if self._high_water is None or newest > self._high_water:
+                    self._high_water = newest
+        if not missing:
+            return
+
+        rows = db.execute(
+            select(NoteContent.content_hash, NoteContent.search_terms).where(
+                NoteContent.content_hash.in_(missing)
+            )
+        )
+        with self._lock:
+            for content_hash, search_terms in rows:
+                terms = tuple(search_terms.split())
+                self._terms[content_hash] = terms
+                for term in terms:
+                    self._postings.setdefault(term, set()).add(content_hash)
+
+    def forget(self, content_hashes: Iterable[str]):
+        """
+        Drops purged bodies from the index.
+        @param content_hashes: The content hashes of the bodies.
+        """
+        with self._lock:
+            for content_hash in content_hashes:
+                for term in self._terms.pop(content_hash, ()):
+                    postings = self._postings[term]
+                    postings.discard(content_hash)
+                    if not postings:
+                        del self._postings[term]
+
+    def _idf(self, term: str) -> float:
+        documents = len(self._terms)
+        return math.log(1 + (documents + 1) / (len(self._postings.get(term, ())) + 1))
+
+    def search(self, db, author_id, terms, after, limit):
+        self._sync(db)
+        terms = set(terms)
+        with self._lock:
+            idf = {term: self._idf(term) for term in terms}
+            body_scores: dict[str, float] = {}
+            for term in terms:
+                for content_hash in self._postings.get(term, ()):
+                    body_scores[content_hash] = (
+                        body_scores.get(content_hash, 0.0) + idf[term]
+                    )
+
+        # LIKE narrows the titles down; tokenize decides which terms they contain
+        candidates = db.execute(
+            select(Note.note_id, Note.note_title, Note.content_hash).where(
+                _visible(author_id),
+                or_(
+                    Note.content_hash.in_(body_scores),
+                    *[
+                        Note.note_title.contains(term, autoescape=True)
+                        for term in terms
+                    ],
+                ),
+            )
+        )
+        results = []
+        for note_id, note_title, content_hash in candidates:
+            score = body_scores.get(content_hash, 0.0) + TITLE_WEIGHT * sum(
+                idf[term] for term in terms.intersection(tokenize(note_title))
+            )
+            rank = math.floor(score * RANK_SCALE)
+            if rank > 0 and (after is None or (rank, note_id) < tuple(after)):
+                results.append((rank, note_id))
+        results.sort(reverse=True)
+        return results[:limit]
+
+
+SEARCH_BACKENDS = {
+    "fulltext": FullTextSearchBackend,
+    "inverted_index": InvertedIndexSearchBackend,
+}
+_backends: dict[str, SearchBackend] = {}
+
+
+def forget_note_contents(content_hashes: Sequence[str]):
+    """
+    Drops purged bodies from the in-process search indexes.
+    @param content_hashes: The content hashes of the purged bodies.
+    """
+    for backend in _backends.values():
+        if isinstance(backend, InvertedIndexSearchBackend):
+            backend.forget(content_hashes)
+
+
+def get_search_backend(db: Session) -> SearchBackend:
+    """
+    Returns the configured search backend. With NOTES_SEARCH_BACKEND set to
+    "auto", MySQL uses its FULLTEXT indexes and other databases the in-process
+    inverted index.
+    @param db: The session the backend will query with.
+    @return: The search backend, shared between calls.
+    @raises ValueError: If NOTES_SEARCH_BACKEND names an unknown backend.
+    """
+    name = settings.NOTES_SEARCH_BACKEND
+    if name == "auto":
+        name = "fulltext" if db.get_bind().dialect.name == "mysql" else "inverted_index"
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown notes search backend: {name}")
+    if name not in _backends:
+        _backends[name] = SEARCH_BACKENDS[name]()
+    return _backends[name]
@@ -1,13 +1,12 @@
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 
-import base64
-import hashlib
-import os
-
 from ..db.database import get_db
 from ..exceptions.auth_exception import AuthException
+from ..exceptions.hash_pool_saturated_exception import HashPoolSaturatedException
 from ..exceptions.user_exists_exception import UserAlreadyExistsException
 from ..models.user import User
+from ..security.passwords import hash_password, needs_rehash, verify_password
 
 
 def create_user(username: str, password: str) -> User:
@@ -17,12 +16,10 @@ def create_user(username: str, password: str) -> User:
     @param password: The password of the new user.
     @return: The newly created user.
     @raises UserAlreadyExistsException: If a user with the given username already exists.
+    @raises HashPoolSaturatedException: If the password hashing pool is full.
     """
     try:
-        salt = os.urandom(16)
-        hashed_password = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100000)
-        encoded_password = base64.b64encode(hashed_password + salt).decode("utf-8")
-        new_user = User(username=username, password=encoded_password)
+        new_user = User(username=username, password=hash_password(password))
         with get_db() as db:
             db.add(new_user)
             db.commit()
@@ -35,22 +32,44 @@ def create_user(username: str, password: str) -> User:
 def check_password(username: str, password: str) -> User:
     """
     Checks if the given password is correct for the user with the given username.
+    A hash stored in an old format or with old cost parameters is replaced with
+    one using the current parameters once the password has been verified.
     @param username: The username of the user.
     @param password: The password to check.
     @return: The user if the password is correct.
     @raises AuthException: If the username or password is invalid
+    @raises HashPoolSaturatedException: If the password hashing pool is full.
     """
-    with get_db() as db:
+    # Read on a standalone session so no connection is held while hashing
+    with get_db(standalone=True) as db:
         user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise AuthException("Invalid username or password")
-
-        combined = base64.b64decode(user.password)
-        stored_hashed_password = combined[:32]
-        stored_salt = combined[32:]
-        hashed_password = hashlib.pbkdf2_hmac(
-            "sha256", password.encode(), stored_salt, 100000
+    if not user:
+        raise AuthException("Invalid username or password")
+
+    if not verify_password(password, user.password):
+        raise AuthException("Invalid username or password")
+
+    if needs_rehash(user.password):
+        try:
+            _rehash_password(user, password)
+        except HashPoolSaturatedException:
+            pass  # the login already succeeded, upgrade on a later one
+    return user
+
+
+def _rehash_password(user: User, password: str):
+    """
+    Stores a hash of the password using the current parameters, unless the stored
+    hash changed since it was read.
+    @param user: The user whose password was just verified.
+    @param password: The verified password.
+    """
+    new_password = hash_password(password)
+    with get_db() as db:
+        db.execute(
+            update(User)
+            .where(User.user_id == user.user_id, User.password == user.password)
+            .values(password=new_password)
         )
-        if stored_hashed_password != hashed_password:
-            raise AuthException("Invalid username or password")
-        return user
+        db.commit()
+    user.password = new_password
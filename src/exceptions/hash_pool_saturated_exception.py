@@ -0,0 +1,3 @@
+class HashPoolSaturatedException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,226 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
+
+# (sample name, labels, value)
+Sample = tuple[str, dict[str, str], float]
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Registry:
+    """
+    Holds the application's metrics and renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric") -> "Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, registry: Registry | None):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """
+        @return: The (name, labels, value) samples of the metric.
+        """
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing value.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, registry: Registry | None = REGISTRY):
+        super().__init__(name, documentation, registry)
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self):
+        yield self.name, {}, self._value
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, or that is read from a callback at scrape time.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        function: Callable[[], float] | None = None,
+        registry: Registry | None = REGISTRY,
+    ):
+        super().__init__(name, documentation, registry)
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def samples(self):
+        yield self.name, {}, self.value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+        registry: Registry | None = REGISTRY,
+    ):
+        super().__init__(name, documentation, registry)
+        self._upper_bounds = sorted(buckets) + [math.inf]
+        self._bucket_counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self._upper_bounds):
+                if value <= bound:
+                    self._bucket_counts[i] += 1
+                    break
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def samples(self):
+        with self._lock:
+            bucket_counts = list(self._bucket_counts)
+            total, count = self._sum, self._count
+
+        cumulative = 0
+        for bound, bucket_count in zip(self._upper_bounds, bucket_counts):
+            cumulative += bucket_count
+            yield f"{self.name}_bucket", {"le": _format_value(bound)}, cumulative
+        yield f"{self.name}_sum", {}, total
+        yield f"{self.name}_count", {}, count
+
+
+class CallbackMetric(Metric):
+    """
+    A metric family whose labelled samples are produced by a callback at scrape time.
+    """
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        type: str,
+        collect: Callable[[], Iterable[Sample]],
+        registry: Registry | None = REGISTRY,
+    ):
+        super().__init__(name, documentation, registry)
+        self.type = type
+        self._collect = collect
+
+    def samples(self):
+        return self._collect()
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
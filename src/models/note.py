@@ -1,8 +1,23 @@
-from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey, func
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    String,
+    Text,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    SmallInteger,
+    func,
+)
 from sqlalchemy.orm import Mapped, relationship
-from sqlalchemy.dialects.mysql import INTEGER
+from sqlalchemy.dialects.mysql import INTEGER, LONGBLOB, TINYINT
 
+from ..db.compression import FORMAT_PLAIN, decode_note_text, note_codec
 from ..db.database import Base
+from ..models.note_content import NoteContent
 from ..models.user import User
 
 
@@ -12,10 +27,31 @@ class Note(Base):
     """
 
     __tablename__ = "notes"
+    __table_args__ = (
+        # Serve the two branches of the "public or mine" listing as range scans
+        Index("idx_public_note_id", "is_public", "note_id"),
+        Index("idx_author_public_note_id", "author_id", "is_public", "note_id"),
+        Index("idx_content_hash", "content_hash"),
+        Index("ft_note_title", "note_title", mysql_prefix="FULLTEXT"),
+    )
 
     note_id = Column(INTEGER(display_width=11), primary_key=True, autoincrement=True)
     note_title = Column(String(255), nullable=False)
-    note_text = Column(Text, nullable=False)
+    # The shared body of the note; notes written before bodies were shared keep
+    # their text inline in the columns below until backfilled
+    content_hash = Column(
+        String(64), ForeignKey(NoteContent.content_hash), nullable=True
+    )
+    # Stored form of the inline note text, see NoteCodec; read it through note_text
+    storage_format = Column(
+        SmallInteger().with_variant(TINYINT, "mysql"),
+        nullable=False,
+        default=FORMAT_PLAIN,
+        server_default="0",
+    )
+    plain_text = Column("note_text", Text, nullable=True)
+    note_body = Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=True)
+    text_length = Column(INTEGER(display_width=11), nullable=True)
     is_public = Column(Boolean, nullable=False, default=False)
     author_id = Column(
         INTEGER(display_width=11),
@@ -24,9 +60,30 @@ class Note(Base):
     )
     created_at = Column(DateTime, nullable=False, server_default=func.now())
     updated_at = Column(DateTime, nullable=False, server_default=func.now())
+    # Incremented by every write that changes the note; ETags are built from it,
+    # as updated_at only has one-second resolution
+    version = Column(
+        INTEGER(display_width=11), nullable=False, default=1, server_default="1"
+    )
 
     # Relationship to the User model
     author_user: Mapped[User] = relationship(lazy="joined", innerjoin=True)
+    # Relationship to the NoteContent model
+    content: Mapped[NoteContent | None] = relationship(lazy="joined")
+
+    @property
+    def note_text(self) -> str:
+        """
+        The note text, decompressed on access.
+        """
+        if self.content is not None:
+            return self.content.note_text
+        return decode_note_text(self.storage_format, self.plain_text, self.note_body)
+
+    @note_text.setter
+    def note_text(self, note_text: str):
+        for key, value in note_codec.encode(note_text).items():
+            setattr(self, key, value)
 
     def __repr__(self):
         return (
@@ -55,4 +112,165 @@ class Note(Base):
             and self.author_id == other.author_id
             and self.created_at == other.created_at
             and self.updated_at == other.updated_at
+            and self.version == other.version
+        )
+
+
+# The labelled columns behind each Note.to_dict key, for column-level selects.
+# Note text is selected in its stored form, from note_contents or inline, and
+# decoded by note_row_to_dict. Inline columns are NULL once a note has content.
+NOTE_FIELDS = {
+    "note_id": (Note.note_id.label("note_id"),),
+    "title": (Note.note_title.label("title"),),
+    "text": (
+        func.coalesce(NoteContent.storage_format, Note.storage_format).label(
+            "_storage_format"
+        ),
+        func.coalesce(NoteContent.plain_text, Note.plain_text).label("_plain_text"),
+        func.coalesce(NoteContent.note_body, Note.note_body).label("_note_body"),
+    ),
+    "public": (Note.is_public.label("public"),),
+    "author": (User.username.label("author"),),
+    "created_at": (Note.created_at.label("created_at"),),
+    "updated_at": (Note.updated_at.label("updated_at"),),
+}
+
+
+def note_row_to_dict(row) -> dict:
+    """
+    Converts a column-level note row, labelled with Note.to_dict keys, into a dict.
+    @param row: The row to convert.
+    @return: A dict with the row's values, datetimes in ISO format.
+    """
+    values = dict(row._mapping)
+    if "_storage_format" in values:
+        values["text"] = decode_note_text(
+            values.pop("_storage_format"),
+            values.pop("_plain_text"),
+            values.pop("_note_body"),
+        )
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+
+
+class NoteRecord:
+    """
+    A note as the read endpoints serve it, read with a column-level select
+    instead of as a Note. It holds only the values to_dict needs plus the
+    author ID and version, with its text already decoded, and is not tracked
+    by any session.
+    """
+
+    __slots__ = (
+        "note_id",
+        "note_title",
+        "note_text",
+        "is_public",
+        "author_id",
+        "author",
+        "created_at",
+        "updated_at",
+        "version",
+    )
+
+    def __init__(
+        self,
+        note_id: int,
+        note_title: str,
+        note_text: str,
+        is_public: bool,
+        author_id: int,
+        author: str,
+        created_at: datetime,
+        updated_at: datetime,
+        version: int,
+    ):
+        self.note_id = note_id
+        self.note_title = note_title
+        self.note_text = note_text
+        self.is_public = is_public
+        self.author_id = author_id
+        self.author = author
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.version = version
+
+    def __repr__(self):
+        return (
+            f"<NoteRecord(note_id={self.note_id}, title='{self.note_title}', "
+            f"public={self.is_public}, author_id={self.author_id}, created_at={self.created_at}, "
+            f"updated_at={self.updated_at})>"
+        )
+
+    def to_dict(self):
+        return {
+            "note_id": self.note_id,
+            "title": self.note_title,
+            "text": self.note_text,
+            "public": self.is_public,
+            "author": self.author,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+    def __eq__(self, other):
+        return (
+            self.note_id == other.note_id
+            and self.note_title == other.note_title
+            and self.note_text == other.note_text
+            and self.is_public == other.is_public
+            and self.author_id == other.author_id
+            and self.created_at == other.created_at
+            and self.updated_at == other.updated_at
+            and self.version == other.version
+        )
+
+
+# The columns of a NoteRecord, in the order note_records unpacks them
+NOTE_RECORD_COLUMNS = (
+    *NOTE_FIELDS["note_id"],
+    *NOTE_FIELDS["title"],
+    *NOTE_FIELDS["text"],
+    *NOTE_FIELDS["public"],
+    Note.author_id.label("author_id"),
+    *NOTE_FIELDS["author"],
+    *NOTE_FIELDS["created_at"],
+    *NOTE_FIELDS["updated_at"],
+    Note.version.label("version"),
+)
+
+
+def note_records(rows) -> list[NoteRecord]:
+    """
+    Converts rows of NOTE_RECORD_COLUMNS into note records.
+    @param rows: The rows to convert.
+    @return: A list of note records, in row order.
+    """
+    return [
+        NoteRecord(
+            note_id,
+            note_title,
+            decode_note_text(storage_format, plain_text, note_body),
+            is_public,
+            author_id,
+            author,
+            created_at,
+            updated_at,
+            version,
         )
+        for (
+            note_id,
+            note_title,
+            storage_format,
+            plain_text,
+            note_body,
+            is_public,
+            author_id,
+            author,
+            created_at,
+            updated_at,
+            version,
+        ) in rows
+    ]
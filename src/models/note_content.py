@@ -0,0 +1,56 @@
+from sqlalchemy import (
+    Column,
+    String,
+    Text,
+    DateTime,
+    Index,
+    LargeBinary,
+    SmallInteger,
+    func,
+)
+from sqlalchemy.dialects.mysql import INTEGER, LONGBLOB, MEDIUMTEXT, TINYINT
+
+from ..db.compression import FORMAT_PLAIN, decode_note_text
+from ..db.database import Base
+
+
+class NoteContent(Base):
+    """
+    Represents a note body shared by every note with the same text. Bodies are keyed
+    by the SHA-256 digest of their text and count the notes that point at them.
+    """
+
+    __tablename__ = "note_contents"
+    __table_args__ = (
+        Index("ft_search_terms", "search_terms", mysql_prefix="FULLTEXT"),
+    )
+
+    content_hash = Column(String(64), primary_key=True)
+    # Stored form of the text, see NoteCodec
+    storage_format = Column(
+        SmallInteger().with_variant(TINYINT, "mysql"),
+        nullable=False,
+        default=FORMAT_PLAIN,
+        server_default="0",
+    )
+    plain_text = Column("note_text", Text, nullable=True)
+    note_body = Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=True)
+    text_length = Column(INTEGER(display_width=11), nullable=False)
+    # Distinct search terms of the text, see note_search_terms
+    search_terms = Column(Text().with_variant(MEDIUMTEXT, "mysql"), nullable=True)
+    ref_count = Column(INTEGER(display_width=11), nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    @property
+    def note_text(self) -> str:
+        """
+        The text, decompressed on access.
+        """
+        return decode_note_text(self.storage_format, self.plain_text, self.note_body)
+
+    def __repr__(self):
+        return (
+            f"<NoteContent(content_hash='{self.content_hash}', "
+            f"storage_format={self.storage_format}, text_length={self.text_length}, "
+            f"ref_count={self.ref_count})>"
+        )
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.dialects.mysql import INTEGER
+
+from ..db.database import Base
+from ..models.user import User
+
+
+class RefreshToken(Base):
+    """
+    Represents an issued refresh token. Only a SHA-256 digest of the token is stored.
+    Tokens issued by rotating one another share a family_id.
+    """
+
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (Index("idx_family_id", "family_id"),)
+
+    token_id = Column(INTEGER(display_width=11), primary_key=True, autoincrement=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False)
+    user_id = Column(
+        INTEGER(display_width=11),
+        ForeignKey(User.user_id, ondelete="CASCADE", onupdate="CASCADE"),
+        nullable=False,
+    )
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    # Relationship to the User model
+    user: Mapped[User] = relationship(lazy="joined", innerjoin=True)
+
+    def __repr__(self):
+        return (
+            f"<RefreshToken(token_id={self.token_id}, family_id='{self.family_id}', "
+            f"user_id={self.user_id}, expires_at={self.expires_at}, "
+            f"used_at={self.used_at}, revoked_at={self.revoked_at})>"
+        )
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from ..config import settings
+from ..exceptions.hash_pool_saturated_exception import HashPoolSaturatedException
+from ..metrics import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+POOL_WORKERS = Gauge(
+    "password_hash_pool_workers", "Worker threads available for password hashing"
+)
+POOL_CAPACITY = Gauge(
+    "password_hash_pool_capacity", "Hashing jobs admitted at once (running or queued)"
+)
+POOL_IN_FLIGHT = Gauge(
+    "password_hash_pool_in_flight", "Hashing jobs currently running or queued"
+)
+POOL_ACTIVE = Gauge("password_hash_pool_active", "Hashing jobs currently running")
+POOL_REJECTED = Counter(
+    "password_hash_pool_rejected_total",
+    "Hashing jobs rejected because the pool was full",
+)
+POOL_QUEUE_WAIT = Histogram(
+    "password_hash_pool_queue_wait_seconds",
+    "Time hashing jobs spent waiting for a worker",
+)
+POOL_RUN_TIME = Histogram(
+    "password_hash_pool_run_seconds", "Time spent computing password hashes"
+)
+
+
+class HashPool:
+    """
+    A fixed-size worker pool for CPU-heavy password hashing.
+
+    At most `max_workers + max_queue` jobs are admitted at once. Anything beyond
+    that is rejected immediately with HashPoolSaturatedException instead of
+    queueing behind other logins, so request threads are never tied up waiting
+    on an unbounded backlog. hashlib releases the GIL while it hashes, so
+    threads are enough to use every core.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        POOL_WORKERS.set(max_workers)
+        POOL_CAPACITY.set(max_workers + max_queue)
+
+    def run(self, fn: Callable[..., T], *args) -> T:
+        """
+        Runs fn(*args) on the pool and waits for its result.
+        @param fn: The hashing function to call.
+        @param args: The arguments to call it with.
+        @return: The value returned by fn.
+        @raises HashPoolSaturatedException: If the pool and its queue are full.
+        """
+        if not self._slots.acquire(blocking=False):
+            POOL_REJECTED.inc()
+            raise HashPoolSaturatedException("Password hashing pool is saturated")
+
+        POOL_IN_FLIGHT.inc()
+        try:
+            future = self._executor.submit(self._call, time.perf_counter(), fn, args)
+        except BaseException:
+            POOL_IN_FLIGHT.dec()
+            self._slots.release()
+            raise
+        return future.result()
+
+    def _call(self, submitted_at: float, fn: Callable[..., T], args) -> T:
+        started_at = time.perf_counter()
+        POOL_QUEUE_WAIT.observe(started_at - submitted_at)
+        POOL_ACTIVE.inc()
+        try:
+            return fn(*args)
+        finally:
+            POOL_RUN_TIME.observe(time.perf_counter() - started_at)
+            POOL_ACTIVE.dec()
+            POOL_IN_FLIGHT.dec()
+            self._slots.release()
+
+
+hash_pool = HashPool(settings.HASH_POOL_WORKERS, settings.HASH_POOL_QUEUE_DEPTH)
@@ -0,0 +1,106 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import time
+
+from ..config import settings
+from .hash_pool import hash_pool
+
+ALGORITHM = "pbkdf2-sha256"
+SALT_BYTES = 16
+# Cost of the original unversioned format, and the floor for calibration
+LEGACY_ITERATIONS = 100000
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hash_pool.run(
+        hashlib.pbkdf2_hmac, "sha256", password.encode(), salt, iterations
+    )
+
+
+def _parse(encoded: str) -> tuple[int, bytes, bytes]:
+    """
+    Splits a stored password hash into its cost, salt and digest.
+    @param encoded: The stored hash, either "$pbkdf2-sha256$i=<iterations>$<salt>$<hash>"
+        or the legacy bare base64 of hash followed by salt.
+    @return: A tuple of (iterations, salt, digest).
+    @raises ValueError: If the stored hash cannot be parsed.
+    """
+    if not encoded.startswith("$"):
+        combined = base64.b64decode(encoded)
+        return LEGACY_ITERATIONS, combined[32:], combined[:32]
+
+    try:
+        _, algorithm, cost, salt, digest = encoded.split("$")
+        if algorithm != ALGORITHM or not cost.startswith("i="):
+            raise ValueError(f"Unsupported password hash format: {algorithm}")
+        return int(cost[2:]), _b64decode(salt), _b64decode(digest)
+    except binascii.Error as e:
+        raise ValueError("Malformed password hash") from e
+
+
+def hash_password(password: str, iterations: int | None = None) -> str:
+    """
+    Hashes a password into the self-describing storage format.
+    @param password: The password to hash.
+    @param iterations: The PBKDF2 iteration count, defaults to PASSWORD_HASH_ITERATIONS.
+    @return: The encoded hash, e.g. "$pbkdf2-sha256$i=100000$<salt>$<hash>".
+    @raises HashPoolSaturatedException: If the password hashing pool is full.
+    """
+    iterations = iterations or settings.PASSWORD_HASH_ITERATIONS
+    salt = os.urandom(SALT_BYTES)
+    digest = _pbkdf2(password, salt, iterations)
+    return f"${ALGORITHM}$i={iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    """
+    Checks a password against a stored hash in either the current or legacy format.
+    @param password: The password to check.
+    @param encoded: The stored hash.
+    @return: True if the password matches.
+    @raises HashPoolSaturatedException: If the password hashing pool is full.
+    """
+    iterations, salt, digest = _parse(encoded)
+    return hmac.compare_digest(_pbkdf2(password, salt, iterations), digest)
+
+
+def needs_rehash(encoded: str) -> bool:
+    """
+    Checks whether a stored hash uses an old format or different cost parameters.
+    @param encoded: The stored hash.
+    @return: True if the hash should be replaced after the next successful login.
+    """
+    if not encoded.startswith(f"${ALGORITHM}$"):
+        return True
+    iterations, salt, _ = _parse(encoded)
+    return iterations != settings.PASSWORD_HASH_ITERATIONS or len(salt) != SALT_BYTES
+
+
+def calibrate_iterations(target_ms: float, samples: int = 5) -> int:
+    """
+    Picks the PBKDF2 iteration count that takes about target_ms on this CPU.
+    @param target_ms: The desired time per password hash in milliseconds.
+    @param samples: How many timing runs to take the fastest of.
+    @return: The iteration count, rounded to a thousand and never below LEGACY_ITERATIONS.
+    """
+    probe_iterations = 20000
+    salt = os.urandom(SALT_BYTES)
+    fastest = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        hashlib.pbkdf2_hmac("sha256", b"calibration", salt, probe_iterations)
+        fastest = min(fastest, time.perf_counter() - start)
+
+    iterations = probe_iterations * (target_ms / 1000) / fastest
+    return max(LEGACY_ITERATIONS, int(round(iterations, -3)))
@@ -0,0 +1,47 @@
+import pytest
+
+from src.api.cursor import decode_cursor, encode_cursor
+from src.exceptions.invalid_cursor_exception import InvalidCursorException
+
+
+def test_cursor_round_trip():
+    """
+    GIVEN sort key values
+    WHEN they are encoded and decoded again
+    THEN the original values are returned
+    """
+    token = encode_cursor(42)
+
+    assert decode_cursor(token) == [42]
+
+
+def test_cursor_is_url_safe():
+    """
+    GIVEN a sort key value
+    WHEN it is encoded
+    THEN the token has no characters that need escaping in a query string
+    """
+    token = encode_cursor(123456789)
+
+    assert all(c.isalnum() or c in "-_" for c in token)
+
+
+def test_decode_cursor_invalid():
+    """
+    GIVEN malformed cursor tokens
+    WHEN decode_cursor is called
+    THEN an InvalidCursorException is raised
+    """
+    invalid_tokens = [
+        "not a cursor",
+        "!!!",
+        encode_cursor(),
+        encode_cursor(1, 2),
+        encode_cursor(-1),
+        "eyJhIjoxfQ",  # {"a":1}
+        "WyJhIl0",  # ["a"]
+    ]
+
+    for token in invalid_tokens:
+        with pytest.raises(InvalidCursorException):
+            decode_cursor(token)
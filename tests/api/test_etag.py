@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from src.api.etag import (
+    coded_etag,
+    listing_etag,
+    note_etag,
+    parse_note_etag,
+    uncoded_etag,
+)
+
+
+def test_note_etag_round_trip():
+    """
+    GIVEN a note ID and version
+    WHEN note_etag is called and its value is parsed back
+    THEN the same version is recovered
+    """
+    etag = note_etag(4, 3)
+
+    assert etag == '"4-3"'
+    assert parse_note_etag(etag.strip('"'), 4) == 3
+
+
+def test_coded_etag_round_trip():
+    """
+    GIVEN a note's ETag
+    WHEN it is given a content coding and parsed back
+    THEN the coding is a suffix, and the same version is recovered
+    """
+    etag = coded_etag(note_etag(4, 3), "gzip")
+
+    assert etag == '"4-3-gzip"'
+    assert uncoded_etag(etag.strip('"')) == "4-3"
+    assert parse_note_etag(etag.strip('"'), 4) == 3
+    assert uncoded_etag("4-3") == "4-3"
+    assert uncoded_etag("4-3-deflate") == "4-3-deflate"
+    assert uncoded_etag("-gzip") == "-gzip"
+
+
+def test_parse_note_etag_rejects_other_note():
+    """
+    GIVEN an ETag built for another note
+    WHEN parse_note_etag is called
+    THEN None is returned
+    """
+    assert parse_note_etag("5-3", 4) is None
+
+
+def test_parse_note_etag_rejects_garbage():
+    """
+    GIVEN a malformed ETag, or one in the format built from update times
+    WHEN parse_note_etag is called
+    THEN None is returned
+    """
+    assert parse_note_etag("4-yesterday", 4) is None
+    assert parse_note_etag("4-20240925T235910", 4) is None
+    assert parse_note_etag("4-\u00b2", 4) is None
+    assert parse_note_etag("garbage", 4) is None
+
+
+def test_listing_etag():
+    """
+    GIVEN the versions of the notes on a page
+    WHEN listing_etag is called for the same, an updated, and a longer page
+    THEN the same page gets the same ETag and the others get different ones
+    """
+    updated_at = datetime(2024, 9, 25, 23, 59, 10)
+    versions = [(1, updated_at), (2, updated_at)]
+
+    etag = listing_etag(versions, "WzJd")
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert listing_etag(list(versions), "WzJd") == etag
+    assert listing_etag([(1, updated_at), (2, datetime(2024, 9, 26))], "WzJd") != etag
+    assert listing_etag(versions) != etag
+    assert listing_etag(versions + [(3, updated_at)], "WzJd") != etag
@@ -0,0 +1,210 @@
+import dataclasses
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.api import json_provider
+from src.api.json_provider import (
+    NoteJSONProvider,
+    available_backends,
+    encode_note,
+    note_to_dict,
+)
+from src.db.compression import FORMAT_PLAIN
+from src.models.note import Note, NoteRecord
+from src.models.note_content import NoteContent
+from src.models.user import User
+
+BACKENDS = [
+    pytest.param(
+        backend,
+        marks=pytest.mark.skipif(
+            backend not in available_backends(), reason=f"{backend} not installed"
+        ),
+    )
+    for backend in ("orjson", "msgspec", "stdlib")
+]
+
+
+@dataclasses.dataclass
+class Point:
+    y: int
+    x: int
+
+
+def make_note(note_id: int = 1, title: str = "Title", text: str = "Text") -> Note:
+    return Note(
+        note_id=note_id,
+        note_title=title,
+        note_text=text,
+        is_public=note_id % 2 == 0,
+        author_id=1,
+        author_user=User(user_id=1, username="author"),
+        created_at=datetime(2024, 9, 25, 23, 46, 27),
+        updated_at=datetime(2024, 9, 25, 23, 59, 10, 123456),
+    )
+
+
+NOTES = [
+    make_note(1, text="Long " * 500),
+    make_note(2, 'Quote " and \\ slash', "Tabs\tnew\nlines\x01 and \x7f"),
+    make_note(3, "Café ☕", "Emoji 🙂 and  "),
+]
+
+RECORDS = [
+    NoteRecord(
+        note.note_id,
+        note.note_title,
+        note.note_text,
+        note.is_public,
+        note.author_id,
+        note.author_user.username,
+        note.created_at,
+        note.updated_at,
+        note.version,
+    )
+    for note in NOTES
+]
+
+
+def test_note_to_dict():
+    """
+    GIVEN inline notes and a note with a shared body
+    WHEN note_to_dict is called
+    THEN it returns the same dict as to_dict
+    """
+    shared = make_note(4)
+    shared.content_hash = "abc"
+    shared.content = NoteContent(
+        content_hash="abc", storage_format=FORMAT_PLAIN, plain_text="x" * 2000
+    )
+
+    for note in NOTES + RECORDS + [shared]:
+        assert note_to_dict(note) == note.to_dict()
+    assert note_to_dict(shared)["text"] == "x" * 2000
+
+
+def make_providers(backend: str, debug: bool = False, ensure_ascii: bool = True):
+    app = Flask(__name__)
+    app.debug = debug
+    provider = NoteJSONProvider(app, backend)
+    default = DefaultJSONProvider(app)
+    provider.ensure_ascii = default.ensure_ascii = ensure_ascii
+    return app, provider, default
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_encode_note_matches_json_dumps(ensure_ascii):
+    """
+    GIVEN notes and records with quotes, control characters, and non-ASCII text
+    WHEN they are encoded with the precompiled serializer
+    THEN the output equals json.dumps of their to_dict value
+    """
+    encode_string = (
+        json.encoder.encode_basestring_ascii
+        if ensure_ascii
+        else json.encoder.encode_basestring
+    )
+    for note in NOTES + RECORDS:
+        assert encode_note(note, encode_string) == json.dumps(
+            note.to_dict(),
+            sort_keys=True,
+            ensure_ascii=ensure_ascii,
+            separators=(",", ":"),
+        )
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("debug", [False, True])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("source", [NOTES, RECORDS], ids=["notes", "records"])
+def test_note_responses_match_default_provider(backend, debug, ensure_ascii, source):
+    """
+    GIVEN a JSON provider and Flask's default one
+    WHEN notes or records, a page of them, and a single one are returned
+    THEN both produce the same bytes, compact or indented
+    """
+    app, provider, default = make_providers(backend, debug, ensure_ascii)
+    notes = [note.to_dict() for note in source]
+
+    with app.app_context():
+        pairs = [
+            (provider.notes_response(source), default.response(notes)),
+            (
+                provider.notes_page_response(source, "WzNd"),
+                default.response(notes=notes, next_cursor="WzNd"),
+            ),
+            (
+                provider.notes_page_response(source, None),
+                default.response(notes=notes, next_cursor=None),
+            ),
+            (provider.note_response(source[1], 201), default.response(notes[1])),
+        ]
+    for response, expected in pairs:
+        assert response.get_data() == expected.get_data()
+        assert response.mimetype == expected.mimetype
+    assert pairs[-1][0].status_code == 201
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"b": 1, "a": [True, False, None], "c": {"z": "x", "y": -3}},
+        {"error": "Bad request: <p>Invalid cursor</p>"},
+        {"text": "Control \x00\x1f and DEL \x7f"},
+        {"text": "Non-ASCII é ☕ 🙂"},
+        {"when": datetime(2024, 9, 25, 23, 46, 27)},
+        {"amount": Decimal("10.50"), "id": uuid.UUID(int=7)},
+        {"point": Point(2, 1)},
+        {"big": 2**70},
+        [1, "two", 0.5, 100.0],
+    ],
+    ids=[
+        "nested",
+        "error",
+        "control",
+        "non-ascii",
+        "datetime",
+        "decimal-uuid",
+        "dataclass",
+        "big-int",
+        "list",
+    ],
+)
+def test_response_matches_default_provider(backend, payload):
+    """
+    GIVEN a JSON provider and Flask's default one in compact mode
+    WHEN a payload is returned
+    THEN both produce the same bytes
+    """
+    if backend == "msgspec" and "when" in payload:
+        pytest.skip("msgspec writes datetimes in RFC 3339")
+    app, provider, default = make_providers(backend)
+
+    with app.app_context():
+        assert provider.response(payload).get_data() == (
+            default.response(payload).get_data()
+        )
+
+
+def test_unknown_or_missing_backend(monkeypatch):
+    """
+    GIVEN an unknown backend, or one that is not installed
+    WHEN the provider is built
+    THEN ValueError is raised, and auto falls back to the standard library
+    """
+    monkeypatch.setattr(json_provider, "orjson", None)
+    monkeypatch.setattr(json_provider, "msgspec", None)
+    app = Flask(__name__)
+
+    with pytest.raises(ValueError):
+        NoteJSONProvider(app, "ujson")
+    with pytest.raises(ValueError):
+        NoteJSONProvider(app, "orjson")
+    assert NoteJSONProvider(app, "auto").backend == "stdlib"
@@ -0,0 +1,153 @@
+from importlib.metadata import version
+from unittest.mock import patch
+
+from flask import g
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token, decode_token, verify_jwt_in_request
+
+from src.api.jwt_cache import JWTCache, cached_jwt_required
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_cached_token():
+    """
+    GIVEN a verified token in the cache
+    WHEN get is called with the same raw token
+    THEN its header and claims are returned
+    """
+    cache = JWTCache(max_entries=4, ttl_seconds=60)
+    cache.put("token", {"alg": "HS256"}, {"sub": 1})
+
+    assert cache.get("token") == ({"alg": "HS256"}, {"sub": 1})
+    assert cache.get("other") is None
+
+
+def test_entries_expire_after_ttl():
+    """
+    GIVEN a cached token
+    WHEN the TTL passes
+    THEN the entry is no longer returned
+    """
+    clock = FakeClock()
+    cache = JWTCache(max_entries=4, ttl_seconds=60, clock=clock)
+    cache.put("token", {}, {"sub": 1})
+
+    clock.now += 59
+    assert cache.get("token") is not None
+    clock.now += 1
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_entries_never_outlive_token_exp():
+    """
+    GIVEN a token that expires before the cache TTL
+    WHEN its exp claim passes
+    THEN the entry is no longer returned
+    """
+    clock = FakeClock()
+    cache = JWTCache(max_entries=4, ttl_seconds=60, clock=clock)
+    cache.put("token", {}, {"sub": 1, "exp": clock.now + 5})
+
+    clock.now += 5
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_entry_evicted():
+    """
+    GIVEN a full cache
+    WHEN another token is added
+    THEN the least recently used token is evicted
+    """
+    cache = JWTCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {}, {"sub": "a"})
+    cache.put("b", {}, {"sub": "b"})
+    cache.get("a")
+    cache.put("c", {}, {"sub": "c"})
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_invalidate():
+    """
+    GIVEN a cached token
+    WHEN it is invalidated
+    THEN it is no longer returned
+    """
+    cache = JWTCache(max_entries=2, ttl_seconds=60)
+    cache.put("token", {}, {"sub": 1})
+    cache.invalidate("token")
+
+    assert cache.get("token") is None
+
+
+def test_cached_jwt_required_verifies_once(client: FlaskClient):
+    """
+    GIVEN a protected route
+    WHEN it is called twice with the same token
+    THEN the token is only fully verified on the first call
+    """
+    access_token = create_access_token(identity=1)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    with patch(
+        "src.api.jwt_cache.verify_jwt_in_request", wraps=verify_jwt_in_request
+    ) as mock_verify:
+        first = client.get("/v1/protected", headers=headers)
+        second = client.get("/v1/protected", headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json["logged_in_as"] == 1
+    mock_verify.assert_called_once()
+
+
+def test_cached_jwt_required_checks_revocation(client: FlaskClient, app):
+    """
+    GIVEN a cached token
+    WHEN the token is revoked through the blocklist callback
+    THEN the next request with it is rejected
+    """
+    revoked = set()
+    app.extensions["flask-jwt-extended"].token_in_blocklist_loader(
+        lambda jwt_header, jwt_data: jwt_data["jti"] in revoked
+    )
+    access_token = create_access_token(identity=1)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    assert client.get("/v1/protected", headers=headers).status_code == 200
+    assert app.jwt_cache.get(access_token) is not None
+    revoked.add(decode_token(access_token)["jti"])
+
+    assert client.get("/v1/protected", headers=headers).status_code == 401
+
+
+def test_cached_jwt_required_matches_library_context(app):
+    """
+    GIVEN the pinned flask-jwt-extended
+    WHEN a cached token is loaded into a request
+    THEN the request context is the one verify_jwt_in_request sets up
+    """
+    assert version("flask-jwt-extended") == "4.7.1", "re-check _load_verified_jwt"
+
+    def jwt_context():
+        return {name: value for name, value in vars(g).items() if "jwt" in name}
+
+    access_token = create_access_token(identity=1)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with app.test_request_context(headers=headers):
+        app.jwt_cache.put(access_token, *verify_jwt_in_request())
+        expected = jwt_context()
+    with app.test_request_context(headers=headers):
+        cached = cached_jwt_required()(jwt_context)()
+
+    assert cached == expected
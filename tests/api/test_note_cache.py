@@ -0,0 +1,291 @@
+from datetime import datetime
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from src.api import note_cache
+from src.api.note_cache import (
+    ListingCache,
+    LocalGenerations,
+    LocalSharedStore,
+    LRUNoteCache,
+    SharedGenerations,
+    SharedNoteCache,
+    build_listing_cache,
+    build_note_cache,
+    dump_listing,
+    dump_note,
+    load_listing,
+    load_note,
+)
+from src.config import Settings
+from src.models.note import Note, NoteRecord
+from src.models.user import User
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_note(note_id: int = 1, text: str = "Body") -> Note:
+    return Note(
+        note_id=note_id,
+        note_title="Title",
+        note_text=text,
+        is_public=True,
+        author_id=7,
+        author_user=User(user_id=7, username="author"),
+        created_at=datetime(2024, 9, 25, 23, 46, 27),
+        updated_at=datetime(2024, 9, 25, 23, 59, 10),
+    )
+
+
+def test_dump_and_load_note():
+    """
+    GIVEN a note whose text is stored compressed
+    WHEN it is serialized and rebuilt
+    THEN it is rebuilt as a record with the same attributes and dict form
+    """
+    note = make_note(text="ERROR disk full\n" * 200)
+
+    loaded = load_note(dump_note(note))
+
+    assert isinstance(loaded, NoteRecord)
+    assert loaded.to_dict() == note.to_dict()
+    assert loaded == note
+    assert loaded.author_id == 7
+
+
+def test_dump_and_load_listing():
+    """
+    GIVEN a page of notes and a next cursor
+    WHEN the page is serialized and rebuilt
+    THEN the notes and cursor are the same
+    """
+    notes = [make_note(1), make_note(2, "Second")]
+
+    loaded, next_cursor = load_listing(dump_listing(notes, "WzJd"))
+
+    assert [note.to_dict() for note in loaded] == [note.to_dict() for note in notes]
+    assert next_cursor == "WzJd"
+
+
+def test_lru_cache_get_and_ttl():
+    """
+    GIVEN a cached note
+    WHEN it is read before and after its TTL
+    THEN it is returned, then dropped
+    """
+    clock = FakeClock()
+    cache = LRUNoteCache(10, 1024, 30, clock=clock)
+
+    cache.put(1, b"one")
+    assert cache.get(1) == b"one"
+
+    clock.now += 30
+    assert cache.get(1) is None
+    assert len(cache) == 0
+    assert cache.size_bytes == 0
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    GIVEN a cache bounded by entries and bytes
+    WHEN more notes are cached than fit
+    THEN the least recently used notes are evicted and counted
+    """
+    cache = LRUNoteCache(2, 10, 30)
+    evictions = note_cache.NOTE_CACHE_EVICTIONS.value
+
+    cache.put(1, b"aaa")
+    cache.put(2, b"bbb")
+    cache.get(1)
+    cache.put(3, b"ccc")
+    assert cache.get(2) is None
+    assert cache.get(1) == b"aaa"
+
+    cache.put(4, b"dddd")
+    assert cache.get(3) is None
+    assert cache.get(1) == b"aaa"
+
+    cache.put(5, b"eeeeee")
+    assert cache.get(4) is None
+    assert cache.size_bytes == 9
+
+    cache.put(6, b"ffffffff")
+    assert cache.get(1) is None
+    assert cache.get(5) is None
+    assert cache.get(6) == b"ffffffff"
+    assert cache.size_bytes == 8
+    assert note_cache.NOTE_CACHE_EVICTIONS.value == evictions + 5
+
+
+def test_lru_cache_add_and_oversized_entries():
+    """
+    GIVEN a cached note
+    WHEN a stale read adds it again, or a note larger than the cache is stored
+    THEN the cached note is kept, and the oversized note is not cached
+    """
+    cache = LRUNoteCache(10, 8, 30)
+
+    cache.put(1, b"new")
+    cache.add(1, b"old")
+    assert cache.get(1) == b"new"
+
+    cache.put(1, b"much too large")
+    assert cache.get(1) is None
+    cache.add(2, b"much too large")
+    assert len(cache) == 0
+
+    cache.add(2, b"fits")
+    cache.invalidate(2)
+    assert cache.get(2) is None
+
+
+def test_shared_note_cache_with_local_store():
+    """
+    GIVEN a shared note cache backed by the local stand-in
+    WHEN notes are stored, added, read, and invalidated
+    THEN it behaves like the Redis-backed cache, including expiry
+    """
+    clock = FakeClock()
+    cache = SharedNoteCache(LocalSharedStore(clock=clock), 30)
+
+    cache.add(1, b"old")
+    cache.add(1, b"older")
+    assert cache.get(1) == b"old"
+    cache.put(1, b"new")
+    assert cache.get(1) == b"new"
+
+    clock.now += 30
+    assert cache.get(1) is None
+
+    cache.put(2, b"two")
+    cache.invalidate(2)
+    assert cache.get(2) is None
+
+
+def test_shared_note_cache_keys():
+    """
+    GIVEN a shared note cache with a Redis client
+    WHEN notes are cached and invalidated
+    THEN prefixed keys are written with the TTL
+    """
+    client = MagicMock()
+    cache = SharedNoteCache(client, 60)
+
+    cache.put(4, b"four")
+    cache.add(5, b"five")
+    cache.invalidate(4)
+
+    client.set.assert_any_call("note:v2:4", b"four", ex=60)
+    client.set.assert_any_call("note:v2:5", b"five", ex=60, nx=True)
+    client.delete.assert_called_once_with("note:v2:4")
+
+
+def make_settings(backend: str, redis_url: str | None = None):
+    settings = Mock(spec=Settings)
+    settings.NOTE_CACHE_BACKEND = backend
+    settings.NOTE_CACHE_MAX_ENTRIES = 100
+    settings.NOTE_LISTING_CACHE_MAX_ENTRIES = 20
+    settings.NOTE_CACHE_MAX_BYTES = 4096
+    settings.NOTE_CACHE_TTL_SEC = 10
+    settings.NOTE_CACHE_REDIS_URL = redis_url
+    return settings
+
+
+def test_build_note_cache():
+    """
+    GIVEN each note cache backend setting
+    WHEN the note cache is built
+    THEN the matching cache is returned
+    """
+    assert build_note_cache(make_settings("none")) is None
+
+    local = build_note_cache(make_settings("local"))
+    assert isinstance(local, LRUNoteCache)
+    assert (local.max_entries, local.max_bytes, local.ttl_seconds) == (100, 4096, 10)
+
+    shared = build_note_cache(make_settings("shared"))
+    assert isinstance(shared, SharedNoteCache)
+    assert isinstance(shared.client, LocalSharedStore)
+
+    with pytest.raises(ValueError):
+        build_note_cache(make_settings("memcached"))
+
+
+@pytest.mark.parametrize(
+    "generations",
+    [LocalGenerations(), SharedGenerations(LocalSharedStore())],
+    ids=["local", "shared"],
+)
+def test_generations(generations):
+    """
+    GIVEN generation counters
+    WHEN counters are bumped
+    THEN only the bumped counters change, starting from 0
+    """
+    assert generations.get(["public", "author:1"]) == [0, 0]
+
+    generations.bump("author:1")
+    generations.bump("author:1")
+
+    assert generations.get(["public", "author:1", "author:2"]) == [0, 2, 0]
+
+
+def test_listing_cache_keys_follow_generations():
+    """
+    GIVEN cached listing pages of two authors
+    WHEN one author writes a private note, then a public note
+    THEN only that author's pages stop matching, then every page does
+    """
+    listing_cache = ListingCache(LRUNoteCache(10, 1024, 30), LocalGenerations())
+    first = listing_cache.key(1, "page", 1, 10)
+    second = listing_cache.key(2, "page", 1, 10)
+    listing_cache.put(first, b"first")
+    listing_cache.put(second, b"second")
+
+    listing_cache.bump(1, public=False)
+    assert listing_cache.key(1, "page", 1, 10) != first
+    assert listing_cache.get(listing_cache.key(2, "page", 1, 10)) == b"second"
+
+    listing_cache.bump(1, public=True)
+    assert listing_cache.key(2, "page", 1, 10) != second
+    assert listing_cache.get(listing_cache.key(2, "page", 1, 10)) is None
+
+
+def test_build_listing_cache():
+    """
+    GIVEN each note cache backend setting
+    WHEN the listing cache is built
+    THEN a matching listing cache is returned
+    """
+    assert build_listing_cache(make_settings("none")) is None
+
+    local = build_listing_cache(make_settings("local"))
+    assert isinstance(local.cache, LRUNoteCache)
+    assert local.cache.max_entries == 20
+    assert isinstance(local.generations, LocalGenerations)
+
+    shared = build_listing_cache(make_settings("shared"))
+    assert isinstance(shared.cache, SharedNoteCache)
+    assert shared.generations.client is shared.cache.client
+
+    with pytest.raises(ValueError):
+        build_listing_cache(make_settings("memcached"))
+
+
+def test_build_shared_note_cache_requires_redis(monkeypatch):
+    """
+    GIVEN a Redis URL for the shared note cache and no redis package
+    WHEN the note cache is built
+    THEN ValueError is raised
+    """
+    monkeypatch.setattr(note_cache, "redis", None)
+
+    with pytest.raises(ValueError):
+        build_note_cache(make_settings("shared", "redis://localhost:6379/0"))
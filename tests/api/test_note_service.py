@@ -1,8 +1,19 @@
+import threading
+
 import pytest
 from unittest.mock import patch, MagicMock
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.api.cursor import decode_cursor, encode_cursor
+from src.api.note_cache import ListingCache, LocalGenerations, LRUNoteCache
 from src.api.note_service import NoteService
 from src.db import notes
+from src.db.database import Base, init_app
 from src.models.note import Note
+from src.models.user import User
 
 
 @pytest.fixture
@@ -15,6 +26,29 @@ def note_service(mock_notes_db):
     return NoteService(mock_notes_db)
 
 
+@pytest.fixture
+def cached_note_service(mock_notes_db):
+    return NoteService(
+        mock_notes_db,
+        LRUNoteCache(16, 1 << 20, 60),
+        ListingCache(LRUNoteCache(16, 1 << 20, 60), LocalGenerations()),
+    )
+
+
+def make_note(note_id: int, title: str = "Title", is_public: bool = True) -> Note:
+    return Note(
+        note_id=note_id,
+        note_title=title,
+        note_text="Text",
+        is_public=is_public,
+        author_id=1,
+        author_user=User(user_id=1, username="author"),
+        created_at=datetime(2024, 9, 25, 23, 46, 27),
+        updated_at=datetime(2024, 9, 25, 23, 59, 10),
+        version=1,
+    )
+
+
 def test_get_notes(note_service, mock_notes_db):
     """
     GIVEN an author ID, page, and page size
@@ -33,6 +67,153 @@ def test_get_notes(note_service, mock_notes_db):
     mock_notes_db.get_notes_for_user.assert_called_once_with(author_id, page, page_size)
 
 
+def test_get_notes_page_first_page(note_service, mock_notes_db):
+    """
+    GIVEN an author ID and no cursor
+    WHEN get_notes_page is called and more notes exist than fit on a page
+    THEN a full page and a cursor pointing at its last note are returned
+    """
+    mock_notes = [MagicMock(spec=Note, note_id=i) for i in range(1, 5)]
+    mock_notes_db.get_notes_for_user_after.return_value = mock_notes
+
+    notes, next_cursor = note_service.get_notes_page(1, None, 3)
+
+    assert notes == mock_notes[:3]
+    assert decode_cursor(next_cursor) == [3]
+    mock_notes_db.get_notes_for_user_after.assert_called_once_with(1, 0, 4)
+
+
+def test_get_notes_page_last_page(note_service, mock_notes_db):
+    """
+    GIVEN an author ID and a cursor
+    WHEN get_notes_page is called and no notes follow the page
+    THEN the notes and no cursor are returned
+    """
+    mock_notes = [MagicMock(spec=Note, note_id=i) for i in range(4, 6)]
+    mock_notes_db.get_notes_for_user_after.return_value = mock_notes
+
+    notes, next_cursor = note_service.get_notes_page(1, encode_cursor(3), 3)
+
+    assert notes == mock_notes
+    assert next_cursor is None
+    mock_notes_db.get_notes_for_user_after.assert_called_once_with(1, 3, 4)
+
+
+def test_get_note_summaries(note_service, mock_notes_db):
+    """
+    GIVEN an author ID, page, page size, and excerpt length
+    WHEN get_note_summaries is called
+    THEN the summaries are returned
+    """
+    mock_notes_db.get_note_summaries_for_user.return_value = [MagicMock()]
+
+    summaries = note_service.get_note_summaries(1, 2, 10, 200)
+
+    assert summaries == mock_notes_db.get_note_summaries_for_user.return_value
+    mock_notes_db.get_note_summaries_for_user.assert_called_once_with(1, 2, 10, 200)
+
+
+def test_get_note_summaries_page(note_service, mock_notes_db):
+    """
+    GIVEN an author ID and a cursor
+    WHEN get_note_summaries_page is called and more notes exist than fit on a page
+    THEN a full page of summaries and a cursor pointing at its last note are returned
+    """
+    rows = [MagicMock(note_id=i) for i in range(4, 8)]
+    mock_notes_db.get_note_summaries_for_user_after.return_value = rows
+
+    summaries, next_cursor = note_service.get_note_summaries_page(
+        1, encode_cursor(3), 3, 0
+    )
+
+    assert summaries == rows[:3]
+    assert decode_cursor(next_cursor) == [6]
+    mock_notes_db.get_note_summaries_for_user_after.assert_called_once_with(1, 3, 4, 0)
+
+
+def test_search_notes(note_service, mock_notes_db):
+    """
+    GIVEN a query and a cursor holding a rank and note ID
+    WHEN search_notes is called and more results exist than fit on a page
+    THEN a full page of notes and a cursor pointing at its last result are returned
+    """
+    results = [(900 - i, MagicMock(note_id=i)) for i in range(4)]
+    mock_notes_db.search_notes_for_user.return_value = results
+
+    notes, next_cursor = note_service.search_notes(
+        1, "timeout", encode_cursor(950, 9), 3
+    )
+
+    assert notes == [note for _, note in results[:3]]
+    assert decode_cursor(next_cursor, 2) == [898, 2]
+    mock_notes_db.search_notes_for_user.assert_called_once_with(
+        1, "timeout", (950, 9), 4
+    )
+
+
+def test_search_notes_last_page(note_service, mock_notes_db):
+    """
+    GIVEN a query without a cursor
+    WHEN search_notes is called and all results fit on a page
+    THEN no next cursor is returned
+    """
+    mock_notes_db.search_notes_for_user.return_value = [(10, MagicMock(note_id=1))]
+
+    notes, next_cursor = note_service.search_notes(1, "timeout", None, 3)
+
+    assert len(notes) == 1
+    assert next_cursor is None
+    mock_notes_db.search_notes_for_user.assert_called_once_with(1, "timeout", None, 4)
+
+
+def test_get_note_fields(note_service, mock_notes_db):
+    """
+    GIVEN an author ID, a fieldset, and pagination
+    WHEN the fieldset methods are called
+    THEN the fieldset is passed to the database and its rows are returned
+    """
+    rows = [MagicMock(note_id=i) for i in range(1, 4)]
+    mock_notes_db.get_note_fields_for_user.return_value = rows
+    mock_notes_db.get_note_fields_for_user_after.return_value = rows
+    mock_notes_db.get_note_fields_by_id.return_value = rows[0]
+
+    assert note_service.get_note_fields(1, ["title"], 2, 5) == rows
+    assert note_service.get_note_fields_page(1, ["title"], None, 2) == (
+        rows[:2],
+        encode_cursor(2),
+    )
+    assert note_service.get_note_fields_by_id(1, 7, ["title"]) == rows[0]
+    mock_notes_db.get_note_fields_for_user.assert_called_once_with(1, ["title"], 2, 5)
+    mock_notes_db.get_note_fields_for_user_after.assert_called_once_with(
+        1, ["title"], 0, 3
+    )
+    mock_notes_db.get_note_fields_by_id.assert_called_once_with(1, 7, ["title"])
+
+
+def test_export_notes(note_service, mock_notes_db):
+    """
+    GIVEN batches of note rows streamed from the database
+    WHEN notes are exported after a note ID
+    THEN each batch is converted to to_dict values
+    """
+    rows = [
+        MagicMock(_mapping={"note_id": i, "updated_at": datetime(2024, 9, 25)})
+        for i in range(4, 7)
+    ]
+    mock_notes_db.stream_notes_for_user.return_value = iter([rows[:2], rows[2:]])
+
+    batches = list(note_service.export_notes(1, 3, 2))
+
+    assert batches == [
+        [
+            {"note_id": 4, "updated_at": "2024-09-25T00:00:00"},
+            {"note_id": 5, "updated_at": "2024-09-25T00:00:00"},
+        ],
+        [{"note_id": 6, "updated_at": "2024-09-25T00:00:00"}],
+    ]
+    mock_notes_db.stream_notes_for_user.assert_called_once_with(1, 3, 2)
+
+
 def test_get_note_by_id_public(note_service, mock_notes_db):
     """
     GIVEN an author ID and note ID
@@ -131,7 +312,7 @@ def test_update_note(note_service, mock_notes_db):
 
     assert note == mock_note
     mock_notes_db.update_note.assert_called_once_with(
-        note_id, note_title, note_text, author_id, is_public
+        note_id, note_title, note_text, author_id, is_public, None
     )
 
 
@@ -149,3 +330,391 @@ def test_delete_note(note_service, mock_notes_db):
 
     assert result is True
     mock_notes_db.delete_note.assert_called_once_with(author_id, note_id)
+
+
+def test_bulk_operations(note_service, mock_notes_db):
+    """
+    GIVEN batches of notes to create, update, and delete
+    WHEN the bulk methods are called
+    THEN each batch is passed to the database in a single call
+    """
+    mock_notes_db.create_notes.return_value = [MagicMock(spec=Note)]
+    mock_notes_db.update_notes.return_value = {2: MagicMock(spec=Note)}
+    mock_notes_db.delete_notes.return_value = {3}
+
+    created = note_service.create_notes(1, [("Title", "Text", False)])
+    updated = note_service.update_notes(1, [(2, "Title", "Text", True)])
+    deleted = note_service.delete_notes(1, [3, 4])
+
+    assert created == mock_notes_db.create_notes.return_value
+    assert updated == mock_notes_db.update_notes.return_value
+    assert deleted == {3}
+    mock_notes_db.create_notes.assert_called_once_with(1, [("Title", "Text", False)])
+    mock_notes_db.update_notes.assert_called_once_with(1, [(2, "Title", "Text", True)])
+    mock_notes_db.delete_notes.assert_called_once_with(1, [3, 4])
+
+
+def test_get_note_storage_stats(note_service, mock_notes_db):
+    """
+    GIVEN shared note bodies
+    WHEN get_note_storage_stats is called
+    THEN the content stats are returned with the deduplication ratio
+    """
+    mock_notes_db.get_content_stats.return_value = {
+        "contents": 2,
+        "references": 5,
+        "logical_bytes": 500,
+        "unique_bytes": 200,
+        "stored_bytes": 120,
+    }
+
+    stats = note_service.get_note_storage_stats()
+
+    assert stats["references"] == 5
+    assert stats["dedup_ratio"] == 2.5
+
+
+def test_get_note_storage_stats_empty(note_service, mock_notes_db):
+    """
+    GIVEN no shared note bodies
+    WHEN get_note_storage_stats is called
+    THEN the deduplication ratio is 1
+    """
+    mock_notes_db.get_content_stats.return_value = {
+        "contents": 0,
+        "references": 0,
+        "logical_bytes": 0,
+        "unique_bytes": 0,
+        "stored_bytes": 0,
+    }
+
+    assert note_service.get_note_storage_stats()["dedup_ratio"] == 1.0
+
+
+def test_get_note_by_id_cached(cached_note_service, mock_notes_db):
+    """
+    GIVEN a note service with a note cache
+    WHEN the same note is read twice
+    THEN the database is queried once and both reads return the note
+    """
+    mock_notes_db.get_note_by_id.return_value = make_note(1)
+
+    first = cached_note_service.get_note_by_id(1, 1)
+    second = cached_note_service.get_note_by_id(1, 1)
+
+    assert first.to_dict() == second.to_dict()
+    assert second is not first
+    mock_notes_db.get_note_by_id.assert_called_once_with(1)
+
+
+def test_get_note_by_id_cached_not_author(cached_note_service, mock_notes_db):
+    """
+    GIVEN a cached private note
+    WHEN another user reads it
+    THEN None is returned without querying the database again
+    """
+    mock_notes_db.get_note_by_id.return_value = make_note(1, is_public=False)
+    cached_note_service.get_note_by_id(1, 1)
+
+    assert cached_note_service.get_note_by_id(2, 1) is None
+    mock_notes_db.get_note_by_id.assert_called_once_with(1)
+
+
+def test_note_writes_update_cache(cached_note_service, mock_notes_db):
+    """
+    GIVEN a note service with a note cache
+    WHEN notes are created, updated, and deleted
+    THEN reads see each write without querying the database
+    """
+    mock_notes_db.create_note.return_value = make_note(1, "Created")
+    mock_notes_db.update_note.return_value = make_note(1, "Updated")
+    mock_notes_db.update_notes.return_value = {2: make_note(2, "Bulk")}
+    mock_notes_db.delete_note.return_value = True
+    mock_notes_db.get_note_by_id.return_value = None
+
+    cached_note_service.create_note("Created", "Text", 1, True)
+    assert cached_note_service.get_note_by_id(1, 1).note_title == "Created"
+
+    cached_note_service.update_note(1, "Updated", "Text", 1, True)
+    assert cached_note_service.get_note_by_id(1, 1).note_title == "Updated"
+
+    cached_note_service.update_notes(1, [(2, "Bulk", "Text", True)])
+    assert cached_note_service.get_note_by_id(1, 2).note_title == "Bulk"
+    mock_notes_db.get_note_by_id.assert_not_called()
+
+    cached_note_service.delete_note(1, 1)
+    assert cached_note_service.get_note_by_id(1, 1) is None
+    mock_notes_db.get_note_by_id.assert_called_once_with(1)
+
+
+def test_deleted_note_read_before_commit(cached_note_service, mock_notes_db):
+    """
+    GIVEN a read that misses the cache and loads a note
+    WHEN the note's delete commits before the read caches it
+    THEN the note read before the delete is not cached
+    """
+    mock_notes_db.delete_note.return_value = True
+
+    def read_then_delete(note_id):
+        cached_note_service.delete_note(1, note_id)
+        return make_note(note_id)
+
+    mock_notes_db.get_note_by_id.side_effect = read_then_delete
+    cached_note_service.get_note_by_id(1, 1)
+    mock_notes_db.get_note_by_id.side_effect = None
+    mock_notes_db.get_note_by_id.return_value = None
+    mock_notes_db.get_note_version.return_value = None
+
+    assert cached_note_service.get_note_by_id(1, 1) is None
+    assert cached_note_service.get_note_version(1, 1) is None
+
+
+@pytest.fixture
+def db_note_service(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'notes.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(User(user_id=1, username="author", password="password"))
+        db.commit()
+    with patch("src.db.database.engine", engine), patch(
+        "src.db.database.SessionLocal", Session
+    ):
+        yield NoteService(
+            notes,
+            LRUNoteCache(16, 1 << 20, 60),
+            ListingCache(LRUNoteCache(16, 1 << 20, 60), LocalGenerations()),
+        )
+    engine.dispose()
+
+
+@pytest.fixture
+def db_app():
+    app = Flask(__name__)
+    init_app(app)
+    return app
+
+
+def test_rolled_back_batch_is_not_cached(db_note_service, db_app):
+    """
+    GIVEN a request that creates notes and then fails
+    WHEN its transaction rolls back
+    THEN the notes it created are neither stored nor cached
+    """
+
+    @db_app.route("/batch", methods=["POST"])
+    def batch():
+        created = db_note_service.create_notes(1, [("Batch", "Text", True)])
+        db_app.created_ids = [note.note_id for note in created]
+        return "", 500
+
+    assert db_app.test_client().post("/batch").status_code == 500
+
+    (note_id,) = db_app.created_ids
+    assert db_note_service.cache.get(note_id) is None
+    assert db_note_service.get_note_by_id(1, note_id) is None
+
+
+def test_read_between_delete_and_commit(db_note_service, db_app):
+    """
+    GIVEN a request that has deleted a note but not committed yet
+    WHEN another reader caches the still committed note before the commit
+    THEN reads after the commit no longer see the note
+    """
+    note = db_note_service.create_note("Note", "Text", 1, True)
+
+    with db_app.test_request_context():
+        assert db_note_service.delete_note(1, note.note_id)
+        read = []
+        reader = threading.Thread(
+            target=lambda: read.append(db_note_service.get_note_by_id(1, note.note_id))
+        )
+        reader.start()
+        reader.join()
+        assert read[0] is not None
+        assert db_note_service.cache.get(note.note_id) is not None
+        db_app.process_response(db_app.response_class())
+
+    assert db_note_service.get_note_by_id(1, note.note_id) is None
+
+
+def test_listing_read_between_write_and_commit(db_note_service, db_app):
+    """
+    GIVEN a request that has created a note but not committed yet
+    WHEN another reader caches the listing before the commit
+    THEN listings after the commit include the note
+    """
+    with db_app.test_request_context():
+        note = db_note_service.create_note("Note", "Text", 1, True)
+        read = []
+        reader = threading.Thread(
+            target=lambda: read.append(db_note_service.get_notes(2, 1, 10))
+        )
+        reader.start()
+        reader.join()
+        assert read[0] == []
+        db_app.process_response(db_app.response_class())
+
+    assert [n.note_id for n in db_note_service.get_notes(2, 1, 10)] == [note.note_id]
+
+
+def test_get_notes_cached(cached_note_service, mock_notes_db):
+    """
+    GIVEN a note service with a listing cache
+    WHEN the same page is listed twice, by page and by cursor
+    THEN the database is queried once for each
+    """
+    mock_notes_db.get_notes_for_user.return_value = [make_note(1)]
+    mock_notes_db.get_notes_for_user_after.return_value = [
+        make_note(i) for i in range(1, 4)
+    ]
+
+    for _ in range(2):
+        notes = cached_note_service.get_notes(1, 1, 10)
+        page, next_cursor = cached_note_service.get_notes_page(1, None, 2)
+
+    assert [note.note_id for note in notes] == [1]
+    assert [note.note_id for note in page] == [1, 2]
+    assert decode_cursor(next_cursor) == [2]
+    mock_notes_db.get_notes_for_user.assert_called_once_with(1, 1, 10)
+    mock_notes_db.get_notes_for_user_after.assert_called_once_with(1, 0, 3)
+
+
+def test_note_writes_invalidate_listings(cached_note_service, mock_notes_db):
+    """
+    GIVEN cached listings of two users
+    WHEN one user creates a private note, then deletes a note
+    THEN the private note only invalidates that user's listing, and the delete
+    invalidates both
+    """
+    mock_notes_db.get_notes_for_user.return_value = []
+    mock_notes_db.create_note.return_value = make_note(5, is_public=False)
+    mock_notes_db.delete_note.return_value = True
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+
+    cached_note_service.create_note("Private", "Text", 1, False)
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+    assert mock_notes_db.get_notes_for_user.call_count == 3
+
+    cached_note_service.delete_note(1, 5)
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+    assert mock_notes_db.get_notes_for_user.call_count == 5
+
+
+def test_get_note_version(note_service, mock_notes_db):
+    """
+    GIVEN a note service without caches
+    WHEN the version of a note is requested
+    THEN only its version and updated_at are read, and None is returned for
+        missing notes
+    """
+    updated_at = datetime(2024, 9, 25, 23, 59, 10)
+    mock_notes_db.get_note_version.return_value = MagicMock(
+        version=3, updated_at=updated_at
+    )
+
+    assert note_service.get_note_version(1, 3) == (3, updated_at)
+    mock_notes_db.get_note_version.assert_called_once_with(1, 3)
+
+    mock_notes_db.get_note_version.return_value = None
+    assert note_service.get_note_version(1, 3) is None
+
+
+def test_get_note_version_cached(cached_note_service, mock_notes_db):
+    """
+    GIVEN a cached private note
+    WHEN its version is requested by its author and by another user
+    THEN the author gets its version and the other user None, without queries
+    """
+    mock_notes_db.get_note_by_id.return_value = make_note(1, is_public=False)
+    cached_note_service.get_note_by_id(1, 1)
+
+    assert cached_note_service.get_note_version(1, 1) == (
+        1,
+        datetime(2024, 9, 25, 23, 59, 10),
+    )
+    assert cached_note_service.get_note_version(2, 1) is None
+    mock_notes_db.get_note_version.assert_not_called()
+
+
+def test_get_note_versions(cached_note_service, mock_notes_db):
+    """
+    GIVEN a note service with a listing cache
+    WHEN page versions are requested before and after the page is cached
+    THEN they are read from the version column, then from the cached page
+    """
+    mock_notes_db.get_note_versions_for_user.return_value = [
+        MagicMock(note_id=1, version=3)
+    ]
+    mock_notes_db.get_notes_for_user.return_value = [make_note(1), make_note(2)]
+
+    assert cached_note_service.get_note_versions(1, 1, 10) == [(1, 3)]
+    mock_notes_db.get_note_versions_for_user.assert_called_once_with(1, 1, 10)
+
+    cached_note_service.get_notes(1, 1, 10)
+    assert cached_note_service.get_note_versions(1, 1, 10) == [(1, 1), (2, 1)]
+    assert mock_notes_db.get_note_versions_for_user.call_count == 1
+
+
+def test_get_note_versions_page(cached_note_service, mock_notes_db):
+    """
+    GIVEN a cursor page cached by get_notes_page
+    WHEN its versions are requested
+    THEN they and the next cursor come from the cached page
+    """
+    mock_notes_db.get_notes_for_user_after.return_value = [
+        make_note(i) for i in range(1, 4)
+    ]
+    _, next_cursor = cached_note_service.get_notes_page(1, None, 2)
+
+    versions, versions_cursor = cached_note_service.get_note_versions_page(1, None, 2)
+
+    assert versions == [(1, 1), (2, 1)]
+    assert versions_cursor == next_cursor
+    mock_notes_db.get_note_versions_for_user_after.assert_not_called()
+
+
+def test_get_note_versions_page_uncached(note_service, mock_notes_db):
+    """
+    GIVEN a note service without caches
+    WHEN the versions of a cursor page are requested
+    THEN one extra row is read to find the next cursor
+    """
+    mock_notes_db.get_note_versions_for_user_after.return_value = [
+        MagicMock(note_id=i, version=i) for i in (5, 6, 7)
+    ]
+
+    versions, next_cursor = note_service.get_note_versions_page(1, encode_cursor(4), 2)
+
+    assert versions == [(5, 5), (6, 6)]
+    assert next_cursor == encode_cursor(6)
+    mock_notes_db.get_note_versions_for_user_after.assert_called_once_with(1, 4, 3)
+
+
+def test_import_notes_invalidates_listings(cached_note_service, mock_notes_db):
+    """
+    GIVEN cached listings of two users
+    WHEN one user imports private notes, then a public one
+    THEN the private notes only invalidate that user's listing, and the public
+    note invalidates both
+    """
+    mock_notes_db.get_notes_for_user.return_value = []
+    mock_notes_db.import_notes.return_value = 2
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+
+    notes = [("A", "Text", False), ("B", "Text", False)]
+    assert cached_note_service.import_notes(1, notes) == 2
+    mock_notes_db.import_notes.assert_called_once_with(1, notes)
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+    assert mock_notes_db.get_notes_for_user.call_count == 3
+
+    mock_notes_db.import_notes.return_value = 1
+    cached_note_service.import_notes(1, [("C", "Text", True)])
+    cached_note_service.get_notes(1, 1, 10)
+    cached_note_service.get_notes(2, 1, 10)
+    assert mock_notes_db.get_notes_for_user.call_count == 5
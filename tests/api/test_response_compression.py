@@ -0,0 +1,138 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Response
+from werkzeug.http import parse_accept_header
+
+from src.api import response_compression
+from src.api.etag import CONTENT_CODINGS
+from src.api.response_compression import ResponseCompressor
+
+BODY = b'{"notes": [' + b'{"title": "Gateway timeout"},' * 5000 + b"{}]}"
+
+
+def make_response(body=BODY, mimetype="application/json", status=200) -> Response:
+    return Response(body, status=status, mimetype=mimetype)
+
+
+def test_compress_buffered_response():
+    """
+    GIVEN a JSON response above the size threshold and a client accepting gzip
+    WHEN it is compressed
+    THEN it is streamed gzip encoded, without a Content-Length, and varies on
+    Accept-Encoding
+    """
+    compressor = ResponseCompressor(["gzip"], min_bytes=1024)
+    compressed = response_compression.RESPONSES_COMPRESSED.value
+    response = make_response()
+    response.headers["ETag"] = '"4-3"'
+
+    response = compressor.compress(response, parse_accept_header("gzip, br"))
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == '"4-3-gzip"'
+    assert "Content-Length" not in response.headers
+    assert "Accept-Encoding" in response.vary
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert len(chunks) > 1
+    data = b"".join(chunks)
+    assert len(data) < len(BODY) // 10
+    assert gzip.decompress(data) == BODY
+    assert response_compression.RESPONSES_COMPRESSED.value == compressed + 1
+
+
+def test_compress_streamed_response():
+    """
+    GIVEN a streamed NDJSON response
+    WHEN it is compressed
+    THEN each chunk is flushed as it is produced, and the whole body decompresses
+    """
+    compressor = ResponseCompressor(["gzip"], min_bytes=1 << 20)
+    lines = [b'{"note_id": %d}\n' % note_id for note_id in range(3)]
+    response = make_response(iter(lines), mimetype="application/x-ndjson")
+
+    response = compressor.compress(response, parse_accept_header("gzip"))
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = response.response
+    for line in lines:
+        assert decompressor.decompress(next(chunks)) == line
+    decompressor.decompress(b"".join(chunks))
+    assert decompressor.eof
+
+
+@pytest.mark.parametrize(
+    "response, accept_encoding",
+    [
+        (make_response(b"{}"), "gzip"),
+        (make_response(), "identity"),
+        (make_response(), "gzip;q=0"),
+        (make_response(), ""),
+        (make_response(status=304), "gzip"),
+        (make_response(mimetype="image/png"), "gzip"),
+    ],
+    ids=["small", "identity", "refused", "no-header", "not-modified", "image"],
+)
+def test_compress_skips(response, accept_encoding):
+    """
+    GIVEN a small body, a client that does not accept gzip, a 304, or a binary body
+    WHEN the response is compressed
+    THEN it is sent as is
+    """
+    compressor = ResponseCompressor(["gzip"], min_bytes=1024)
+
+    compressed = compressor.compress(response, parse_accept_header(accept_encoding))
+
+    assert "Content-Encoding" not in compressed.headers
+    assert not compressed.is_streamed
+
+
+def test_negotiate_prefers_configured_order(monkeypatch):
+    """
+    GIVEN zstd and brotli are installed
+    WHEN encodings are negotiated
+    THEN the client's quality values win, and the configured order breaks ties
+    """
+    monkeypatch.setattr(response_compression, "zstandard", object())
+    monkeypatch.setattr(response_compression, "brotli", object())
+    compressor = ResponseCompressor(["zstd", "br", "gzip"])
+
+    assert compressor.negotiate(parse_accept_header("gzip, br, zstd")) == "zstd"
+    assert compressor.negotiate(parse_accept_header("gzip, br")) == "br"
+    assert compressor.negotiate(parse_accept_header("br;q=0.5, gzip")) == "gzip"
+
+
+def test_unavailable_encodings_are_skipped(monkeypatch):
+    """
+    GIVEN neither zstandard nor brotli is installed
+    WHEN a compressor preferring zstd and brotli is built
+    THEN it only offers gzip
+    """
+    monkeypatch.setattr(response_compression, "zstandard", None)
+    monkeypatch.setattr(response_compression, "brotli", None)
+
+    compressor = ResponseCompressor(["zstd", "br", "gzip"])
+
+    assert compressor.encodings == ["gzip"]
+    assert compressor.negotiate(parse_accept_header("zstd, br")) is None
+
+
+def test_unknown_encoding():
+    """
+    GIVEN an unknown encoding name
+    WHEN a compressor is built
+    THEN ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        ResponseCompressor(["lzma"])
+
+
+def test_encodings_are_content_codings():
+    """
+    GIVEN the encodings responses can be compressed with
+    WHEN they are compared with the codings ETags are suffixed with
+    THEN they are the same, so every coded ETag can be parsed back
+    """
+    assert set(response_compression.ENCODINGS) == CONTENT_CODINGS
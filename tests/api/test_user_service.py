@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from src.api.user_service import UserService
-from src.db import users
+from src.db import refresh_tokens, users
 from src.exceptions.auth_exception import AuthException
 
 
@@ -11,29 +11,38 @@ def mock_user_db():
 
 
 @pytest.fixture
-def user_service(mock_user_db):
-    return UserService(mock_user_db)
+def mock_refresh_tokens_db():
+    return MagicMock(spec=refresh_tokens)
+
+
+@pytest.fixture
+def user_service(mock_user_db, mock_refresh_tokens_db):
+    return UserService(mock_user_db, mock_refresh_tokens_db)
 
 
 @patch("src.api.user_service.create_access_token")
-def test_register_user(mock_create_access_token, user_service, mock_user_db):
+def test_register_user(
+    mock_create_access_token, user_service, mock_user_db, mock_refresh_tokens_db
+):
     """
     GIVEN a username and password
     WHEN register_user is called
-    THEN a new user is created and an access token is returned
+    THEN a new user is created and an access token and refresh token are returned
     """
     mock_user = MagicMock()
     mock_user.username = "testuser"
     mock_user.user_id = 1
     mock_user_db.create_user.return_value = mock_user
     mock_create_access_token.return_value = "access_token"
+    mock_refresh_tokens_db.create_refresh_token.return_value = "refresh_token"
 
     username = "testuser"
     password = "password123"
-    token = user_service.register_user(username, password)
+    tokens = user_service.register_user(username, password)
 
-    assert token == "access_token"
+    assert tokens == ("access_token", "refresh_token")
     mock_user_db.create_user.assert_called_once_with(username, password)
+    mock_refresh_tokens_db.create_refresh_token.assert_called_once_with(1)
     mock_create_access_token.assert_called_once_with(
         identity={
             "username": mock_user.username,
@@ -43,24 +52,28 @@ def test_register_user(mock_create_access_token, user_service, mock_user_db):
 
 
 @patch("src.api.user_service.create_access_token")
-def test_login_success(mock_create_access_token, user_service, mock_user_db):
+def test_login_success(
+    mock_create_access_token, user_service, mock_user_db, mock_refresh_tokens_db
+):
     """
     GIVEN a username and password
     WHEN login is called with valid credentials
-    THEN an access token is returned
+    THEN an access token and a refresh token are returned
     """
     mock_user = MagicMock()
     mock_user.username = "testuser"
     mock_user.user_id = 1
     mock_user_db.check_password.return_value = mock_user
     mock_create_access_token.return_value = "access_token"
+    mock_refresh_tokens_db.create_refresh_token.return_value = "refresh_token"
 
     username = "testuser"
     password = "password123"
-    token = user_service.login(username, password)
+    tokens = user_service.login(username, password)
 
-    assert token == "access_token"
+    assert tokens == ("access_token", "refresh_token")
     mock_user_db.check_password.assert_called_once_with(username, password)
+    mock_refresh_tokens_db.create_refresh_token.assert_called_once_with(1)
     mock_create_access_token.assert_called_once_with(
         identity={
             "username": mock_user.username,
@@ -86,6 +99,48 @@ def test_login_invalid_credentials(user_service, mock_user_db):
     mock_user_db.check_password.assert_called_once_with(username, password)
 
 
+@patch("src.api.user_service.create_access_token")
+def test_refresh(mock_create_access_token, user_service, mock_refresh_tokens_db):
+    """
+    GIVEN a refresh token
+    WHEN refresh is called
+    THEN the token is rotated and a new access token is issued without a password check
+    """
+    mock_user = MagicMock()
+    mock_user.username = "testuser"
+    mock_user.user_id = 1
+    mock_refresh_tokens_db.rotate_refresh_token.return_value = (
+        mock_user,
+        "new_refresh_token",
+    )
+    mock_create_access_token.return_value = "access_token"
+
+    tokens = user_service.refresh("old_refresh_token")
+
+    assert tokens == ("access_token", "new_refresh_token")
+    mock_refresh_tokens_db.rotate_refresh_token.assert_called_once_with(
+        "old_refresh_token"
+    )
+    mock_create_access_token.assert_called_once_with(
+        identity={"username": "testuser", "user_id": 1}
+    )
+
+
+def test_refresh_invalid_token(user_service, mock_user_db, mock_refresh_tokens_db):
+    """
+    GIVEN an invalid or reused refresh token
+    WHEN refresh is called
+    THEN an AuthException is raised
+    """
+    mock_refresh_tokens_db.rotate_refresh_token.side_effect = AuthException(
+        "Invalid refresh token"
+    )
+
+    with pytest.raises(AuthException):
+        user_service.refresh("reused_refresh_token")
+    mock_user_db.check_password.assert_not_called()
+
+
 def test_get_user_id_from_token_success(user_service):
     """
     GIVEN a valid access token
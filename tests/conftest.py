@@ -37,6 +37,17 @@ def session(engine, tables):
 def app():
     settings = Mock(spec=Settings)
     settings.JWT_SECRET_KEY = "test_secret_key"
+    settings.ACCESS_TOKEN_EXPIRES_SEC = 900
+    settings.HASH_POOL_RETRY_AFTER_SEC = 1
+    settings.JWT_CACHE_MAX_ENTRIES = 16
+    settings.JWT_CACHE_TTL_SEC = 60
+    settings.NOTES_BATCH_MAX_OPERATIONS = 10
+    settings.NOTES_EXPORT_BATCH_SIZE = 2
+    settings.NOTES_IMPORT_BATCH_SIZE = 2
+    settings.JSON_BACKEND = "auto"
+    settings.RESPONSE_COMPRESSION_ENCODINGS = ["zstd", "br", "gzip"]
+    settings.RESPONSE_COMPRESSION_LEVEL = None
+    settings.RESPONSE_COMPRESSION_MIN_BYTES = 1024
     user_service = Mock(spec=UserService)
     note_service = Mock(spec=NoteService)
     app = create_app(user_service, note_service, settings)
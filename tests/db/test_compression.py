@@ -0,0 +1,91 @@
+import zlib
+
+import pytest
+
+from src.db import compression
+from src.db.compression import (
+    FORMAT_PLAIN,
+    FORMAT_ZLIB,
+    FORMAT_ZSTD,
+    PREVIEW_LENGTH,
+    NoteCodec,
+    decode_note_text,
+)
+
+
+def test_encode_short_text_stays_plain():
+    """
+    GIVEN text below the compression threshold
+    WHEN it is encoded
+    THEN it is stored as plain text with its byte length
+    """
+    stored = NoteCodec(min_bytes=1024).encode("héllo")
+
+    assert stored == {
+        "storage_format": FORMAT_PLAIN,
+        "plain_text": "héllo",
+        "note_body": None,
+        "text_length": 6,
+    }
+
+
+def test_encode_long_text_is_compressed():
+    """
+    GIVEN compressible text above the compression threshold
+    WHEN it is encoded and decoded
+    THEN it is stored as zlib with a plain preview and decodes to the same text
+    """
+    text = "Traceback (most recent call last):\n" * 100
+
+    stored = NoteCodec(level=9, min_bytes=1024).encode(text)
+
+    assert stored["storage_format"] == FORMAT_ZLIB
+    assert stored["plain_text"] == text[:PREVIEW_LENGTH]
+    assert stored["text_length"] == len(text)
+    assert zlib.decompress(stored["note_body"]).decode("utf-8") == text
+    assert (
+        decode_note_text(
+            stored["storage_format"], stored["plain_text"], stored["note_body"]
+        )
+        == text
+    )
+
+
+def test_encode_incompressible_text_stays_plain():
+    """
+    GIVEN text above the threshold that does not shrink when compressed
+    WHEN it is encoded
+    THEN it is stored as plain text
+    """
+    text = "abcdefghijklmnopqrst"
+
+    stored = NoteCodec(min_bytes=16).encode(text)
+
+    assert stored["storage_format"] == FORMAT_PLAIN
+    assert stored["plain_text"] == text
+
+
+def test_zstd_requires_zstandard(monkeypatch):
+    """
+    GIVEN the zstandard package is not installed
+    WHEN a zstd codec is created or a zstd note is decoded
+    THEN ValueError is raised
+    """
+    monkeypatch.setattr(compression, "zstandard", None)
+
+    with pytest.raises(ValueError):
+        NoteCodec("zstd")
+    with pytest.raises(ValueError):
+        decode_note_text(FORMAT_ZSTD, None, b"")
+
+
+def test_unknown_codec_and_format():
+    """
+    GIVEN an unknown codec or storage format
+    WHEN a codec is created or a note is decoded
+    THEN ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        NoteCodec("lz4")
+    with pytest.raises(ValueError):
+        decode_note_text(9, None, None)
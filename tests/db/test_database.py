@@ -0,0 +1,206 @@
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.db.database import (
+    COMPILED_CACHE_ENTRIES,
+    POOL_CHECKOUT_WAIT,
+    POOL_REQUEST_WAIT,
+    POOL_TIMEOUTS,
+    Base,
+    InstrumentedQueuePool,
+    engine,
+    get_db,
+    init_app,
+    on_commit,
+)
+from src.models.user import User
+
+
+@pytest.fixture
+def pool_engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.01,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_engine_pool_settings():
+    """
+    GIVEN the application engine
+    WHEN its pool is inspected
+    THEN it is an instrumented pool configured from Settings
+    """
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert engine.pool._pre_ping is True
+    assert engine.pool._recycle == 1800
+
+
+def test_checkout_wait_is_recorded(pool_engine):
+    """
+    GIVEN an instrumented pool
+    WHEN a connection is checked out
+    THEN the wait is recorded in the checkout histogram
+    """
+    observed = POOL_CHECKOUT_WAIT.count
+
+    with pool_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert POOL_CHECKOUT_WAIT.count == observed + 1
+
+
+def test_checkout_timeout_is_counted(pool_engine):
+    """
+    GIVEN an instrumented pool with every connection checked out
+    WHEN another checkout times out
+    THEN the timeout is counted
+    """
+    timeouts = POOL_TIMEOUTS.value
+
+    with pool_engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            pool_engine.connect()
+
+    assert POOL_TIMEOUTS.value == timeouts + 1
+
+
+def test_request_wait_is_observed_once_per_request(pool_engine):
+    """
+    GIVEN a request that checks out several connections
+    WHEN the request ends
+    THEN their combined wait is observed once in the per-request histogram
+    """
+    app = Flask(__name__)
+    init_app(app)
+    observed = POOL_REQUEST_WAIT.count
+
+    with app.test_request_context():
+        for _ in range(3):
+            with pool_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        assert g.db_pool_wait > 0
+        app.do_teardown_request()
+
+    assert POOL_REQUEST_WAIT.count == observed + 1
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    with patch("src.db.database.engine", engine):
+        yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db_app():
+    app = Flask(__name__)
+    init_app(app)
+
+    app.committed = []
+
+    @app.route("/users/<username>/<int:status>", methods=["POST"])
+    def create_users(username, status):
+        for suffix in ("a", "b"):
+            with get_db() as db:
+                db.add(User(username=username + suffix, password="password123"))
+                db.commit()
+            on_commit(lambda suffix=suffix: app.committed.append(username + suffix))
+        return "", status
+
+    return app
+
+
+def _usernames(engine):
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT username FROM users"))}
+
+
+def test_request_shares_one_session(file_engine, db_app):
+    """
+    GIVEN a request
+    WHEN get_db is used several times
+    THEN every call gets the same session
+    """
+    with db_app.test_request_context():
+        with get_db() as first, get_db() as second:
+            assert first is second
+        with get_db(standalone=True) as standalone:
+            assert standalone is not first
+        db_app.do_teardown_request()
+
+
+def test_request_commits_once_on_success(file_engine, db_app):
+    """
+    GIVEN a request that writes through several DB calls
+    WHEN it returns a successful response
+    THEN all of its writes are committed together, then its commit callbacks run
+    """
+    response = db_app.test_client().post("/users/ok/200")
+
+    assert response.status_code == 200
+    assert _usernames(file_engine) == {"oka", "okb"}
+    assert db_app.committed == ["oka", "okb"]
+
+
+def test_request_rolls_back_on_error_response(file_engine, db_app):
+    """
+    GIVEN a request that writes through several DB calls
+    WHEN it returns an error response
+    THEN none of its writes are kept, and its commit callbacks never run
+    """
+    response = db_app.test_client().post("/users/failed/500")
+
+    assert response.status_code == 500
+    assert _usernames(file_engine) == set()
+    assert db_app.committed == []
+
+
+def test_get_db_outside_request_is_standalone():
+    """
+    GIVEN no request context
+    WHEN get_db is used twice
+    THEN each call gets its own session
+    """
+    with get_db() as first:
+        pass
+    with get_db() as second:
+        pass
+
+    assert first is not second
+
+
+def test_on_commit_outside_request_runs_at_once():
+    """
+    GIVEN no request transaction
+    WHEN a callback is registered to run on commit
+    THEN it runs right away
+    """
+    called = []
+
+    on_commit(lambda: called.append(True))
+
+    assert called == [True]
+
+
+def test_compiled_cache_entries(monkeypatch):
+    """
+    GIVEN the engine's compiled cache, or an engine without one
+    WHEN the compiled cache entries gauge is read
+    THEN it reports the number of statements cached, or 0
+    """
+    monkeypatch.setattr(engine, "_compiled_cache", {"a": 1, "b": 2})
+    assert COMPILED_CACHE_ENTRIES.value == 2
+
+    monkeypatch.setattr(engine, "_compiled_cache", None)
+    assert COMPILED_CACHE_ENTRIES.value == 0
@@ -0,0 +1,174 @@
+import json
+import logging
+import time
+
+import pytest
+from sqlalchemy import bindparam, create_engine, literal_column, select, text
+from sqlalchemy.exc import OperationalError
+
+from src.db import instrumentation
+from src.db.instrumentation import (
+    QueryStats,
+    fingerprint,
+    instrument_engine,
+)
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+def test_fingerprint_normalizes_literals_and_parameters():
+    """
+    GIVEN statements differing only in literals, placeholders and whitespace
+    WHEN they are fingerprinted
+    THEN they share one fingerprint
+    """
+    statements = [
+        "SELECT * FROM notes WHERE note_id = 1 AND title = 'a'",
+        "SELECT *  FROM notes\n WHERE note_id = %s AND title = %s",
+        "SELECT * FROM notes WHERE note_id = :note_id_1 AND title = ?",
+    ]
+
+    fingerprints = {fingerprint(statement) for statement in statements}
+
+    assert fingerprints == {"SELECT * FROM notes WHERE note_id = ? AND title = ?"}
+
+
+def test_fingerprint_collapses_in_lists():
+    """
+    GIVEN IN lists of different lengths
+    WHEN they are fingerprinted
+    THEN they share one fingerprint
+    """
+    assert fingerprint("SELECT 1 FROM notes WHERE note_id IN (%s, %s)") == (
+        fingerprint("SELECT 1 FROM notes WHERE note_id IN (%s, %s, %s, %s)")
+    )
+
+
+def test_query_stats_top():
+    """
+    GIVEN recorded statements
+    WHEN top is called
+    THEN fingerprints are ranked by total time
+    """
+    stats = QueryStats(max_fingerprints=10)
+    stats.record("fast", 0.001, 1)
+    stats.record("fast", 0.001, 1)
+    stats.record("slow", 0.5, 10)
+
+    assert stats.top(1) == [("slow", 1, 0.5, 10)]
+    assert stats.top(5)[1] == ("fast", 2, 0.002, 2)
+
+
+def test_query_stats_bounded():
+    """
+    GIVEN a full aggregate
+    WHEN a new fingerprint is recorded
+    THEN the fingerprint with the least total time is dropped
+    """
+    stats = QueryStats(max_fingerprints=2)
+    stats.record("a", 0.3, 0)
+    stats.record("b", 0.1, 0)
+    stats.record("c", 0.2, 0)
+
+    assert [item[0] for item in stats.top(5)] == ["a", "c"]
+
+
+def test_instrument_engine_records_statements(sqlite_engine):
+    """
+    GIVEN an instrumented engine with logging disabled
+    WHEN statements are executed
+    THEN they are aggregated by fingerprint
+    """
+    stats = QueryStats(max_fingerprints=10)
+    instrument_engine(sqlite_engine, stats, sample_rate=0, slow_query_ms=10_000)
+
+    with sqlite_engine.connect() as conn:
+        conn.execute(text("SELECT :a"), {"a": 1})
+        conn.execute(text("SELECT :a"), {"a": 2})
+
+    assert stats.top(1)[0][:2] == ("SELECT ?", 2)
+
+
+def test_instrument_engine_failed_statement(sqlite_engine):
+    """
+    GIVEN an instrumented engine
+    WHEN a statement raises and the next one on the same connection succeeds
+    THEN only the second is recorded, and nothing is left on the connection
+    """
+    stats = QueryStats(max_fingerprints=10)
+    instrument_engine(sqlite_engine, stats, sample_rate=0, slow_query_ms=10_000)
+
+    with sqlite_engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        time.sleep(0.05)
+        conn.execute(text("SELECT 1"))
+        info = dict(conn.info)
+
+    ((statement_fingerprint, calls, seconds, _),) = stats.top(5)
+    assert (statement_fingerprint, calls) == ("SELECT ?", 1)
+    assert seconds < 0.05
+    assert "query_start_time" not in info
+
+
+def test_instrument_engine_logs_slow_queries(sqlite_engine, caplog):
+    """
+    GIVEN an instrumented engine with sampling disabled
+    WHEN a statement exceeds the slow query threshold
+    THEN it is logged as structured JSON with its calling function
+    """
+    stats = QueryStats(max_fingerprints=10)
+    instrument_engine(sqlite_engine, stats, sample_rate=0, slow_query_ms=0)
+
+    with caplog.at_level(logging.INFO, logger="src.db.instrumentation"):
+        with sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert caplog.records[-1].levelno == logging.WARNING
+    assert record["event"] == "slow_query"
+    assert record["fingerprint"] == "SELECT ?"
+    assert "duration_ms" in record
+
+
+def test_instrument_engine_samples(sqlite_engine, caplog):
+    """
+    GIVEN an instrumented engine that samples every statement
+    WHEN a fast statement is executed
+    THEN it is logged at INFO level
+    """
+    stats = QueryStats(max_fingerprints=10)
+    instrument_engine(sqlite_engine, stats, sample_rate=1, slow_query_ms=10_000)
+
+    with caplog.at_level(logging.INFO, logger="src.db.instrumentation"):
+        with sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    assert caplog.records[-1].levelno == logging.INFO
+    assert json.loads(caplog.records[-1].getMessage())["event"] == "query"
+
+
+def test_instrument_engine_counts_compiled_cache(sqlite_engine):
+    """
+    GIVEN an instrumented engine
+    WHEN the same statement is executed twice
+    THEN it is compiled once, then found in the compiled cache
+    """
+    instrument_engine(
+        sqlite_engine, QueryStats(10), sample_rate=0, slow_query_ms=10_000
+    )
+    statement = select(literal_column("1")).where(bindparam("a") == 1)
+    hits = instrumentation.COMPILED_CACHE_HITS.value
+    misses = instrumentation.COMPILED_CACHE_MISSES.value
+
+    with sqlite_engine.connect() as conn:
+        conn.execute(statement, {"a": 1})
+        conn.execute(statement, {"a": 2})
+
+    assert instrumentation.COMPILED_CACHE_MISSES.value == misses + 1
+    assert instrumentation.COMPILED_CACHE_HITS.value == hits + 1
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from src.db.compression import FORMAT_ZLIB
+from src.db.note_contents import (
+    get_content_stats,
+    hash_note_text,
+    purge_unreferenced_contents,
+)
+from src.db.notes import create_note, create_notes, delete_note, update_note
+from src.models.note_content import NoteContent
+from src.models.user import User
+
+
+def test_hash_note_text():
+    """
+    GIVEN a note text
+    WHEN it is hashed
+    THEN the hex SHA-256 digest of its UTF-8 bytes is returned
+    """
+    assert hash_note_text("a") == (
+        "ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb"
+    )
+
+
+def test_shared_note_bodies(engine, tables, session):
+    """
+    GIVEN notes created, updated, and deleted with repeated texts
+    WHEN their shared bodies are inspected, measured, and purged
+    THEN each distinct text is stored once and counts the notes pointing at it
+    """
+    user = User(username="contents_user", password="password123")
+    session.add(user)
+    session.commit()
+    long_text = "WARN retrying upstream request\n" * 100
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def ref_counts():
+        session.expire_all()
+        return dict(
+            session.execute(
+                select(NoteContent.content_hash, NoteContent.ref_count)
+            ).all()
+        )
+
+    with patch("src.db.notes.get_db", get_db), patch(
+        "src.db.note_contents.get_db", get_db
+    ):
+        first, second, third = create_notes(
+            user.user_id,
+            [
+                ("One", long_text, False),
+                ("Two", long_text, True),
+                ("Three", "x", False),
+            ],
+        )
+        fourth = create_note("Four", "x", user.user_id)
+
+        assert first.content_hash == second.content_hash == hash_note_text(long_text)
+        assert first.note_text == long_text
+        assert fourth.note_text == "x"
+        assert ref_counts() == {hash_note_text(long_text): 2, hash_note_text("x"): 2}
+        assert first.content.storage_format == FORMAT_ZLIB
+
+        stats = get_content_stats()
+        assert stats["contents"] == 2
+        assert stats["references"] == 4
+        assert stats["logical_bytes"] == 2 * len(long_text) + 2
+        assert stats["unique_bytes"] == len(long_text) + 1
+        assert stats["stored_bytes"] < stats["unique_bytes"]
+
+        update_note(second.note_id, "Two", "y", user.user_id, True)
+        assert delete_note(user.user_id, first.note_id) is True
+        assert ref_counts() == {
+            hash_note_text(long_text): 0,
+            hash_note_text("x"): 2,
+            hash_note_text("y"): 1,
+        }
+
+        assert purge_unreferenced_contents(10) == 1
+        assert purge_unreferenced_contents(10) == 0
+        assert set(ref_counts()) == {hash_note_text("x"), hash_note_text("y")}
+
+        delete_note(user.user_id, second.note_id)
+        delete_note(user.user_id, third.note_id)
+        delete_note(user.user_id, fourth.note_id)
+        assert purge_unreferenced_contents(10) == 2
+
+    session.delete(user)
+    session.commit()
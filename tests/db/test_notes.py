@@ -1,23 +1,71 @@
+from contextlib import contextmanager
+from datetime import datetime
 from unittest.mock import patch, MagicMock
 
-from sqlalchemy import Select, Tuple
+import pytest
+from sqlalchemy import Update, event, select
+from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy.orm import sessionmaker
 
-from src.models.note import Note
+from src.db.compression import FORMAT_PLAIN, FORMAT_ZLIB
+from src.db.note_contents import hash_note_text
+from src.exceptions.stale_note_exception import StaleNoteException
+from src.models.note import Note, NoteRecord, note_records, note_row_to_dict
+from src.models.user import User
 from src.db.notes import (
+    _NOTE_RECORD_BY_ID,
+    _VISIBLE_NOTE_RECORDS,
     create_note,
+    create_notes,
+    delete_notes,
+    _field_columns,
+    backfill_note_storage,
+    _note_rows,
     get_note_by_id,
+    get_note_fields_by_id,
+    get_note_fields_for_user,
+    get_note_fields_for_user_after,
+    get_note_summaries_for_user,
+    get_note_summaries_for_user_after,
+    get_note_version,
+    get_note_versions_for_user,
+    get_note_versions_for_user_after,
     get_notes_for_user,
+    get_notes_for_user_after,
+    import_notes,
+    stream_notes_for_user,
     update_note,
+    update_notes,
     delete_note,
 )
 
 
+def make_locked_row(title: str, text: str, version: int = 1) -> MagicMock:
+    """
+    Builds the row update_note reads while locking a note.
+    """
+    return MagicMock(
+        content_hash=hash_note_text(text),
+        note_title=title,
+        is_public=False,
+        version=version,
+        created_at=datetime(2024, 9, 25, 23, 46, 27),
+        updated_at=datetime(2024, 9, 25, 23, 59, 10),
+        username="author",
+        now=datetime(2024, 9, 26, 8, 30, 0),
+    )
+
+
+@patch("src.db.notes.release_contents")
+@patch("src.db.notes.acquire_contents")
 @patch("src.db.notes.get_db")
-def test_update_note_success(mock_get_db):
+def test_update_note_success(mock_get_db, mock_acquire, mock_release):
     """
     GIVEN a note ID, title, text, author ID, and public status
     WHEN update_note is called
-    THEN the note is updated and returned
+    THEN the note is locked and repointed at the new body with one conditional
+        UPDATE, and returned from the locked row and the new values
     """
     mock_db = MagicMock()
     mock_get_db.return_value.__enter__.return_value = mock_db
@@ -28,52 +76,129 @@ def test_update_note_success(mock_get_db):
     author_id = 1
     is_public = True
 
-    db_note = Note(
-        note_id=note_id,
-        note_title="Old Title",
-        note_text="Old Text",
-        author_id=author_id,
-        is_public=False,
-    )
-    mock_db.execute.return_value.scalar_one_or_none.return_value = db_note
+    row = make_locked_row("Old Title", "Old Text")
+    mock_db.execute.return_value.one_or_none.return_value = row
+    mock_db.execute.return_value.rowcount = 1
 
     updated_note = update_note(note_id, note_title, note_text, author_id, is_public)
 
-    assert updated_note is not None
-    assert updated_note.note_title == note_title
-    assert updated_note.note_text == note_text
-    assert updated_note.is_public == is_public
+    assert updated_note == NoteRecord(
+        note_id,
+        note_title,
+        note_text,
+        is_public,
+        author_id,
+        "author",
+        row.created_at,
+        row.now,
+        2,
+    )
+    assert mock_db.execute.call_count == 2
+    statement, parameters = mock_db.execute.call_args_list[1].args
+    assert isinstance(statement, Update)
+    assert parameters["b_expected_version"] is None
+    assert parameters["b_content_hash"] == hash_note_text(note_text)
+    assert parameters["b_updated_at"] == row.now
+    mock_acquire.assert_called_once_with(mock_db, [note_text])
+    mock_release.assert_called_once_with(mock_db, [row.content_hash])
     mock_db.commit.assert_called_once()
-    mock_db.refresh.assert_called_once_with(db_note)
 
 
+@patch("src.db.notes.release_contents")
+@patch("src.db.notes.acquire_contents")
 @patch("src.db.notes.get_db")
-def test_update_note_does_not_exist(mock_get_db):
+def test_update_note_title_only(mock_get_db, mock_acquire, mock_release):
     """
-    GIVEN a note ID, title, text, author ID, and public status
-    WHEN update_note is called with a non-existent note ID
-    THEN None is returned
+    GIVEN a note whose text already matches the update
+    WHEN update_note is called with a new title
+    THEN the note keeps its body reference
     """
     mock_db = MagicMock()
     mock_get_db.return_value.__enter__.return_value = mock_db
 
-    note_id = 1
-    note_title = "Updated Title"
-    note_text = "Updated Text"
-    author_id = 1
-    is_public = True
+    mock_db.execute.return_value.one_or_none.return_value = make_locked_row(
+        "Title", "Text"
+    )
+    mock_db.execute.return_value.rowcount = 1
 
-    mock_db.execute.return_value.scalar_one_or_none.return_value = None
+    update_note(1, "New Title", "Text", 1, False)
 
-    updated_note = update_note(note_id, note_title, note_text, author_id, is_public)
+    mock_acquire.assert_not_called()
+    mock_release.assert_not_called()
+    mock_db.commit.assert_called_once()
 
-    assert updated_note is None
+
+@patch("src.db.notes.get_db")
+def test_update_note_unchanged(mock_get_db):
+    """
+    GIVEN a note whose values already match the update
+    WHEN update_note is called
+    THEN nothing is written, and the note is returned as it was
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    row = make_locked_row("Title", "Text", version=3)
+    mock_db.execute.return_value.one_or_none.return_value = row
+
+    updated_note = update_note(1, "Title", "Text", 1, False, expected_version=3)
+
+    assert (updated_note.note_text, updated_note.version) == ("Text", 3)
+    assert updated_note.updated_at == row.updated_at
+    mock_db.execute.assert_called_once()
     mock_db.commit.assert_not_called()
-    mock_db.refresh.assert_not_called()
 
 
+@patch("src.db.notes.release_contents")
+@patch("src.db.notes.acquire_contents")
 @patch("src.db.notes.get_db")
-def test_update_note_not_found(mock_get_db):
+def test_update_note_title_case_only(mock_get_db, mock_acquire, mock_release):
+    """
+    GIVEN a note whose title differs from the update only in case
+    WHEN update_note is called
+    THEN the new title is written, although a case-insensitive collation would
+        compare the two as equal
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    mock_db.execute.return_value.one_or_none.return_value = make_locked_row(
+        "todo", "Text"
+    )
+    mock_db.execute.return_value.rowcount = 1
+
+    updated_note = update_note(1, "TODO", "Text", 1, False)
+
+    assert (updated_note.note_title, updated_note.version) == ("TODO", 2)
+    assert mock_db.execute.call_args.args[1]["b_note_title"] == "TODO"
+    mock_db.commit.assert_called_once()
+    mock_acquire.assert_not_called()
+    mock_release.assert_not_called()
+
+
+@patch("src.db.notes.get_db")
+def test_update_note_stale(mock_get_db):
+    """
+    GIVEN a note that was updated after the version the caller saw
+    WHEN update_note is called with the expected version
+    THEN StaleNoteException is raised, and nothing is written or committed
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    mock_db.execute.return_value.one_or_none.return_value = make_locked_row(
+        "Newer Title", "Newer Text", version=3
+    )
+
+    with pytest.raises(StaleNoteException):
+        update_note(1, "Title", "Newer Text", 1, False, expected_version=2)
+
+    mock_db.execute.assert_called_once()
+    mock_db.commit.assert_not_called()
+
+
+@patch("src.db.notes.get_db")
+def test_update_note_does_not_exist(mock_get_db):
     """
     GIVEN a note ID, title, text, author ID, and public status
     WHEN update_note is called with a non-existent note ID
@@ -88,17 +213,94 @@ def test_update_note_not_found(mock_get_db):
     author_id = 1
     is_public = True
 
-    mock_db.execute.return_value.scalar_one_or_none.return_value = None
+    mock_db.execute.return_value.one_or_none.return_value = None
 
     updated_note = update_note(note_id, note_title, note_text, author_id, is_public)
 
     assert updated_note is None
+    mock_db.execute.assert_called_once()
     mock_db.commit.assert_not_called()
-    mock_db.refresh.assert_not_called()
 
 
+def test_update_note_conditional_write(engine, tables, session):
+    """
+    GIVEN a stored note
+    WHEN update_note is called with and without changes and with stale versions,
+        including a version replaced within the same second
+    THEN only real, current changes are written, each one to the next version
+    """
+    user = User(username="update_user", password="password123")
+    session.add(user)
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            note = create_note("Title", "Text", user.user_id, False)
+            assert note.version == 1
+            updated_at = datetime(2024, 9, 25, 23, 59, 10)
+            session.execute(
+                sqlalchemy_update(Note)
+                .where(Note.note_id == note.note_id)
+                .values(updated_at=updated_at)
+            )
+            session.commit()
+
+            unchanged = update_note(note.note_id, "Title", "Text", user.user_id, False)
+            assert (unchanged.updated_at, unchanged.version) == (updated_at, 1)
+
+            with pytest.raises(StaleNoteException):
+                update_note(note.note_id, "New Title", "Text", user.user_id, False, 0)
+
+            updated = update_note(
+                note.note_id, "New Title", "Text", user.user_id, True, 1
+            )
+            assert updated.note_title == "New Title"
+            assert updated.is_public is True
+            assert updated.updated_at != updated_at
+            assert updated.version == 2
+            assert updated.author == "update_user"
+            assert updated == get_note_by_id(note.note_id)
+
+            # A change of case alone is a change
+            updated = update_note(
+                note.note_id, "NEW TITLE", "Text", user.user_id, True, 2
+            )
+            assert (updated.note_title, updated.version) == ("NEW TITLE", 3)
+
+            # A second write within the same second leaves updated_at as it
+            # was, but the version the first writer saw is still stale
+            session.execute(
+                sqlalchemy_update(Note)
+                .where(Note.note_id == note.note_id)
+                .values(updated_at=updated_at)
+            )
+            session.commit()
+            with pytest.raises(StaleNoteException):
+                update_note(note.note_id, "Lost", "Text", user.user_id, True, 2)
+            assert get_note_by_id(note.note_id).note_title == "NEW TITLE"
+            assert get_note_version(user.user_id, note.note_id) == (3, updated_at)
+            assert get_note_version(user.user_id, note.note_id + 1) is None
+
+            assert update_note(note.note_id, "Title", "Text", 999, False) is None
+    finally:
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
+
+
+@patch("src.db.notes.release_contents")
 @patch("src.db.notes.get_db")
-def test_delete_note_success(mock_get_db):
+def test_delete_note_success(mock_get_db, mock_release):
     """
     GIVEN a note ID and author ID
     WHEN delete_note is called
@@ -110,11 +312,15 @@ def test_delete_note_success(mock_get_db):
     note_id = 1
     author_id = 1
 
-    mock_db.execute.return_value.rowcount = 1
+    mock_db.execute.return_value.one_or_none.return_value = MagicMock(
+        content_hash="abc"
+    )
 
     result = delete_note(author_id, note_id)
 
     assert result is True
+    mock_release.assert_called_once_with(mock_db, ["abc"])
+    assert mock_db.execute.call_count == 2
     mock_db.commit.assert_called_once()
 
 
@@ -131,12 +337,32 @@ def test_delete_note_not_found(mock_get_db):
     note_id = 1
     author_id = 1
 
-    mock_db.execute.return_value.rowcount = 0
+    mock_db.execute.return_value.one_or_none.return_value = None
 
     result = delete_note(author_id, note_id)
 
     assert result is False
-    mock_db.commit.assert_called_once()
+    mock_db.execute.assert_called_once()
+    mock_db.commit.assert_not_called()
+
+
+def make_record_row(note_id: int, author_id: int, is_public: bool) -> tuple:
+    """
+    Builds a row of NOTE_RECORD_COLUMNS for a note with plain text.
+    """
+    return (
+        note_id,
+        f"Note {note_id}",
+        FORMAT_PLAIN,
+        f"Text {note_id}",
+        None,
+        is_public,
+        author_id,
+        "author",
+        datetime(2024, 9, 25, 23, 46, 27),
+        datetime(2024, 9, 25, 23, 59, 10),
+        1,
+    )
 
 
 @patch("src.db.notes.get_db")
@@ -151,28 +377,17 @@ def test_get_notes_by_author_id(mock_get_db):
 
     author_id = 1
 
-    db_notes = [
-        Note(
-            note_id=1,
-            note_title="Note 1",
-            note_text="Text 1",
-            author_id=author_id,
-            is_public=True,
-        ),
-        Note(
-            note_id=2,
-            note_title="Note 2",
-            note_text="Text 2",
-            author_id=author_id,
-            is_public=False,
-        ),
+    rows = [
+        make_record_row(1, author_id, is_public=True),
+        make_record_row(2, author_id, is_public=False),
     ]
-    mock_db.execute.return_value.scalars.return_value.all.return_value = db_notes
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = rows
 
     notes = get_notes_for_user(author_id)
 
-    assert notes == db_notes
-    mock_db.execute.assert_called_once()
+    assert notes == note_records(rows)
+    mock_execute.assert_called_once()
 
 
 @patch("src.db.notes.get_db")
@@ -189,32 +404,22 @@ def test_get_notes_for_user_default_pagination(mock_get_db):
     page = 1
     page_size = 10
 
-    db_notes = [
-        Note(
-            note_id=1,
-            note_title="Note 1",
-            note_text="Text 1",
-            author_id=author_id,
-            is_public=True,
-        ),
-        Note(
-            note_id=2,
-            note_title="Note 2",
-            note_text="Text 2",
-            author_id=author_id,
-            is_public=False,
-        ),
+    rows = [
+        make_record_row(1, author_id, is_public=True),
+        make_record_row(2, author_id, is_public=False),
     ]
-    mock_db.execute.return_value.scalars.return_value.all.return_value = db_notes
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = rows
 
     notes = get_notes_for_user(author_id, page=page, page_size=page_size)
 
-    assert notes == db_notes
-    mock_db.execute.assert_called_once()
-    args, _ = mock_db.execute.call_args
-    query = args[0]
-    assert query._limit == page_size
-    assert query._offset == (page - 1) * page_size
+    assert notes == note_records(rows)
+    mock_execute.assert_called_once()
+    args, _ = mock_execute.call_args
+    assert args[0] is _VISIBLE_NOTE_RECORDS
+    assert args[1]["limit"] == page_size
+    assert args[1]["offset"] == (page - 1) * page_size
+    assert args[1]["branch_limit"] == page * page_size
 
 
 @patch("src.db.notes.get_db")
@@ -231,32 +436,78 @@ def test_get_notes_for_user_custom_pagination(mock_get_db):
     page = 2
     page_size = 5
 
-    db_notes = [
-        Note(
-            note_id=3,
-            note_title="Note 3",
-            note_text="Text 3",
-            author_id=author_id,
-            is_public=True,
-        ),
-        Note(
-            note_id=4,
-            note_title="Note 4",
-            note_text="Text 4",
-            author_id=author_id,
-            is_public=False,
-        ),
+    rows = [
+        make_record_row(3, author_id, is_public=True),
+        make_record_row(4, author_id, is_public=False),
     ]
-    mock_db.execute.return_value.scalars.return_value.all.return_value = db_notes
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = rows
 
     notes = get_notes_for_user(author_id, page=page, page_size=page_size)
 
-    assert notes == db_notes
-    mock_db.execute.assert_called_once()
-    args, _ = mock_db.execute.call_args
-    query = args[0]
-    assert query._limit == page_size
-    assert query._offset == (page - 1) * page_size
+    assert notes == note_records(rows)
+    mock_execute.assert_called_once()
+    args, _ = mock_execute.call_args
+    assert args[0] is _VISIBLE_NOTE_RECORDS
+    assert args[1]["limit"] == page_size
+    assert args[1]["offset"] == (page - 1) * page_size
+    assert args[1]["branch_limit"] == page * page_size
+
+
+@patch("src.db.notes.get_db")
+def test_get_notes_for_user_after(mock_get_db):
+    """
+    GIVEN an author ID and a note ID to resume after
+    WHEN get_notes_for_user_after is called
+    THEN the query seeks past the note ID in note ID order
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    author_id = 1
+    rows = [
+        make_record_row(6, author_id, is_public=True),
+    ]
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = rows
+
+    notes = get_notes_for_user_after(author_id, after_note_id=5, limit=3)
+
+    assert notes == note_records(rows)
+    mock_execute.assert_called_once()
+    args, _ = mock_execute.call_args
+    query, parameters = args
+    assert parameters == {
+        "author_id": author_id,
+        "after_note_id": 5,
+        "branch_limit": 3,
+        "limit": 3,
+        "offset": 0,
+    }
+    assert "notes.note_id > :after_note_id" in str(query)
+    assert query._order_by_clauses[0].compare(Note.__table__.c.note_id)
+
+
+@patch("src.db.notes.get_db")
+def test_get_notes_for_user_union_of_branches(mock_get_db):
+    """
+    GIVEN an author ID
+    WHEN get_notes_for_user is called
+    THEN the public and own-private branches are read separately and merged with UNION ALL
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = []
+
+    get_notes_for_user(1, page=3, page_size=5)
+
+    args, _ = mock_execute.call_args
+    query = str(args[0])
+    assert "UNION ALL" in query
+    assert " OR " not in query
+    assert "notes.is_public = true" in query
+    assert query.count("LIMIT") == 3
 
 
 @patch("src.db.notes.get_db")
@@ -271,30 +522,89 @@ def test_get_note_by_id(mock_get_db):
 
     note_id = 1
 
-    db_note = Note(
-        note_id=note_id,
-        note_title="Note 1",
-        note_text="Text 1",
-        author_id=1,
-        is_public=True,
-    )
-    mock_db.execute.return_value.scalar_one_or_none.return_value = db_note
+    rows = [make_record_row(note_id, 1, is_public=True)]
+    mock_execute = mock_db.connection.return_value.execute
+    mock_execute.return_value = rows
 
     note = get_note_by_id(note_id)
 
-    assert note == db_note
-    mock_db.execute.assert_called_once()
-    args, _ = mock_db.execute.call_args
-    query: Select[Tuple[Note]] = args[0]
-    assert query._whereclause.compare(Note.note_id == note_id)
+    assert note == note_records(rows)[0]
+    mock_execute.assert_called_once()
+    args, _ = mock_execute.call_args
+    assert args == (_NOTE_RECORD_BY_ID, {"note_id": note_id})
+
+
+def test_note_records(engine, tables, session):
+    """
+    GIVEN visible notes with inline, compressed, and shared text, and another
+    user's private note
+    WHEN notes are read by page, after a note ID, and by ID
+    THEN the visible notes are returned as records equal to the ORM notes
+    """
+    user = User(username="record_user", password="password123")
+    other = User(username="record_other", password="password123")
+    session.add_all([user, other])
+    session.commit()
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        inline = Note(
+            note_title="Inline", note_text="Short text", author_id=user.user_id
+        )
+        compressed = Note(
+            note_title="Compressed",
+            note_text="WARN cache miss\n" * 200,
+            author_id=user.user_id,
+        )
+        hidden = Note(note_title="Hidden", note_text="Hidden", author_id=other.user_id)
+        session.add_all([inline, compressed, hidden])
+        session.commit()
+        assert compressed.storage_format == FORMAT_ZLIB
 
+        with patch("src.db.notes.get_db", get_db):
+            shared = create_note("Shared", "Shared text", other.user_id, True)
+            assert shared.content_hash is not None
+            notes = [inline, compressed, shared]
+            page = get_notes_for_user(user.user_id, 1, 10)
+            after = get_notes_for_user_after(user.user_id, inline.note_id, 10)
+            by_id = get_note_by_id(shared.note_id)
+            missing = get_note_by_id(hidden.note_id + 100)
 
+        assert all(isinstance(record, NoteRecord) for record in page)
+        assert page == notes
+        assert [record.to_dict() for record in page] == [
+            note.to_dict() for note in notes
+        ]
+        assert after == notes[1:]
+        assert by_id == shared
+        assert by_id.author == "record_other"
+        assert missing is None
+    finally:
+        session.execute(
+            sqlalchemy_delete(Note).where(
+                Note.author_id.in_([user.user_id, other.user_id])
+            )
+        )
+        session.delete(user)
+        session.delete(other)
+        session.commit()
+
+
+@patch("src.db.notes.acquire_contents")
 @patch("src.db.notes.get_db")
-def test_create_note(mock_get_db):
+def test_create_note(mock_get_db, mock_acquire):
     """
     GIVEN a note title, text, author ID, and public status
     WHEN create_note is called
-    THEN the note is created and returned
+    THEN the note is created pointing at the shared body of its text and returned
     """
     mock_db = MagicMock()
     mock_get_db.return_value.__enter__.return_value = mock_db
@@ -303,19 +613,547 @@ def test_create_note(mock_get_db):
     note_text = "Text 1"
     author_id = 1
     is_public = True
-
-    db_note = Note(
-        note_title=note_title,
-        note_text=note_text,
-        author_id=author_id,
-        is_public=is_public,
-    )
+    content_hash = hash_note_text(note_text)
+    mock_acquire.return_value = [content_hash]
 
     note = create_note(note_title, note_text, author_id, is_public)
 
-    assert note == db_note
-    args, _ = mock_db.add.call_args
-    query = args[0]
-    assert query == db_note
+    assert (note.note_title, note.author_id, note.is_public) == (
+        note_title,
+        author_id,
+        is_public,
+    )
+    assert note.content_hash == content_hash
+    assert note.plain_text is None
+    mock_acquire.assert_called_once_with(mock_db, [note_text])
+    mock_db.add.assert_called_once_with(note)
     mock_db.commit.assert_called_once()
-    mock_db.refresh.assert_called_once_with(db_note)
+    mock_db.refresh.assert_called_once_with(note)
+
+
+@pytest.mark.parametrize("insert_returning", [True, False])
+def test_create_notes_ids(engine, tables, session, insert_returning):
+    """
+    GIVEN a database with or without INSERT ... RETURNING
+    WHEN create_notes is called with three notes
+    THEN they are returned in the order given, with the IDs they were stored under
+    """
+    user = User(username="create_ids_user", password="password123")
+    session.add(user)
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    statements = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO NOTES"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_inserts)
+    try:
+        with patch("src.db.notes.get_db", get_db), patch.object(
+            engine.dialect, "insert_returning", insert_returning
+        ):
+            created = create_notes(
+                user.user_id,
+                [
+                    ("First", "One", False),
+                    ("Second", "Two", True),
+                    ("Third", "3", False),
+                ],
+            )
+
+        assert statements and all(
+            ("RETURNING" in statement) is insert_returning for statement in statements
+        )
+        assert [note.note_title for note in created] == ["First", "Second", "Third"]
+        stored = dict(
+            session.execute(
+                select(Note.note_id, Note.note_title).where(
+                    Note.author_id == user.user_id
+                )
+            ).all()
+        )
+        assert {note.note_id: note.note_title for note in created} == stored
+    finally:
+        event.remove(engine, "before_cursor_execute", count_inserts)
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
+
+
+def test_bulk_note_operations(engine, tables, session):
+    """
+    GIVEN a user and notes of another user
+    WHEN create_notes, update_notes, and delete_notes are called
+    THEN only the user's own notes are written and the results report which
+    """
+    user = User(username="bulk_user", password="password123")
+    other = User(username="bulk_other", password="password123")
+    session.add_all([user, other])
+    session.commit()
+    other_note = Note(
+        note_title="Other", note_text="Other", author_id=other.user_id, is_public=True
+    )
+    session.add(other_note)
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            created = create_notes(
+                user.user_id, [("First", "One", False), ("Second", "Two", True)]
+            )
+            assert [note.note_title for note in created] == ["First", "Second"]
+            assert created[1].is_public is True
+            assert created[0].author_user.username == "bulk_user"
+            assert created[0].created_at is not None
+
+            first_id, second_id = created[0].note_id, created[1].note_id
+            updated = update_notes(
+                user.user_id,
+                [
+                    (first_id, "First v2", "One", False),
+                    (second_id, "Second", "Two", True),
+                    (other_note.note_id, "Stolen", "Stolen", False),
+                ],
+            )
+            assert set(updated) == {first_id, second_id}
+            assert updated[first_id].note_title == "First v2"
+
+            deleted = delete_notes(user.user_id, [first_id, other_note.note_id, 0])
+            assert deleted == {first_id}
+
+        remaining = session.execute(
+            select(Note.note_id, Note.note_title).where(
+                Note.note_id.in_([first_id, second_id, other_note.note_id])
+            )
+        ).all()
+        assert sorted(remaining) == sorted(
+            [(second_id, "Second"), (other_note.note_id, "Other")]
+        )
+        assert create_notes(user.user_id, []) == []
+    finally:
+        session.execute(
+            sqlalchemy_delete(Note).where(
+                Note.author_id.in_([user.user_id, other.user_id])
+            )
+        )
+        session.delete(user)
+        session.delete(other)
+        session.commit()
+
+
+def test_get_note_summaries_for_user(engine, tables, session):
+    """
+    GIVEN notes with multi-byte text
+    WHEN note summaries are requested with and without an excerpt
+    THEN the text is replaced by its byte length and an optional excerpt
+    """
+    user = User(username="summary_user", password="password123")
+    session.add(user)
+    session.commit()
+    text = "h\u00e9llo " * 100
+    notes = [
+        Note(note_title=f"Note {i}", note_text=text, author_id=user.user_id)
+        for i in range(3)
+    ]
+    session.add_all(notes)
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            summaries = get_note_summaries_for_user(user.user_id, 1, 2)
+            after = get_note_summaries_for_user_after(
+                user.user_id, notes[0].note_id, 10, excerpt_length=5
+            )
+
+        assert [row.note_id for row in summaries] == [
+            notes[0].note_id,
+            notes[1].note_id,
+        ]
+        summary = note_row_to_dict(summaries[0])
+        assert "text" not in summary
+        assert "excerpt" not in summary
+        assert summary["length"] == len(text.encode("utf-8"))
+        assert summary["author"] == "summary_user"
+        assert summary["public"] is False
+        assert summary["title"] == "Note 0"
+
+        assert [row.note_id for row in after] == [notes[1].note_id, notes[2].note_id]
+        assert after[0].excerpt == "h\u00e9llo"
+    finally:
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
+
+
+def test_note_rows_only_join_users_for_author():
+    """
+    GIVEN fieldsets with and without the author
+    WHEN their selects are built
+    THEN only the fieldset with the author joins users, and note text is only
+    selected when requested
+    """
+    without_author = str(_note_rows(_field_columns(["title", "updated_at"])))
+    with_author = str(_note_rows(_field_columns(["author"])))
+
+    assert "JOIN users" not in without_author
+    assert "note_text" not in without_author
+    assert "notes.note_id AS note_id" in without_author
+    assert "JOIN users" in with_author
+
+
+def test_get_note_fields(engine, tables, session):
+    """
+    GIVEN public and private notes of two users
+    WHEN note fields are requested
+    THEN only the requested fields of visible notes are returned, and the
+        version reads list the same notes
+    """
+    user = User(username="fields_user", password="password123")
+    other = User(username="fields_other", password="password123")
+    session.add_all([user, other])
+    session.commit()
+    own = Note(note_title="Own", note_text="Own text", author_id=user.user_id)
+    hidden = Note(note_title="Hidden", note_text="Hidden", author_id=other.user_id)
+    shared = Note(
+        note_title="Shared",
+        note_text="Shared",
+        author_id=other.user_id,
+        is_public=True,
+    )
+    session.add_all([own, hidden, shared])
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            page = get_note_fields_for_user(user.user_id, ["title"], 1, 10)
+            after = get_note_fields_for_user_after(
+                user.user_id, ["author", "public"], own.note_id, 10
+            )
+            by_id = get_note_fields_by_id(user.user_id, own.note_id, ["text"])
+            not_visible = get_note_fields_by_id(user.user_id, hidden.note_id, ["text"])
+            versions = get_note_versions_for_user(user.user_id, 1, 10)
+            versions_after = get_note_versions_for_user_after(
+                user.user_id, own.note_id, 10
+            )
+
+        assert [note_row_to_dict(row) for row in page] == [
+            {"note_id": own.note_id, "title": "Own"},
+            {"note_id": shared.note_id, "title": "Shared"},
+        ]
+        assert [note_row_to_dict(row) for row in after] == [
+            {"note_id": shared.note_id, "public": True, "author": "fields_other"}
+        ]
+        assert note_row_to_dict(by_id) == {"note_id": own.note_id, "text": "Own text"}
+        assert not_visible is None
+        assert [tuple(row) for row in versions] == [
+            (own.note_id, 1),
+            (shared.note_id, 1),
+        ]
+        assert [tuple(row) for row in versions_after] == [(shared.note_id, 1)]
+    finally:
+        session.execute(
+            sqlalchemy_delete(Note).where(
+                Note.author_id.in_([user.user_id, other.user_id])
+            )
+        )
+        session.delete(user)
+        session.delete(other)
+        session.commit()
+
+
+def test_stream_notes_for_user(engine, tables, session):
+    """
+    GIVEN public and private notes of two users
+    WHEN the visible notes are streamed in batches, from the start and resumed
+    THEN every visible note is returned once, in note ID order, in full
+    """
+    user = User(username="stream_user", password="password123")
+    other = User(username="stream_other", password="password123")
+    session.add_all([user, other])
+    session.commit()
+    notes = [
+        Note(
+            note_title=f"Note {i}",
+            note_text=f"Text {i}",
+            author_id=(user if i % 2 else other).user_id,
+            is_public=i % 3 == 0,
+        )
+        for i in range(1, 12)
+    ]
+    session.add_all(notes)
+    session.commit()
+    visible = [
+        note.note_id
+        for note in notes
+        if note.is_public or note.author_id == user.user_id
+    ]
+
+    Session = sessionmaker(bind=engine)
+    sessions = []
+
+    @contextmanager
+    def get_db(standalone=False):
+        assert standalone
+        db = Session()
+        sessions.append(db)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    selects = []
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_selects)
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            batches = list(stream_notes_for_user(user.user_id, 0, 2))
+            batch_selects, batch_sessions = len(selects), len(sessions)
+            resumed = list(stream_notes_for_user(user.user_id, visible[2], 2))
+
+        rows = [note_row_to_dict(row) for batch in batches for row in batch]
+        assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+        assert batch_selects == batch_sessions == 4
+        assert [row["note_id"] for row in rows] == visible
+        assert rows[0] == notes[0].to_dict()
+        assert [row.note_id for batch in resumed for row in batch] == visible[3:]
+    finally:
+        event.remove(engine, "before_cursor_execute", count_selects)
+        session.execute(
+            sqlalchemy_delete(Note).where(
+                Note.author_id.in_([user.user_id, other.user_id])
+            )
+        )
+        session.delete(user)
+        session.delete(other)
+        session.commit()
+
+
+def test_import_notes(engine, tables, session):
+    """
+    GIVEN a batch of notes, two of them with the same text
+    WHEN they are imported
+    THEN they are inserted on a standalone session and share their body
+    """
+    user = User(username="import_user", password="password123")
+    session.add(user)
+    session.commit()
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        assert standalone
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            assert import_notes(user.user_id, []) == 0
+            assert (
+                import_notes(
+                    user.user_id,
+                    [
+                        ("One", "Shared", False),
+                        ("Two", "Shared", True),
+                        ("Three", "x", False),
+                    ],
+                )
+                == 3
+            )
+
+        session.expire_all()
+        db_notes = (
+            session.execute(
+                select(Note)
+                .where(Note.author_id == user.user_id)
+                .order_by(Note.note_id)
+            )
+            .scalars()
+            .all()
+        )
+        assert [
+            (db_note.note_title, db_note.note_text, db_note.is_public)
+            for db_note in db_notes
+        ] == [("One", "Shared", False), ("Two", "Shared", True), ("Three", "x", False)]
+        assert db_notes[0].content_hash == db_notes[1].content_hash
+        assert db_notes[0].content.ref_count == 2
+        assert db_notes[0].created_at is not None
+    finally:
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
+
+
+def test_compressed_notes_in_column_level_reads(engine, tables, session):
+    """
+    GIVEN a note whose text is stored compressed
+    WHEN its summary and text field are selected
+    THEN the summary reports the original length and a preview excerpt, and the
+    text field is decoded
+    """
+    user = User(username="compressed_user", password="password123")
+    session.add(user)
+    session.commit()
+    text = "INFO request handled in 12ms\n" * 200
+    note = Note(note_title="Log", note_text=text, author_id=user.user_id)
+    session.add(note)
+    session.commit()
+    assert note.storage_format == FORMAT_ZLIB
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            summary = get_note_summaries_for_user_after(
+                user.user_id, note.note_id - 1, 1, excerpt_length=10
+            )[0]
+            row = get_note_fields_by_id(user.user_id, note.note_id, ["text"])
+
+        assert summary.length == len(text)
+        assert summary.excerpt == text[:10]
+        assert note_row_to_dict(row) == {"note_id": note.note_id, "text": text}
+    finally:
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
+
+
+def test_backfill_note_storage(engine, tables, session):
+    """
+    GIVEN notes whose text is still stored inline
+    WHEN backfill_note_storage is called in batches
+    THEN each note points at a shared body and keeps its text, update time, and
+        version
+    """
+    user = User(username="backfill_user", password="password123")
+    session.add(user)
+    session.commit()
+    long_text = "DEBUG cache miss for key users:42\n" * 100
+    version = datetime(2024, 9, 25, 23, 59, 10)
+    legacy = [
+        {
+            "note_title": f"Legacy {i}",
+            "note_text": text,
+            "author_id": user.user_id,
+            "is_public": False,
+            "updated_at": version,
+        }
+        for i, text in enumerate(["short", long_text, long_text])
+    ]
+    session.execute(Note.__table__.insert(), legacy)
+    session.commit()
+    note_ids = (
+        session.execute(
+            select(Note.note_id)
+            .where(Note.author_id == user.user_id)
+            .order_by(Note.note_id)
+        )
+        .scalars()
+        .all()
+    )
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    try:
+        with patch("src.db.notes.get_db", get_db):
+            first = backfill_note_storage(note_ids[0] - 1, 2)
+            second = backfill_note_storage(first, 2)
+            done = backfill_note_storage(second, 2)
+
+        assert first == note_ids[1]
+        assert second == note_ids[2]
+        assert done is None
+
+        session.expire_all()
+        notes = (
+            session.execute(
+                select(Note)
+                .where(Note.author_id == user.user_id)
+                .order_by(Note.note_id)
+            )
+            .scalars()
+            .all()
+        )
+        assert [note.content_hash for note in notes] == [
+            hash_note_text("short"),
+            hash_note_text(long_text),
+            hash_note_text(long_text),
+        ]
+        assert all(note.plain_text is None and note.note_body is None for note in notes)
+        assert [note.content.storage_format for note in notes] == [
+            FORMAT_PLAIN,
+            FORMAT_ZLIB,
+            FORMAT_ZLIB,
+        ]
+        assert notes[1].content.ref_count == 2
+        assert [note.note_text for note in notes] == ["short", long_text, long_text]
+        assert all(note.updated_at == version for note in notes)
+        assert all(note.version == 1 for note in notes)
+    finally:
+        session.execute(sqlalchemy_delete(Note).where(Note.author_id == user.user_id))
+        session.delete(user)
+        session.commit()
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from src.db.refresh_tokens import (
+    _hash_token,
+    create_refresh_token,
+    rotate_refresh_token,
+)
+from src.exceptions.auth_exception import AuthException
+from src.models.refresh_token import RefreshToken
+from src.models.user import User
+
+
+@pytest.fixture
+def get_db(engine, tables):
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with patch("src.db.refresh_tokens.get_db", get_db):
+        yield get_db
+
+
+@pytest.fixture
+def user(session):
+    user = User(username="refresh_user", password="password123")
+    session.add(user)
+    session.commit()
+    yield user
+    session.delete(user)
+    session.commit()
+
+
+def _load(get_db, token):
+    with get_db() as db:
+        return db.execute(
+            select(RefreshToken).where(RefreshToken.token_hash == _hash_token(token))
+        ).scalar_one()
+
+
+def test_create_refresh_token_stores_digest(get_db, user):
+    """
+    GIVEN a user
+    WHEN create_refresh_token is called
+    THEN only a digest of the returned token is stored
+    """
+    token = create_refresh_token(user.user_id)
+
+    db_token = _load(get_db, token)
+    assert db_token.token_hash != token
+    assert db_token.user_id == user.user_id
+    assert db_token.used_at is None
+
+
+def test_rotate_refresh_token(get_db, user):
+    """
+    GIVEN a refresh token
+    WHEN rotate_refresh_token is called
+    THEN the old token is marked used and a new token in the same family is returned
+    """
+    token = create_refresh_token(user.user_id)
+
+    rotated_user, new_token = rotate_refresh_token(token)
+
+    assert rotated_user.username == "refresh_user"
+    assert new_token != token
+    old_db_token, new_db_token = _load(get_db, token), _load(get_db, new_token)
+    assert old_db_token.used_at is not None
+    assert new_db_token.family_id == old_db_token.family_id
+    assert new_db_token.used_at is None
+
+
+def test_rotate_refresh_token_reuse_revokes_family(get_db, user):
+    """
+    GIVEN a refresh token that has already been rotated
+    WHEN it is presented again
+    THEN the request is rejected and every token in its family is revoked
+    """
+    token = create_refresh_token(user.user_id)
+    _, new_token = rotate_refresh_token(token)
+
+    with pytest.raises(AuthException):
+        rotate_refresh_token(token)
+
+    assert _load(get_db, new_token).revoked_at is not None
+    with pytest.raises(AuthException):
+        rotate_refresh_token(new_token)
+
+
+def test_rotate_refresh_token_unknown(get_db, user):
+    """
+    GIVEN a token that was never issued
+    WHEN rotate_refresh_token is called
+    THEN an AuthException is raised
+    """
+    with pytest.raises(AuthException):
+        rotate_refresh_token("not-a-token")
+
+
+def test_rotate_refresh_token_expired(get_db, user):
+    """
+    GIVEN an expired refresh token
+    WHEN rotate_refresh_token is called
+    THEN an AuthException is raised and the family is left alone
+    """
+    with patch("src.db.refresh_tokens.settings") as mock_settings:
+        mock_settings.REFRESH_TOKEN_EXPIRES_SEC = -1
+        token = create_refresh_token(user.user_id)
+
+    with pytest.raises(AuthException):
+        rotate_refresh_token(token)
+    assert _load(get_db, token).revoked_at is None
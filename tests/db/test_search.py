@@ -0,0 +1,242 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+
+from src.db import search
+from src.db.compression import FORMAT_PLAIN
+from src.db.note_contents import purge_unreferenced_contents
+from src.db.notes import (
+    create_note,
+    create_notes,
+    delete_note,
+    search_notes_for_user,
+)
+from src.db.search import (
+    FULL_SYNC_SEC,
+    FullTextSearchBackend,
+    InvertedIndexSearchBackend,
+    get_search_backend,
+    note_search_terms,
+    tokenize,
+)
+from src.models.note_content import NoteContent
+from src.models.user import User
+
+
+def test_tokenize():
+    """
+    GIVEN text with mixed case, punctuation, and short words
+    WHEN it is tokenized
+    THEN lowercase terms of at least three characters are returned in order
+    """
+    assert tokenize("Gateway TIMEOUT at db-01: retry in 5s, retry!") == [
+        "gateway",
+        "timeout",
+        "retry",
+        "retry",
+    ]
+
+
+def test_note_search_terms():
+    """
+    GIVEN a repetitive note text
+    WHEN its search terms are built
+    THEN each distinct term appears once, in order of first appearance
+    """
+    assert note_search_terms("retry failed\nretry failed\nretry ok") == "retry failed"
+
+
+def test_fulltext_search_statement():
+    """
+    GIVEN the FULLTEXT backend and a cursor
+    WHEN a search is run
+    THEN titles and bodies are matched in natural language mode by separate
+    lookups, never OR-ed together across the join, their scores are added up,
+    visibility is applied, and results resume after the cursor in rank order
+    """
+    db = MagicMock()
+    db.execute.return_value = [(2500, 7)]
+
+    results = FullTextSearchBackend().search(
+        db, 1, ["gateway", "timeout"], (3000, 9), 5
+    )
+
+    assert results == [(2500, 7)]
+    sql = str(db.execute.call_args.args[0].compile(dialect=mysql.dialect()))
+    assert "MATCH (notes.note_title) AGAINST (%s IN NATURAL LANGUAGE MODE)" in sql
+    assert "MATCH (note_contents.search_terms) AGAINST" in sql
+    assert "FROM note_contents INNER JOIN notes" in sql
+    assert " UNION ALL " in sql
+    assert "OR (MATCH" not in sql
+    assert "sum(anon_2.score)" in sql and "GROUP BY anon_2.note_id" in sql
+    assert "notes.is_public = true OR notes.author_id = %s" in sql
+    assert "(anon_1.`rank`, anon_1.note_id) < (%s, %s)" in sql
+    assert "ORDER BY anon_1.`rank` DESC, anon_1.note_id DESC" in sql
+
+
+@pytest.mark.parametrize(
+    "configured, dialect, expected",
+    [
+        ("auto", "mysql", FullTextSearchBackend),
+        ("auto", "sqlite", InvertedIndexSearchBackend),
+        ("inverted_index", "mysql", InvertedIndexSearchBackend),
+    ],
+)
+def test_get_search_backend(configured, dialect, expected):
+    """
+    GIVEN a configured search backend and a database dialect
+    WHEN the search backend is requested
+    THEN the matching backend is returned
+    """
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = dialect
+    with patch.object(search.settings, "NOTES_SEARCH_BACKEND", configured):
+        assert isinstance(get_search_backend(db), expected)
+
+
+def test_get_search_backend_unknown():
+    """
+    GIVEN an unknown configured search backend
+    WHEN the search backend is requested
+    THEN ValueError is raised
+    """
+    with patch.object(search.settings, "NOTES_SEARCH_BACKEND", "elastic"):
+        with pytest.raises(ValueError):
+            get_search_backend(MagicMock())
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def add_content(session, content_hash: str, text: str, created_at: datetime):
+    content = NoteContent(
+        content_hash=content_hash,
+        storage_format=FORMAT_PLAIN,
+        plain_text=text,
+        text_length=len(text),
+        search_terms=note_search_terms(text),
+        created_at=created_at,
+    )
+    session.add(content)
+    session.commit()
+    return content
+
+
+def test_inverted_index_sync(engine, tables, session):
+    """
+    GIVEN an inverted index that has synced
+    WHEN bodies are stored, stored earlier but indexed later, or purged elsewhere
+    THEN searches only index the new ones, and the next full sync catches up
+    """
+    clock = FakeClock()
+    backend = InvertedIndexSearchBackend(clock)
+    stored_at = datetime(2024, 9, 25, 12, 0, 0)
+    purged = add_content(session, "sync-purged", "alpha words", stored_at)
+    backend._sync(session)
+    assert "sync-purged" in backend._terms
+
+    add_content(session, "sync-new", "bravo words", stored_at + timedelta(seconds=1))
+    old = add_content(
+        session, "sync-old", "charlie words", stored_at - timedelta(hours=1)
+    )
+    session.delete(purged)
+    session.commit()
+    clock.now += 1
+    backend._sync(session)
+    assert {"sync-purged", "sync-new"} <= backend._terms.keys()
+    assert "sync-old" not in backend._terms
+
+    clock.now += FULL_SYNC_SEC
+    backend._sync(session)
+    assert {"sync-new", "sync-old"} <= backend._terms.keys()
+    assert "sync-purged" not in backend._terms
+    assert "alpha" not in backend._postings
+
+    search.forget_note_contents(["sync-new"])
+    assert "sync-new" in backend._terms
+    with patch.dict(search._backends, {"inverted_index": backend}):
+        search.forget_note_contents(["sync-new", "sync-old"])
+    assert "sync-new" not in backend._terms and "bravo" not in backend._postings
+
+    session.delete(old)
+    session.delete(session.get(NoteContent, "sync-new"))
+    session.commit()
+
+
+def test_search_notes_for_user(engine, tables, session):
+    """
+    GIVEN public and private notes of two users
+    WHEN search_notes_for_user is called with the inverted index backend
+    THEN only visible matching notes are returned, title matches rank first,
+    pages resume after the cursor, and purged bodies drop out of the index
+    """
+    user = User(username="search_user", password="password123")
+    other = User(username="search_other", password="password123")
+    session.add_all([user, other])
+    session.commit()
+    trace = "upstream gateway timeout while calling billing\n" * 50
+
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db(standalone=False):
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with patch("src.db.notes.get_db", get_db), patch(
+        "src.db.note_contents.get_db", get_db
+    ), patch.object(search.settings, "NOTES_SEARCH_BACKEND", "inverted_index"):
+        body_hit, title_hit, miss = create_notes(
+            user.user_id,
+            [
+                ("Incident", trace, False),
+                ("Gateway timeout", "see runbook", False),
+                ("Groceries", "eggs and milk", False),
+            ],
+        )
+        public = create_note("Billing outage", trace, other.user_id, True)
+        private = create_note("Gateway timeout", trace, other.user_id, False)
+
+        results = search_notes_for_user(user.user_id, "gateway timeout", None, 10)
+        note_ids = [note.note_id for _, note in results]
+        assert note_ids == [title_hit.note_id, public.note_id, body_hit.note_id]
+        assert [rank for rank, _ in results] == sorted(
+            (rank for rank, _ in results), reverse=True
+        )
+
+        first_page = search_notes_for_user(user.user_id, "gateway timeout", None, 1)
+        rank, note = first_page[0]
+        rest = search_notes_for_user(
+            user.user_id, "gateway timeout", (rank, note.note_id), 10
+        )
+        assert [note.note_id for _, note in rest] == note_ids[1:]
+
+        assert search_notes_for_user(user.user_id, "of to", None, 10) == []
+        assert search_notes_for_user(user.user_id, "eggs", None, 10)[0][1] == miss
+
+        delete_note(user.user_id, miss.note_id)
+        purge_unreferenced_contents(10)
+        assert "eggs" not in search._backends["inverted_index"]._postings
+        assert search_notes_for_user(user.user_id, "eggs", None, 10) == []
+
+        for note in (body_hit, title_hit):
+            delete_note(user.user_id, note.note_id)
+        for note in (public, private):
+            delete_note(other.user_id, note.note_id)
+        purge_unreferenced_contents(10)
+
+    session.delete(user)
+    session.delete(other)
+    session.commit()
@@ -7,6 +7,7 @@ from src.models.user import User
 from src.exceptions.auth_exception import AuthException
 from src.exceptions.user_exists_exception import UserAlreadyExistsException
 from src.db.users import create_user, check_password
+from src.security.passwords import hash_password
 
 
 @patch("src.db.users.get_db")
@@ -24,7 +25,7 @@ def test_create_user_success(mock_get_db):
     new_user = create_user(username, password)
 
     assert new_user.username == username
-    assert new_user.password is not None
+    assert new_user.password.startswith("$pbkdf2-sha256$i=")
     mock_db.add.assert_called_once()
     mock_db.commit.assert_called_once()
     mock_db.refresh.assert_called_once_with(new_user)
@@ -68,6 +69,50 @@ def test_check_password_success(mock_get_db):
     assert returned_user == user
 
 
+@patch("src.db.users.get_db")
+def test_check_password_rehashes_legacy_hash(mock_get_db):
+    """
+    GIVEN a user whose password is stored in the legacy format
+    WHEN check_password is called with the correct password
+    THEN the stored hash is replaced with one in the current format
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    password = "password123"
+    salt = b"some_salt"
+    hashed_password = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100000)
+    encoded_password = base64.b64encode(hashed_password + salt).decode("utf-8")
+    user = User(user_id=1, username="testuser", password=encoded_password)
+    mock_db.query.return_value.filter.return_value.first.return_value = user
+
+    check_password("testuser", password)
+
+    assert user.password.startswith("$pbkdf2-sha256$")
+    mock_db.execute.assert_called_once()
+    mock_db.commit.assert_called_once()
+
+
+@patch("src.db.users.get_db")
+def test_check_password_current_hash_not_rehashed(mock_get_db):
+    """
+    GIVEN a user whose password hash uses the current parameters
+    WHEN check_password is called with the correct password
+    THEN the stored hash is left alone
+    """
+    mock_db = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_db
+
+    encoded_password = hash_password("password123")
+    user = User(user_id=1, username="testuser", password=encoded_password)
+    mock_db.query.return_value.filter.return_value.first.return_value = user
+
+    check_password("testuser", "password123")
+
+    assert user.password == encoded_password
+    mock_db.execute.assert_not_called()
+
+
 @patch("src.db.users.get_db")
 def test_check_password_invalid_username(mock_get_db):
     """
@@ -1,8 +1,12 @@
+import zlib
 import pytest
 import random
 from string import ascii_letters
+from sqlalchemy import select
 from src.models.user import User
-from src.models.note import Note
+from src.db.compression import FORMAT_ZLIB, PREVIEW_LENGTH
+from src.models.note import NOTE_RECORD_COLUMNS, Note, note_records
+from src.models.note_content import NoteContent
 
 
 @pytest.fixture(scope="function")
@@ -106,3 +110,94 @@ def test_delete_user_deletes_notes(session, note_author):
         session.query(Note).filter_by(note_title="Note to be deleted").first()
     )
     assert deleted_note is None
+
+
+def test_note_text_compressed_at_rest(session, note_author):
+    """
+    GIVEN a Note with text above the compression threshold
+    WHEN it is stored and read back
+    THEN the text is stored compressed with a plain preview and decoded on access
+    """
+    text = "2024-09-25 23:46:27 ERROR something failed\n" * 200
+    note = Note(
+        author_id=note_author.user_id,
+        note_title="Compressed Note",
+        note_text=text,
+        is_public=False,
+    )
+    session.add(note)
+    session.commit()
+
+    retrieved_note = session.query(Note).filter_by(note_title="Compressed Note").first()
+    assert retrieved_note.storage_format == FORMAT_ZLIB
+    assert len(retrieved_note.note_body) < len(text) // 5
+    assert retrieved_note.plain_text == text[:PREVIEW_LENGTH]
+    assert retrieved_note.text_length == len(text)
+    assert retrieved_note.note_text == text
+    assert retrieved_note.to_dict()["text"] == text
+
+
+def test_note_reads_shared_content(session, note_author):
+    """
+    GIVEN a NoteContent body and a Note pointing at it
+    WHEN the note is loaded
+    THEN its text comes from the shared body and nothing is stored inline
+    """
+    text = "ERROR connection reset by peer\n" * 100
+    content = NoteContent(
+        content_hash="f" * 64,
+        storage_format=FORMAT_ZLIB,
+        plain_text=text[:PREVIEW_LENGTH],
+        note_body=zlib.compress(text.encode("utf-8")),
+        text_length=len(text),
+        ref_count=1,
+    )
+    session.add(content)
+    session.commit()
+    note = Note(
+        author_id=note_author.user_id,
+        note_title="Shared Note",
+        content_hash=content.content_hash,
+    )
+    session.add(note)
+    session.commit()
+    session.expire_all()
+
+    retrieved_note = session.query(Note).filter_by(note_title="Shared Note").one()
+    assert retrieved_note.content.ref_count == 1
+    assert retrieved_note.note_text == text
+    assert retrieved_note.plain_text is None
+
+
+def test_note_record(session, note_author):
+    """
+    GIVEN a stored Note
+    WHEN its columns are read back as a NoteRecord
+    THEN the record equals the note, has the same dict form, and has no
+    instance dict
+
+    :param session: Pytest fixture for SQLAlchemy session
+    :return:
+    """
+    note = Note(
+        author_id=note_author.user_id,
+        note_title="Record Note",
+        note_text="INFO ready\n" * 200,
+        is_public=True,
+    )
+    session.add(note)
+    session.commit()
+
+    (record,) = note_records(
+        session.execute(
+            select(*NOTE_RECORD_COLUMNS)
+            .join(User, Note.author_id == User.user_id)
+            .outerjoin(NoteContent, Note.content_hash == NoteContent.content_hash)
+            .where(Note.note_id == note.note_id)
+        )
+    )
+    assert record == note
+    assert record.to_dict() == note.to_dict()
+    assert record.author == note_author.username
+    assert not hasattr(record, "__dict__")
+    assert repr(record).startswith(f"<NoteRecord(note_id={note.note_id}, ")
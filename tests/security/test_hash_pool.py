@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from src.exceptions.hash_pool_saturated_exception import HashPoolSaturatedException
+from src.security.hash_pool import POOL_IN_FLIGHT, POOL_REJECTED, HashPool
+
+
+def test_run_returns_result():
+    """
+    GIVEN a hash pool
+    WHEN a function is run on it
+    THEN its return value is returned to the caller
+    """
+    pool = HashPool(max_workers=1, max_queue=0)
+
+    assert pool.run(pow, 2, 10) == 1024
+
+
+def test_run_propagates_exceptions():
+    """
+    GIVEN a hash pool
+    WHEN the function run on it raises
+    THEN the exception is raised to the caller and the slot is released
+    """
+    pool = HashPool(max_workers=1, max_queue=0)
+
+    with pytest.raises(ZeroDivisionError):
+        pool.run(divmod, 1, 0)
+    assert pool.run(pow, 2, 2) == 4
+
+
+def test_run_rejects_when_saturated():
+    """
+    GIVEN a hash pool whose workers and queue are all busy
+    WHEN another job is submitted
+    THEN it is rejected immediately with HashPoolSaturatedException
+    """
+    pool = HashPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    running = threading.Thread(target=pool.run, args=(block,))
+    queued = threading.Thread(target=pool.run, args=(lambda: None,))
+    running.start()
+    started.wait(5)
+    queued.start()
+
+    rejected_before = POOL_REJECTED.value
+    try:
+        while POOL_IN_FLIGHT.value < 2:
+            pass
+        with pytest.raises(HashPoolSaturatedException):
+            pool.run(pow, 2, 2)
+        assert POOL_REJECTED.value == rejected_before + 1
+    finally:
+        release.set()
+        running.join(5)
+        queued.join(5)
+
+    assert pool.run(pow, 2, 2) == 4
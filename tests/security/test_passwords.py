@@ -0,0 +1,88 @@
+import base64
+import hashlib
+from unittest.mock import patch
+
+from src.security.passwords import (
+    LEGACY_ITERATIONS,
+    calibrate_iterations,
+    hash_password,
+    needs_rehash,
+    verify_password,
+)
+
+
+def test_hash_password_format():
+    """
+    GIVEN a password
+    WHEN hash_password is called
+    THEN the result names the algorithm and its cost and verifies the password
+    """
+    encoded = hash_password("password123", iterations=1000)
+
+    assert encoded.startswith("$pbkdf2-sha256$i=1000$")
+    assert len(encoded.split("$")) == 5
+    assert verify_password("password123", encoded)
+    assert not verify_password("wrongpassword", encoded)
+
+
+def test_hash_password_salted():
+    """
+    GIVEN the same password
+    WHEN hash_password is called twice
+    THEN different salts are used
+    """
+    assert hash_password("password123", 1000) != hash_password("password123", 1000)
+
+
+def test_verify_password_legacy_format():
+    """
+    GIVEN a password stored in the legacy base64(hash + salt) format
+    WHEN verify_password is called
+    THEN the password is checked with the legacy cost
+    """
+    salt = b"some_salt"
+    hashed = hashlib.pbkdf2_hmac("sha256", b"password123", salt, LEGACY_ITERATIONS)
+    encoded = base64.b64encode(hashed + salt).decode("utf-8")
+
+    assert verify_password("password123", encoded)
+    assert not verify_password("wrongpassword", encoded)
+
+
+@patch("src.security.passwords.settings")
+def test_needs_rehash(mock_settings):
+    """
+    GIVEN stored hashes in several formats
+    WHEN needs_rehash is called
+    THEN only hashes with the current format and cost are kept
+    """
+    mock_settings.PASSWORD_HASH_ITERATIONS = 1000
+    legacy = base64.b64encode(b"\0" * 32 + b"\1" * 16).decode("utf-8")
+
+    assert not needs_rehash(hash_password("password123", 1000))
+    assert needs_rehash(hash_password("password123", 2000))
+    assert needs_rehash(legacy)
+
+
+@patch("src.security.passwords.time.perf_counter")
+def test_calibrate_iterations(mock_perf_counter):
+    """
+    GIVEN a CPU that takes 10ms for the probe hash
+    WHEN calibrate_iterations is called
+    THEN the iteration count is scaled to the target time
+    """
+    # Each probe reads the clock twice: 10ms apart
+    mock_perf_counter.side_effect = [0.0, 0.01] * 3
+
+    assert calibrate_iterations(250, samples=3) == 500000
+
+
+@patch("src.security.passwords.time.perf_counter")
+def test_calibrate_iterations_floor(mock_perf_counter):
+    """
+    GIVEN a target below the legacy cost
+    WHEN calibrate_iterations is called
+    THEN the legacy iteration count is returned
+    """
+    mock_perf_counter.side_effect = [0.0, 0.01]
+
+    assert calibrate_iterations(1, samples=1) == LEGACY_ITERATIONS
@@ -1,10 +1,18 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+
 from flask.testing import FlaskClient
 import pytest
 from unittest.mock import Mock, patch
 from flask import json
 from flask_jwt_extended import create_access_token
+from werkzeug.http import http_date
+from src.api.etag import listing_etag
 from src.app import create_app
 from src.exceptions.auth_exception import AuthException
+from src.exceptions.hash_pool_saturated_exception import HashPoolSaturatedException
+from src.exceptions.invalid_cursor_exception import InvalidCursorException
+from src.exceptions.stale_note_exception import StaleNoteException
 from src.exceptions.user_exists_exception import UserAlreadyExistsException
 
 
@@ -14,6 +22,8 @@ from src.exceptions.user_exists_exception import UserAlreadyExistsException
 def test_create_app(mock_user_service, mock_note_service, mock_settings):
     jwt_secret = "123abc"
     mock_settings.JWT_SECRET_KEY = jwt_secret
+    mock_settings.ACCESS_TOKEN_EXPIRES_SEC = 900
+    mock_settings.JSON_BACKEND = "auto"
 
     app = create_app(mock_user_service, mock_note_service, mock_settings)
 
@@ -25,7 +35,9 @@ def test_create_app(mock_user_service, mock_note_service, mock_settings):
 def test_register_user_success(client: FlaskClient, app):
     with app.app_context():
         with patch.object(
-            client.application.user_service, "register_user", return_value="test_token"
+            client.application.user_service,
+            "register_user",
+            return_value=("test_token", "test_refresh_token"),
         ):
 
             response = client.post(
@@ -34,6 +46,7 @@ def test_register_user_success(client: FlaskClient, app):
             )
             assert response.status_code == 200
             assert "access_token" in json.loads(response.data)
+            assert json.loads(response.data)["refresh_token"] == "test_refresh_token"
 
 
 def test_register_user_missing_data(client: FlaskClient):
@@ -72,15 +85,31 @@ def test_register_user_unknown_error(client: FlaskClient):
         assert b"Internal Server Error" in response.data
 
 
+def test_register_user_hash_pool_saturated(client: FlaskClient):
+    with patch.object(
+        client.application.user_service,
+        "register_user",
+        side_effect=HashPoolSaturatedException("saturated"),
+    ):
+        response = client.post(
+            "/v1/register_user", json={"username": "testuser", "password": "testpass"}
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
 def test_login_success(client: FlaskClient):
     with patch.object(
-        client.application.user_service, "login", return_value="test_token"
+        client.application.user_service,
+        "login",
+        return_value=("test_token", "test_refresh_token"),
     ):
         response = client.post(
             "/v1/login", json={"username": "testuser", "password": "testpass"}
         )
         assert response.status_code == 200
         assert "access_token" in json.loads(response.data)
+        assert json.loads(response.data)["refresh_token"] == "test_refresh_token"
 
 
 def test_login_missing_username(client: FlaskClient):
@@ -123,6 +152,137 @@ def test_login_invalid_credentials(client: FlaskClient):
         assert b"Invalid username or password" in response.data
 
 
+def test_login_hash_pool_saturated(client: FlaskClient):
+    with patch.object(
+        client.application.user_service,
+        "login",
+        side_effect=HashPoolSaturatedException("saturated"),
+    ):
+        response = client.post(
+            "/v1/login", json={"username": "testuser", "password": "testpass"}
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+def test_calibrate_password_hash(app):
+    with patch("src.app.calibrate_iterations", return_value=250000) as mock_calibrate:
+        result = app.test_cli_runner().invoke(
+            args=["calibrate-password-hash", "--target-ms", "50"]
+        )
+        assert result.exit_code == 0
+        assert "PASSWORD_HASH_ITERATIONS=250000" in result.output
+        mock_calibrate.assert_called_once_with(50.0)
+
+
+def test_backfill_note_storage(app):
+    with patch.object(
+        app.note_service, "backfill_note_storage", side_effect=[3, 7, None]
+    ) as mock_backfill:
+        result = app.test_cli_runner().invoke(
+            args=["backfill-note-storage", "--batch-size", "3"]
+        )
+        assert result.exit_code == 0
+        assert "up to note 7" in result.output
+        assert "Backfill complete" in result.output
+        assert mock_backfill.call_args_list == [
+            ((0, 3),),
+            ((3, 3),),
+            ((7, 3),),
+        ]
+
+
+def test_index_note_contents(app):
+    with patch.object(
+        app.note_service, "index_note_contents", side_effect=[5, 0]
+    ) as mock_index:
+        result = app.test_cli_runner().invoke(args=["index-note-contents"])
+        assert result.exit_code == 0
+        assert "Indexed 5 note bodies" in result.output
+        assert mock_index.call_args_list == [((500,),), ((500,),)]
+
+
+def test_purge_note_contents(app):
+    with patch.object(
+        app.note_service, "purge_note_contents", side_effect=[2, 1, 0]
+    ) as mock_purge:
+        result = app.test_cli_runner().invoke(
+            args=["purge-note-contents", "--batch-size", "2"]
+        )
+        assert result.exit_code == 0
+        assert "Purged 3 unreferenced note bodies" in result.output
+        assert mock_purge.call_count == 3
+
+
+def test_note_storage_stats(app):
+    with patch.object(
+        app.note_service,
+        "get_note_storage_stats",
+        return_value={"contents": 2, "dedup_ratio": 2.5},
+    ):
+        result = app.test_cli_runner().invoke(args=["note-storage-stats"])
+        assert result.exit_code == 0
+        assert "contents=2\ndedup_ratio=2.50\n" in result.output
+
+
+def test_refresh_token_success(client: FlaskClient):
+    with patch.object(
+        client.application.user_service,
+        "refresh",
+        return_value=("new_access_token", "new_refresh_token"),
+    ) as mock_refresh:
+        response = client.post(
+            "/v1/token/refresh", json={"refresh_token": "old_refresh_token"}
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data) == {
+            "access_token": "new_access_token",
+            "refresh_token": "new_refresh_token",
+        }
+        mock_refresh.assert_called_once_with("old_refresh_token")
+
+
+def test_refresh_token_missing(client: FlaskClient):
+    response = client.post("/v1/token/refresh", json={})
+    assert response.status_code == 400
+    assert b"Missing refresh_token" in response.data
+
+
+def test_refresh_token_not_json(client: FlaskClient):
+    response = client.post("/v1/token/refresh", data="not json")
+    assert response.status_code == 415
+
+
+def test_refresh_token_invalid(client: FlaskClient):
+    with patch.object(
+        client.application.user_service,
+        "refresh",
+        side_effect=AuthException("Invalid refresh token"),
+    ):
+        response = client.post(
+            "/v1/token/refresh", json={"refresh_token": "reused_refresh_token"}
+        )
+        assert response.status_code == 401
+        assert b"Invalid refresh token" in response.data
+
+
+def test_refresh_token_unknown_error(client: FlaskClient):
+    with patch.object(
+        client.application.user_service, "refresh", side_effect=Exception
+    ):
+        response = client.post(
+            "/v1/token/refresh", json={"refresh_token": "refresh_token"}
+        )
+        assert response.status_code == 500
+
+
+def test_metrics(client: FlaskClient):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"password_hash_pool_in_flight" in response.data
+
+
 @pytest.mark.parametrize(
     "route,method",
     [
@@ -177,6 +337,107 @@ def test_get_notes_success(client: FlaskClient, app):
             )
             assert response.status_code == 200
             assert len(json.loads(response.data)) == 1
+            assert "ETag" in response.headers
+
+
+def test_get_notes_compressed(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        mock_notes = []
+        for note_id in range(1, 101):
+            mock_note = Mock(note_id=note_id, updated_at=datetime(2024, 9, 25))
+            mock_note.to_dict.return_value = {
+                "note_id": note_id,
+                "title": "Test Note",
+                "text": "This is a test note",
+            }
+            mock_notes.append(mock_note)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_notes", return_value=mock_notes
+        ):
+            response = client.get(
+                "/v1/notes?page_size=100",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Accept-Encoding": "gzip",
+                },
+            )
+            assert response.status_code == 200
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.headers["Vary"] == "Accept-Encoding"
+            assert len(json.loads(gzip.decompress(response.data))) == 100
+
+
+def test_get_notes_conditional(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        versions = [(1, 3)]
+        mock_note = Mock(note_id=1, version=3)
+        mock_note.to_dict.return_value = {"note_id": 1}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_notes", return_value=[mock_note]
+        ) as mock_get_notes, patch.object(
+            client.application.note_service,
+            "get_note_versions",
+            return_value=versions,
+        ) as mock_get_note_versions:
+            response = client.get(
+                "/v1/notes?page=2", headers={"Authorization": f"Bearer {access_token}"}
+            )
+            etag = response.headers["ETag"]
+
+            response = client.get(
+                "/v1/notes?page=2",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-None-Match": etag,
+                },
+            )
+            assert response.status_code == 304
+            assert response.headers["ETag"] == etag
+            mock_get_notes.assert_called_once_with(1, 2, 10)
+            mock_get_note_versions.assert_called_once_with(1, 2, 10)
+
+            # Same IDs, but the note was written again
+            mock_get_note_versions.return_value = [(1, 4)]
+            response = client.get(
+                "/v1/notes?page=2",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-None-Match": etag,
+                },
+            )
+            assert response.status_code == 200
+            assert mock_get_notes.call_count == 2
+
+
+def test_get_notes_cursor_conditional(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        versions = [(1, 3)]
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_versions_page",
+            return_value=(versions, "WzFd"),
+        ) as mock_get_note_versions_page, patch.object(
+            client.application.note_service, "get_notes_page"
+        ) as mock_get_notes_page:
+            response = client.get(
+                "/v1/notes?cursor=",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-None-Match": listing_etag(versions, "WzFd"),
+                },
+            )
+            assert response.status_code == 304
+            mock_get_note_versions_page.assert_called_once_with(1, "", 10)
+            mock_get_notes_page.assert_not_called()
 
 
 def test_get_notes_invalid_page_size(client: FlaskClient):
@@ -215,6 +476,423 @@ def test_get_notes_value_error(client: FlaskClient):
     assert b"Invalid page or page_size" in response.data
 
 
+def test_get_notes_cursor_success(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        mock_note = Mock()
+        mock_note.to_dict.return_value = {
+            "id": 1,
+            "title": "Test Note",
+            "text": "This is a test note",
+        }
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_notes_page",
+            return_value=([mock_note], "next"),
+        ) as mock_get_notes_page:
+            response = client.get(
+                "/v1/notes?cursor=&page_size=5",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert len(data["notes"]) == 1
+            assert data["next_cursor"] == "next"
+            mock_get_notes_page.assert_called_once_with(1, "", 5)
+
+
+def test_search_notes(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        note = Mock()
+        note.to_dict.return_value = {"note_id": 4, "title": "Timeout"}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "search_notes",
+            return_value=([note], "WzkwMCw0XQ"),
+        ) as mock_search_notes:
+            response = client.get(
+                "/v1/notes/search?q=gateway+timeout&page_size=5&cursor=abc",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert json.loads(response.data) == {
+                "notes": [{"note_id": 4, "title": "Timeout"}],
+                "next_cursor": "WzkwMCw0XQ",
+            }
+            mock_search_notes.assert_called_once_with(1, "gateway timeout", "abc", 5)
+
+
+@pytest.mark.parametrize(
+    "query_string, error",
+    [
+        ("", "Missing search query"),
+        ("q=+", "Missing search query"),
+        ("q=timeout&page_size=0", "Invalid page_size"),
+        ("q=timeout&page_size=abc", "Invalid page_size"),
+    ],
+)
+def test_search_notes_bad_request(client: FlaskClient, app, query_string, error):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "search_notes"
+        ) as mock_search_notes:
+            response = client.get(
+                f"/v1/notes/search?{query_string}",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 400
+            assert error.encode() in response.data
+            mock_search_notes.assert_not_called()
+
+
+def test_search_notes_invalid_cursor(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "search_notes",
+            side_effect=InvalidCursorException("Invalid cursor"),
+        ):
+            response = client.get(
+                "/v1/notes/search?q=timeout&cursor=bad",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 400
+            assert b"Invalid cursor" in response.data
+
+
+def test_export_notes(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        batches = [[{"note_id": 4}, {"note_id": 5}], [{"note_id": 9}]]
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "export_notes",
+            return_value=(batch for batch in batches),
+        ) as mock_export_notes:
+            response = client.get(
+                "/v1/notes/export?after=3",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert response.mimetype == "application/x-ndjson"
+            assert response.is_streamed
+            lines = response.data.decode().splitlines()
+            assert [json.loads(line) for line in lines] == batches[0] + batches[1]
+            mock_export_notes.assert_called_once_with(1, 3, 2)
+
+
+def test_export_notes_truncated_on_error(client: FlaskClient, app):
+    def batches():
+        yield [{"note_id": 4}]
+        raise RuntimeError("Lost connection")
+
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "export_notes", return_value=batches()
+        ):
+            response = client.get(
+                "/v1/notes/export",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert response.data == b'{"note_id": 4}\n'
+
+
+@pytest.mark.parametrize("after", ["abc", "-1"])
+def test_export_notes_bad_request(client: FlaskClient, app, after):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "export_notes"
+        ) as mock_export_notes:
+            response = client.get(
+                f"/v1/notes/export?after={after}",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 400
+            assert b"Invalid after" in response.data
+            mock_export_notes.assert_not_called()
+
+
+def test_import_notes(client: FlaskClient, app):
+    body = b"\n".join(
+        [
+            b'{"title": "A", "text": "One"}',
+            b"",
+            b'{"title": "B", "text": "Two", "public": true}',
+            b"not json",
+            b'{"title": "C", "text": "Three"}',
+            b'{"title": "D"}',
+            b'{"title": "E", "text": "Five", "public": "yes"}',
+            b'["F", "Six"]',
+            b'{"title": "G", "text": "Seven"}',
+        ]
+    )
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "import_notes",
+            side_effect=lambda author_id, notes: len(notes),
+        ) as mock_import_notes:
+            response = client.post(
+                "/v1/notes/import",
+                data=body,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/x-ndjson",
+                },
+            )
+            assert response.status_code == 200
+            result = json.loads(response.data)
+            assert result["imported"] == 4
+            assert result["failed"] == 4
+            assert [error["line"] for error in result["errors"]] == [4, 6, 7, 8]
+            assert "Invalid JSON" in result["errors"][0]["error"]
+            assert "Missing note title or text" in result["errors"][1]["error"]
+            assert "Invalid public" in result["errors"][2]["error"]
+            assert "Note must be an object" in result["errors"][3]["error"]
+            assert [call.args for call in mock_import_notes.call_args_list] == [
+                (1, [("A", "One", False), ("B", "Two", True)]),
+                (1, [("C", "Three", False), ("G", "Seven", False)]),
+                (1, []),
+            ]
+
+
+def test_import_notes_line_too_long(client: FlaskClient, app, monkeypatch):
+    monkeypatch.setattr("src.app.MAX_IMPORT_LINE_BYTES", 40)
+    body = (
+        b'{"title": "' + b"x" * 100 + b'", "text": "Long"}\n'
+        b'{"title": "A", "text": "Short"}'
+    )
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "import_notes",
+            side_effect=lambda author_id, notes: len(notes),
+        ) as mock_import_notes:
+            response = client.post(
+                "/v1/notes/import",
+                data=body,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/x-ndjson",
+                },
+            )
+            result = json.loads(response.data)
+            assert result["imported"] == 1
+            assert result["errors"][0]["line"] == 1
+            assert "Line too long" in result["errors"][0]["error"]
+            mock_import_notes.assert_called_once_with(1, [("A", "Short", False)])
+
+
+def test_import_notes_unsupported_media_type(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "import_notes"
+        ) as mock_import_notes:
+            response = client.post(
+                "/v1/notes/import",
+                json={"title": "A", "text": "One"},
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 415
+            mock_import_notes.assert_not_called()
+
+
+def test_import_notes_reports_progress_on_error(client: FlaskClient, app):
+    body = b'{"title": "A", "text": "One"}\n' * 3
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "import_notes",
+            side_effect=[2, Exception("Database error")],
+        ):
+            response = client.post(
+                "/v1/notes/import",
+                data=body,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/x-ndjson",
+                },
+            )
+            assert response.status_code == 500
+            assert json.loads(response.data) == {
+                "error": "Internal Server Error",
+                "imported": 2,
+            }
+
+
+def test_get_notes_summary(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        summary = Mock()
+        summary._mapping = {
+            "note_id": 1,
+            "title": "Test Note",
+            "updated_at": datetime(2024, 9, 26, 8, 30, 0),
+            "length": 19,
+            "excerpt": "This is",
+        }
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_summaries",
+            return_value=[summary],
+        ) as mock_get_note_summaries:
+            response = client.get(
+                "/v1/notes?view=summary&excerpt=true&page=2",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data == [
+                {
+                    "note_id": 1,
+                    "title": "Test Note",
+                    "updated_at": "2024-09-26T08:30:00",
+                    "length": 19,
+                    "excerpt": "This is",
+                }
+            ]
+            mock_get_note_summaries.assert_called_once_with(1, 2, 10, 200)
+
+
+def test_get_notes_summary_cursor(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_summaries_page",
+            return_value=([], None),
+        ) as mock_get_note_summaries_page:
+            response = client.get(
+                "/v1/notes?view=summary&cursor=",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert json.loads(response.data) == {"notes": [], "next_cursor": None}
+            mock_get_note_summaries_page.assert_called_once_with(1, "", 10, 0)
+
+
+def test_get_notes_invalid_view(client: FlaskClient):
+    access_token = create_access_token(identity=1)
+    with patch.object(
+        client.application.user_service, "get_user_id_from_token", return_value=1
+    ):
+        response = client.get(
+            "/v1/notes?view=everything",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        assert response.status_code == 400
+        assert b"Invalid view" in response.data
+
+
+def test_get_notes_fields(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        row = Mock()
+        row._mapping = {"note_id": 1, "title": "Test Note"}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_note_fields", return_value=[row]
+        ) as mock_get_note_fields:
+            response = client.get(
+                "/v1/notes?fields=updated_at,title",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert json.loads(response.data) == [{"note_id": 1, "title": "Test Note"}]
+            mock_get_note_fields.assert_called_once_with(
+                1, ["title", "updated_at"], 1, 10
+            )
+
+
+def test_get_notes_fields_cursor(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_fields_page",
+            return_value=([], None),
+        ) as mock_get_note_fields_page:
+            response = client.get(
+                "/v1/notes?fields=note_id&cursor=",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            mock_get_note_fields_page.assert_called_once_with(1, ["note_id"], "", 10)
+
+
+@pytest.mark.parametrize(
+    "query", ["fields=", "fields=title,password", "fields=title&view=summary"]
+)
+def test_get_notes_invalid_fields(client: FlaskClient, query):
+    access_token = create_access_token(identity=1)
+    with patch.object(
+        client.application.user_service, "get_user_id_from_token", return_value=1
+    ):
+        response = client.get(
+            f"/v1/notes?{query}",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        assert response.status_code == 400
+        assert b"Bad request" in response.data
+
+
+def test_get_notes_invalid_cursor(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_notes_page",
+            side_effect=InvalidCursorException("Invalid cursor"),
+        ):
+            response = client.get(
+                "/v1/notes?cursor=garbage",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 400
+            assert b"Invalid cursor" in response.data
+
+
 def test_get_notes_unknown_error(client: FlaskClient):
     access_token = create_access_token(identity=1)
     with patch.object(
@@ -227,6 +905,40 @@ def test_get_notes_unknown_error(client: FlaskClient):
         assert b"Internal Server Error" in response.data
 
 
+def test_get_note_by_id_fields(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        row = Mock()
+        row._mapping = {"note_id": 1, "author": "ASDF"}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_note_fields_by_id", return_value=row
+        ) as mock_get_note_fields_by_id:
+            response = client.get(
+                "/v1/notes/1?fields=author",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            assert json.loads(response.data) == {"note_id": 1, "author": "ASDF"}
+            mock_get_note_fields_by_id.assert_called_once_with(1, 1, ["author"])
+
+
+def test_get_note_by_id_fields_not_found(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_note_fields_by_id", return_value=None
+        ):
+            response = client.get(
+                "/v1/notes/1?fields=title",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 404
+
+
 def test_get_note_by_id_success(client: FlaskClient, app):
     with app.app_context():
         access_token = create_access_token(identity=1)
@@ -236,6 +948,9 @@ def test_get_note_by_id_success(client: FlaskClient, app):
             "title": "Test Note",
             "text": "This is a test note",
         }
+        mock_note.note_id = 1
+        mock_note.updated_at = datetime(2024, 9, 25, 23, 59, 10)
+        mock_note.version = 3
         with patch.object(
             client.application.user_service, "get_user_id_from_token", return_value=1
         ), patch.object(
@@ -246,6 +961,130 @@ def test_get_note_by_id_success(client: FlaskClient, app):
             )
             assert response.status_code == 200
             assert json.loads(response.data)["id"] == 1
+            assert response.headers["ETag"] == '"1-3"'
+            assert response.headers["Last-Modified"] == "Wed, 25 Sep 2024 23:59:10 GMT"
+
+
+@pytest.mark.parametrize(
+    "headers, status",
+    [
+        ({"If-None-Match": '"1-3"'}, 304),
+        ({"If-None-Match": 'W/"1-3", "other"'}, 304),
+        ({"If-None-Match": '"1-2"'}, 200),
+        ({"If-Modified-Since": "Wed, 25 Sep 2024 23:59:10 GMT"}, 304),
+        ({"If-Modified-Since": "Wed, 25 Sep 2024 23:59:09 GMT"}, 200),
+        (
+            {
+                "If-None-Match": '"stale"',
+                "If-Modified-Since": "Wed, 25 Sep 2024 23:59:10 GMT",
+            },
+            200,
+        ),
+    ],
+)
+def test_get_note_by_id_conditional(client: FlaskClient, app, headers, status):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        updated_at = datetime(2024, 9, 25, 23, 59, 10)
+        mock_note = Mock(note_id=1, updated_at=updated_at, version=3)
+        mock_note.to_dict.return_value = {"note_id": 1}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_version",
+            return_value=(3, updated_at),
+        ) as mock_get_note_version, patch.object(
+            client.application.note_service, "get_note_by_id", return_value=mock_note
+        ) as mock_get_note_by_id:
+            response = client.get(
+                "/v1/notes/1",
+                headers={"Authorization": f"Bearer {access_token}", **headers},
+            )
+            assert response.status_code == status
+            assert response.headers["ETag"] == '"1-3"'
+            mock_get_note_version.assert_called_once_with(1, 1)
+            if status == 304:
+                assert response.data == b""
+                mock_get_note_by_id.assert_not_called()
+
+
+def test_get_note_by_id_conditional_coded_etag(client: FlaskClient, app):
+    """
+    GIVEN the ETag a note had in a gzip response
+    WHEN it is sent back in If-None-Match
+    THEN a 304 is returned with that same ETag
+    """
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        updated_at = datetime(2024, 9, 25, 23, 59, 10)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_version",
+            return_value=(3, updated_at),
+        ):
+            response = client.get(
+                "/v1/notes/1",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-None-Match": '"1-2-gzip", "1-3-gzip"',
+                },
+            )
+            assert response.status_code == 304
+            assert response.headers["ETag"] == '"1-3-gzip"'
+
+
+def test_get_note_by_id_updated_this_second(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        # As late as the current second; a later write could still keep it
+        updated_at = datetime.now(timezone.utc).replace(
+            microsecond=0, tzinfo=None
+        ) + timedelta(seconds=1)
+        mock_note = Mock(note_id=1, updated_at=updated_at, version=3)
+        mock_note.to_dict.return_value = {"note_id": 1}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_version",
+            return_value=(3, updated_at),
+        ), patch.object(
+            client.application.note_service, "get_note_by_id", return_value=mock_note
+        ):
+            response = client.get(
+                "/v1/notes/1",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-Modified-Since": http_date(updated_at),
+                },
+            )
+            assert response.status_code == 200
+            assert "Last-Modified" not in response.headers
+            assert response.headers["ETag"] == '"1-3"'
+
+
+def test_get_note_by_id_conditional_not_found(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "get_note_version", return_value=None
+        ), patch.object(
+            client.application.note_service, "get_note_by_id"
+        ) as mock_get_note_by_id:
+            response = client.get(
+                "/v1/notes/1",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-None-Match": '"1-3"',
+                },
+            )
+            assert response.status_code == 404
+            mock_get_note_by_id.assert_not_called()
 
 
 def test_get_note_by_id_not_found(client: FlaskClient, app):
@@ -360,7 +1199,9 @@ def test_create_note_unknown_error(client: FlaskClient):
 def test_update_note_success(client: FlaskClient, app):
     with app.app_context():
         access_token = create_access_token(identity=1)
-        mock_note = Mock()
+        mock_note = Mock(
+            note_id=1, updated_at=datetime(2024, 9, 26, 8, 30, 0), version=4
+        )
         mock_note.to_dict.return_value = {
             "id": 1,
             "title": "Updated Note",
@@ -383,6 +1224,120 @@ def test_update_note_success(client: FlaskClient, app):
             )
             assert response.status_code == 200
             assert json.loads(response.data)["title"] == "Updated Note"
+            assert response.headers["ETag"] == '"1-4"'
+
+
+@pytest.mark.parametrize("if_match", ['"1-3"', '"1-3-gzip"'])
+def test_update_note_if_match(client: FlaskClient, app, if_match):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        mock_note = Mock(
+            note_id=1, updated_at=datetime(2024, 9, 26, 8, 30, 0), version=4
+        )
+        mock_note.to_dict.return_value = {"id": 1, "title": "Updated Note"}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service, "update_note", return_value=mock_note
+        ) as update_note:
+            response = client.put(
+                "/v1/notes/1",
+                json={"title": "Updated Note", "text": "This note has been updated"},
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-Match": if_match,
+                },
+            )
+            assert response.status_code == 200
+            update_note.assert_called_once_with(
+                1,
+                "Updated Note",
+                "This note has been updated",
+                1,
+                False,
+                3,
+            )
+
+
+@pytest.mark.parametrize(
+    "if_match, status",
+    [('"1-2", "1-3", "other"', 200), ('"1-1", "1-2"', 412)],
+)
+def test_update_note_if_match_several(client: FlaskClient, app, if_match, status):
+    """
+    GIVEN an If-Match header listing several entity tags
+    WHEN the note is updated
+    THEN the update goes ahead, conditioned on the current version, if any tag
+        matches it, and fails with 412 otherwise
+    """
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        mock_note = Mock(
+            note_id=1, updated_at=datetime(2024, 9, 26, 8, 30, 0), version=4
+        )
+        mock_note.to_dict.return_value = {"id": 1, "title": "Updated Note"}
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "get_note_version",
+            return_value=(3, datetime(2024, 9, 25, 23, 59, 10)),
+        ), patch.object(
+            client.application.note_service, "update_note", return_value=mock_note
+        ) as update_note:
+            response = client.put(
+                "/v1/notes/1",
+                json={"title": "Updated Note", "text": "This note has been updated"},
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-Match": if_match,
+                },
+            )
+            assert response.status_code == status
+            if status == 200:
+                assert update_note.call_args.args[5] == 3
+            else:
+                update_note.assert_not_called()
+
+
+def test_update_note_stale(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            client.application.note_service,
+            "update_note",
+            side_effect=StaleNoteException("Note 1 has been modified"),
+        ):
+            response = client.put(
+                "/v1/notes/1",
+                json={"title": "Updated Note", "text": "This note has been updated"},
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-Match": '"1-3"',
+                },
+            )
+            assert response.status_code == 412
+            assert b"Precondition failed" in response.data
+
+
+def test_update_note_if_match_other_note(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(client.application.note_service, "update_note") as update_note:
+            response = client.put(
+                "/v1/notes/1",
+                json={"title": "Updated Note", "text": "This note has been updated"},
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "If-Match": '"2-3"',
+                },
+            )
+            assert response.status_code == 412
+            update_note.assert_not_called()
 
 
 def test_update_note_missing_text(client: FlaskClient):
@@ -432,6 +1387,148 @@ def test_update_note_unknown_error(client: FlaskClient):
         assert b"Internal Server Error" in response.data
 
 
+def test_batch_notes(client: FlaskClient, app):
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        created_note = Mock()
+        created_note.to_dict.return_value = {"note_id": 10, "title": "New"}
+        updated_note = Mock()
+        updated_note.to_dict.return_value = {"note_id": 2, "title": "Changed"}
+        note_service = client.application.note_service
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            note_service, "create_notes", return_value=[created_note]
+        ), patch.object(
+            note_service, "update_notes", return_value={2: updated_note}
+        ), patch.object(
+            note_service, "delete_notes", return_value={4}
+        ):
+            response = client.post(
+                "/v1/notes:batch",
+                json={
+                    "operations": [
+                        {"op": "create", "title": "New", "text": "Text"},
+                        {"op": "update", "note_id": 2, "title": "Changed", "text": "T"},
+                        {"op": "update", "note_id": 3, "title": "Gone", "text": "T"},
+                        {"op": "delete", "note_id": 4},
+                        {"op": "delete", "note_id": 4},
+                        {"op": "create", "title": "No text"},
+                    ]
+                },
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            results = json.loads(response.data)["results"]
+            assert [result["status"] for result in results] == [
+                201,
+                200,
+                404,
+                200,
+                400,
+                400,
+            ]
+            assert results[0]["note"]["note_id"] == 10
+            assert results[1]["note"]["title"] == "Changed"
+            assert "Duplicate note_id" in results[4]["error"]
+            note_service.create_notes.assert_called_once_with(
+                1, [("New", "Text", False)]
+            )
+            note_service.update_notes.assert_called_once_with(
+                1, [(2, "Changed", "T", False), (3, "Gone", "T", False)]
+            )
+            note_service.delete_notes.assert_called_once_with(1, [4])
+
+
+@pytest.mark.parametrize(
+    "operation, error",
+    [
+        ({"op": "create", "title": "T" * 256, "text": "Text"}, "Title too long"),
+        ({"op": "create", "title": ["New"], "text": "Text"}, "Missing note title"),
+        ({"op": "create", "title": "New", "text": 5}, "Missing note title"),
+        ({"op": "create", "title": "New", "text": "T", "public": 1}, "Invalid public"),
+        (
+            {"op": "update", "note_id": 2, "title": "New", "text": "T", "public": "no"},
+            "Invalid public",
+        ),
+    ],
+)
+def test_batch_notes_invalid_values(client: FlaskClient, app, operation, error):
+    """
+    GIVEN a batch with one valid create and one item whose values are invalid
+    WHEN the batch is posted
+    THEN the invalid item alone fails with 400 and never reaches the database
+    """
+    with app.app_context():
+        access_token = create_access_token(identity=1)
+        created_note = Mock()
+        created_note.to_dict.return_value = {"note_id": 10, "title": "New"}
+        note_service = client.application.note_service
+        with patch.object(
+            client.application.user_service, "get_user_id_from_token", return_value=1
+        ), patch.object(
+            note_service, "create_notes", return_value=[created_note]
+        ), patch.object(
+            note_service, "update_notes", return_value={}
+        ):
+            response = client.post(
+                "/v1/notes:batch",
+                json={
+                    "operations": [
+                        {"op": "create", "title": "New", "text": "Text"},
+                        operation,
+                    ]
+                },
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == 200
+            results = json.loads(response.data)["results"]
+            assert [result["status"] for result in results] == [201, 400]
+            assert error in results[1]["error"]
+            note_service.create_notes.assert_called_once_with(
+                1, [("New", "Text", False)]
+            )
+            note_service.update_notes.assert_called_once_with(1, [])
+
+
+def test_batch_notes_missing_operations(client: FlaskClient):
+    access_token = create_access_token(identity=1)
+    response = client.post(
+        "/v1/notes:batch",
+        json={"operations": []},
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == 400
+    assert b"Missing operations" in response.data
+
+
+def test_batch_notes_too_many_operations(client: FlaskClient):
+    access_token = create_access_token(identity=1)
+    response = client.post(
+        "/v1/notes:batch",
+        json={"operations": [{"op": "delete", "note_id": i} for i in range(11)]},
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == 400
+    assert b"Too many operations" in response.data
+
+
+def test_batch_notes_unknown_error(client: FlaskClient):
+    access_token = create_access_token(identity=1)
+    with patch.object(
+        client.application.user_service, "get_user_id_from_token", return_value=1
+    ), patch.object(
+        client.application.note_service, "create_notes", side_effect=Exception
+    ):
+        response = client.post(
+            "/v1/notes:batch",
+            json={"operations": [{"op": "create", "title": "New", "text": "Text"}]},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        assert response.status_code == 500
+        assert b"Internal Server Error" in response.data
+
+
 def test_delete_note_success(client: FlaskClient, app):
     with app.app_context():
         access_token = create_access_token(identity=1)
@@ -37,3 +37,133 @@ def test_settings_jwt_secret():
     os.environ["JWT_SECRET"] = "super_secret_key"
     settings = Settings()
     assert settings.JWT_SECRET_KEY == "super_secret_key"
+
+
+def test_settings_hash_pool():
+    os.environ["HASH_POOL_WORKERS"] = "3"
+    os.environ["HASH_POOL_QUEUE_DEPTH"] = "7"
+    os.environ["HASH_POOL_RETRY_AFTER_SEC"] = "5"
+    settings = Settings()
+    assert settings.HASH_POOL_WORKERS == 3
+    assert settings.HASH_POOL_QUEUE_DEPTH == 7
+    assert settings.HASH_POOL_RETRY_AFTER_SEC == 5
+
+
+def test_settings_password_hash_iterations():
+    os.environ["PASSWORD_HASH_ITERATIONS"] = "600000"
+    settings = Settings()
+    assert settings.PASSWORD_HASH_ITERATIONS == 600000
+
+
+def test_settings_jwt_cache():
+    os.environ["JWT_CACHE_MAX_ENTRIES"] = "100"
+    os.environ["JWT_CACHE_TTL_SEC"] = "30"
+    settings = Settings()
+    assert settings.JWT_CACHE_MAX_ENTRIES == 100
+    assert settings.JWT_CACHE_TTL_SEC == 30
+
+
+def test_settings_notes_batch():
+    os.environ["NOTES_BATCH_MAX_OPERATIONS"] = "50"
+    os.environ["NOTES_EXPORT_BATCH_SIZE"] = "1000"
+    os.environ["NOTES_IMPORT_BATCH_SIZE"] = "200"
+    settings = Settings()
+    assert settings.NOTES_BATCH_MAX_OPERATIONS == 50
+    assert settings.NOTES_EXPORT_BATCH_SIZE == 1000
+    assert settings.NOTES_IMPORT_BATCH_SIZE == 200
+
+
+def test_settings_note_compression():
+    os.environ["NOTE_COMPRESSION_CODEC"] = "zstd"
+    os.environ["NOTE_COMPRESSION_LEVEL"] = "9"
+    os.environ["NOTE_COMPRESSION_MIN_BYTES"] = "4096"
+    settings = Settings()
+    assert settings.NOTE_COMPRESSION_CODEC == "zstd"
+    assert settings.NOTE_COMPRESSION_LEVEL == 9
+    assert settings.NOTE_COMPRESSION_MIN_BYTES == 4096
+
+
+def test_settings_json_backend():
+    os.environ["JSON_BACKEND"] = "stdlib"
+    settings = Settings()
+    assert settings.JSON_BACKEND == "stdlib"
+
+
+def test_settings_response_compression():
+    os.environ["RESPONSE_COMPRESSION_ENCODINGS"] = "br, gzip"
+    os.environ["RESPONSE_COMPRESSION_LEVEL"] = "4"
+    os.environ["RESPONSE_COMPRESSION_MIN_BYTES"] = "512"
+    settings = Settings()
+    assert settings.RESPONSE_COMPRESSION_ENCODINGS == ["br", "gzip"]
+    assert settings.RESPONSE_COMPRESSION_LEVEL == 4
+    assert settings.RESPONSE_COMPRESSION_MIN_BYTES == 512
+
+
+def test_settings_notes_search():
+    os.environ["NOTES_SEARCH_BACKEND"] = "inverted_index"
+    settings = Settings()
+    assert settings.NOTES_SEARCH_BACKEND == "inverted_index"
+
+
+def test_settings_note_cache():
+    os.environ["NOTE_CACHE_BACKEND"] = "shared"
+    os.environ["NOTE_CACHE_MAX_ENTRIES"] = "500"
+    os.environ["NOTE_LISTING_CACHE_MAX_ENTRIES"] = "50"
+    os.environ["NOTE_CACHE_MAX_BYTES"] = "1048576"
+    os.environ["NOTE_CACHE_TTL_SEC"] = "30"
+    os.environ["NOTE_CACHE_REDIS_URL"] = "redis://cache:6379/0"
+    settings = Settings()
+    assert settings.NOTE_CACHE_BACKEND == "shared"
+    assert settings.NOTE_CACHE_MAX_ENTRIES == 500
+    assert settings.NOTE_LISTING_CACHE_MAX_ENTRIES == 50
+    assert settings.NOTE_CACHE_MAX_BYTES == 1048576
+    assert settings.NOTE_CACHE_TTL_SEC == 30
+    assert settings.NOTE_CACHE_REDIS_URL == "redis://cache:6379/0"
+
+
+def test_settings_token_expiry():
+    os.environ["ACCESS_TOKEN_EXPIRES_SEC"] = "300"
+    os.environ["REFRESH_TOKEN_EXPIRES_SEC"] = "86400"
+    settings = Settings()
+    assert settings.ACCESS_TOKEN_EXPIRES_SEC == 300
+    assert settings.REFRESH_TOKEN_EXPIRES_SEC == 86400
+
+
+def test_settings_db_pool():
+    os.environ["DB_POOL_SIZE"] = "20"
+    os.environ["DB_MAX_OVERFLOW"] = "5"
+    os.environ["DB_POOL_TIMEOUT_SEC"] = "2.5"
+    os.environ["DB_POOL_RECYCLE_SEC"] = "600"
+    os.environ["DB_POOL_PRE_PING"] = "false"
+    settings = Settings()
+    assert settings.DB_POOL_SIZE == 20
+    assert settings.DB_MAX_OVERFLOW == 5
+    assert settings.DB_POOL_TIMEOUT_SEC == 2.5
+    assert settings.DB_POOL_RECYCLE_SEC == 600
+    assert settings.DB_POOL_PRE_PING is False
+
+
+def test_settings_statement_caching():
+    os.environ.pop("DB_PREPARED_STATEMENTS", None)
+    assert Settings().DB_PREPARED_STATEMENTS is False
+    os.environ["DB_QUERY_CACHE_SIZE"] = "1000"
+    os.environ["DB_PREPARED_STATEMENTS"] = "true"
+    os.environ["DB_PREPARED_STATEMENTS_MAX"] = "8"
+    settings = Settings()
+    assert settings.DB_QUERY_CACHE_SIZE == 1000
+    assert settings.DB_PREPARED_STATEMENTS is True
+    assert settings.DB_PREPARED_STATEMENTS_MAX == 8
+
+
+def test_settings_sql_instrumentation():
+    os.environ["DB_ECHO"] = "1"
+    os.environ["SQL_SAMPLE_RATE"] = "0.5"
+    os.environ["SQL_SLOW_QUERY_MS"] = "50"
+    os.environ["SQL_STATS_MAX_FINGERPRINTS"] = "100"
+    os.environ["SQL_STATS_TOP_N"] = "5"
+    settings = Settings()
+    assert settings.DB_ECHO is True
+    assert settings.SQL_SAMPLE_RATE == 0.5
+    assert settings.SQL_SLOW_QUERY_MS == 50
+    assert settings.SQL_STATS_MAX_FINGERPRINTS == 100
+    assert settings.SQL_STATS_TOP_N == 5
@@ -0,0 +1,84 @@
+import pytest
+
+from src.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter(registry):
+    """
+    GIVEN a registered counter
+    WHEN it is incremented
+    THEN the rendered output holds its total
+    """
+    counter = Counter("test_total", "A test counter", registry=registry)
+    counter.inc()
+    counter.inc(2)
+
+    assert counter.value == 3
+    output = registry.render()
+    assert "# HELP test_total A test counter\n" in output
+    assert "# TYPE test_total counter\n" in output
+    assert "test_total 3\n" in output
+
+
+def test_gauge_function(registry):
+    """
+    GIVEN a gauge backed by a callback
+    WHEN the registry is rendered
+    THEN the callback value is reported
+    """
+    Gauge("test_gauge", "A test gauge", function=lambda: 1.5, registry=registry)
+
+    assert "test_gauge 1.5\n" in registry.render()
+
+
+def test_histogram_buckets(registry):
+    """
+    GIVEN a histogram
+    WHEN values are observed
+    THEN cumulative bucket counts, the sum and the count are reported
+    """
+    histogram = Histogram(
+        "test_seconds", "A test histogram", buckets=(0.1, 1.0), registry=registry
+    )
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    output = registry.render()
+    assert 'test_seconds_bucket{le="0.1"} 1\n' in output
+    assert 'test_seconds_bucket{le="1"} 2\n' in output
+    assert 'test_seconds_bucket{le="+Inf"} 3\n' in output
+    assert "test_seconds_sum 5.55\n" in output
+    assert "test_seconds_count 3\n" in output
+
+
+def test_duplicate_registration(registry):
+    """
+    GIVEN a registered metric
+    WHEN another metric with the same name is registered
+    THEN a ValueError is raised
+    """
+    Counter("test_total", "A test counter", registry=registry)
+
+    with pytest.raises(ValueError):
+        Counter("test_total", "Another test counter", registry=registry)
+
+
+def test_metric_requires_samples(registry):
+    """
+    GIVEN a metric type that does not implement samples
+    WHEN it is created
+    THEN TypeError is raised before it is registered
+    """
+
+    class Incomplete(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "No samples", registry=registry)
+    assert "incomplete" not in registry.render()